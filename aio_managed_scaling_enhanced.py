@@ -1,117 +1,176 @@
-import statistics
+import argparse
 import asyncio
+import time
 from tools.utils import Utils
-from tools.ssm import AWSSSMClient
-from tools.emr import AWSEMRClient
+from tools.aws_clients import registry
+from tools.yarn_rm import get_yarn_rm_client
+from tools.tick_metrics import tick_metrics
+from tools.metrics_store import METRIC_COLUMNS
+from tools.scaling_policy import LazyInputs
+from managed_scaling_enhanced import ManagedScalingEnhanced
 
-# 配置loguru的logger
-Utils.logger.add("managed_scaling_enhanced.log",
-                 format="{time} {level} {message}", level="DEBUG")
 
+class AioManagedScalingEnhanced(ManagedScalingEnhanced):
+    """
+    基于asyncio的扩缩容控制器。
+
+    每次tick并发发出相互独立的读取：Managed Scaling策略、指标时间窗口以及ResourceManager快照，
+    全部返回后使用与同步版本相同的evaluate_scale_status做判断；Task Node CPU只在判断树需要时才获取。
+    AWS调用走长期持有的aioboto3客户端；SQLite和ResourceManager没有异步驱动，在线程池中执行。
+    """
 
-emrID = 'j-1F74M1P9SC57B'
+    @Utils.exception_handler
+    async def aioget_current_max_unit_num(self):
+        with tick_metrics.time(self.emr_id, 'policy_read'):
+            policy = await self.emr_client.aioget_managed_scaling_policy(self.emr_id)
+        compute_limits = policy.get(
+            'ManagedScalingPolicy', {}).get('ComputeLimits', {})
+        return compute_limits.get('MaximumCapacityUnits', 0)
+
+    @Utils.exception_handler
+    async def aioget_task_node_cpu(self, window_minutes):
+        """
+        get_task_node_cpu 的异步版本：优先读取本地数据，没有数据或数据不足时异步回退到CloudWatch。
+
+        :param window_minutes: 时间窗口(分钟)
+        :return: 每分钟平均CPU列表
+        """
+        with tick_metrics.time(self.emr_id, 'metric_read'):
+            records = await asyncio.to_thread(
+                self.emr_metric_manager.get_task_node_cpu_from_sqlite, self.emr_id, window_minutes)
+        if records:
+            return records
+
+        Utils.logger.info(f"No complete local task node CPU data for the last {window_minutes} minutes, falling back to CloudWatch.")
+        with tick_metrics.time(self.emr_id, 'cloudwatch'):
+            return await self.nodeMetrics_client.aioget_task_node_metrics(
+                self.emr_id, instance_group_types_list=['TASK'], instance_states_list=['RUNNING'], window_minutes=window_minutes)
+
+    async def aioget_metric_windows(self):
+        with tick_metrics.time(self.emr_id, 'metric_read'):
+            return await asyncio.to_thread(self.metric_source.get_metric_windows, self.emr_id, self.config)
+
+    async def _prefetch_yarn_snapshot(self, snapshot):
+        """
+        在判断的同时提前获取ResourceManager快照，供scale_out/scale_in使用。
+        同步版本只在需要扩缩容时才请求ResourceManager，因此这里的失败不影响判断，
+        快照保持未获取状态，扩缩容时会重新请求。
+        """
+        try:
+            await asyncio.to_thread(lambda: snapshot.metrics)
+        except Exception as e:
+            Utils.logger.warning(f"Prefetching YARN cluster metrics failed, will retry when needed: {e}")
+
+    @Utils.exception_handler
+    async def aiodetermine_scale_status(self, snapshot=None):
+        """
+        determine_scale_status 的异步版本，判断逻辑完全相同。
+
+        Managed Scaling策略、指标时间窗口和ResourceManager快照并发获取；Task Node CPU、需求预测和
+        队列阈值与同步版本一样只在判断树需要时才获取，判断树在线程中执行，CPU仍通过事件循环异步获取。
+
+        :param snapshot: 本次tick的YarnClusterSnapshot，会继续传给scale_out/scale_in使用
+        :return: 1: scaleOut, -1: scaleIn, 0: 无操作
+        """
+        snapshot = self._resolve_yarn_snapshot(snapshot)
+
+        currentMaxUnitNum, metric_windows, _ = await asyncio.gather(
+            self.aioget_current_max_unit_num(),
+            self.aioget_metric_windows(),
+            self._prefetch_yarn_snapshot(snapshot),
+        )
+        Utils.logger.info(
+            f"The current cluster's Maximum Capacity Units value: {currentMaxUnitNum}")
+
+        loop = asyncio.get_running_loop()
+
+        def task_node_cpu_mean(window_minutes):
+            # 判断树在线程中执行，把协程提交回事件循环并等待结果
+            return lambda: self._mean(asyncio.run_coroutine_threadsafe(
+                self.aioget_task_node_cpu(window_minutes), loop).result())
+
+        inputs = LazyInputs({
+            'forecastBreach': lambda: self.check_forecast(metric_windows),
+            'queueBreach': self.check_queues,
+            'scaleOut.TaskNodeCPULoad': task_node_cpu_mean(self.scaleOutAvgTaskNodeCPULoadMinutes),
+            'scaleIn.TaskNodeCPULoad': task_node_cpu_mean(self.scaleInAvgTaskNodeCPULoadMinutes),
+            **{f"{scale_status}.{metric_name}": (
+                lambda metric_name=metric_name, scale_status=scale_status:
+                self._mean(metric_windows.get_window(metric_name, scale_status, self.config)))
+               for scale_status in ('scaleOut', 'scaleIn') for metric_name in METRIC_COLUMNS},
+        })
+        return await asyncio.to_thread(self.evaluate_scale_status, currentMaxUnitNum, inputs)
+
+    @Utils.exception_handler
+    async def aio_tick(self, snapshot=None):
+        """
+        tick 的异步版本。扩缩容操作本身是很少发生的顺序写入，仍在线程中调用同步实现。
+
+        :param snapshot: 已获取的YarnClusterSnapshot，默认新建
+        :return: 本次的扩缩容状态 (1: scaleOut, -1: scaleIn, 0: 无操作)
+        """
+        started = time.monotonic()
+        try:
+            with tick_metrics.time(self.emr_id, 'config'):
+                await asyncio.to_thread(self.refresh)
+
+            if snapshot is None:
+                snapshot = self.get_yarn_snapshot()
+
+            scaleStatus = await self.aiodetermine_scale_status(snapshot)
+            await asyncio.to_thread(self.execute_scale_status, scaleStatus, snapshot)
+            Utils.logger.info(f"Async tick for cluster '{self.emr_id}' finished in {time.monotonic() - started:.3f} seconds.")
+            return scaleStatus
+        finally:
+            tick_metrics.record_tick(self.emr_id, time.monotonic() - started, self.actionIntervalSeconds)
+
+
+async def run_async(emr_id, prefix, spot_switch_on_demand=0, hedge_after_seconds=None):
+    """
+    在事件循环中按actionIntervalSeconds循环执行异步tick，退出时关闭aioboto3客户端。
 
-@Utils.exception_handler
-async def determine_scale_status(YARNMemoryAvailablePercentageList, CapacityRemainingGBList, pendingAppNumList, taskNodeCPULoadList, currentMaxUnitNum):
+    :param emr_id: EMR集群ID
+    :param prefix: 参数前缀
+    :param spot_switch_on_demand: 是否补充On-Demand实例
+    :param hedge_after_seconds: ResourceManager对冲请求的延迟预算(秒)，为None时不对冲
+    """
+    # 初始化共享的ResourceManager客户端(连接池、超时、重试和熔断)
+    get_yarn_rm_client(emr_id, hedge_after_seconds=hedge_after_seconds)
+
+    controller = await asyncio.to_thread(AioManagedScalingEnhanced, emr_id, prefix, spot_switch_on_demand)
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                await controller.aio_tick()
+            except Exception:
+                # 错误已由exception_handler记录，下一个周期重试
+                pass
+            # 间隔从开始时间算起，慢的tick不会推迟后续tick的节奏
+            await asyncio.sleep(max(0, controller.actionIntervalSeconds - (time.monotonic() - started)))
+    finally:
+        await registry.close_aio_clients()
+
+
+def schedule_async(emr_id, prefix, spot_switch_on_demand=0, hedge_after_seconds=None):
     """
-    根据输入的监控数据和当前最大单元数，决定是否扩缩容。
+    以asyncio方式运行控制器，直到按Ctrl+C。
     """
-    # 定义前缀字符串变量
+    try:
+        asyncio.run(run_async(emr_id, prefix, spot_switch_on_demand, hedge_after_seconds))
+    except (KeyboardInterrupt, SystemExit):
+        Utils.logger.info("Async controller shutdown successfully.")
+
 
-    # 检查输入的监控数据列表是否都非空
-    if not YARNMemoryAvailablePercentageList or not CapacityRemainingGBList or not pendingAppNumList or not taskNodeCPULoadList:
-        Utils.logger.info(
-            "At least one of the input monitoring data lists is empty, so no scaling operations will be performed.")
-        Utils.logger.info(
-            f"Determining scale status with inputs: YARNMemoryAvailablePercentageList={YARNMemoryAvailablePercentageList}, CapacityRemainingGBList={CapacityRemainingGBList}, pendingAppNumList={pendingAppNumList}, taskNodeCPULoadList={taskNodeCPULoadList}, currentMaxUnitNum={currentMaxUnitNum}")
-        return 0
-
-
-    ssm_client = AWSSSMClient()
-    prefix = "managedScalingEnhanced"
-
-    parameter_names = [
-    f'/{prefix}/minimumUnits',
-    f'/{prefix}/maximumUnits',
-    f'/{prefix}/scaleOutAvgYARNMemoryAvailablePercentageValue',
-    f'/{prefix}/scaleOutAvgCapacityRemainingGBValue',
-    f'/{prefix}/scaleOutAvgPendingAppNumValue',
-    f'/{prefix}/scaleOutAvgTaskNodeCPULoadValue',
-    f'/{prefix}/scaleInAvgYARNMemoryAvailablePercentageValue',
-    f'/{prefix}/scaleInAvgCapacityRemainingGBValue',
-    f'/{prefix}/scaleInAvgPendingAppNumValue',
-    f'/{prefix}/scaleInAvgTaskNodeCPULoadValue',
-]
-    # 使用一次性获取所有参数的异步方法
-    parameters = await ssm_client.aioget_parameters_from_parameter_store(parameter_names)
-
-    # 转换参数类型
-    minimumUnits = int(parameters[0])
-    maximumUnits = int(parameters[1])
-    scaleOutAvgYARNMemoryAvailablePercentageValue = float(parameters[2])
-    scaleOutAvgCapacityRemainingGBValue = float(parameters[3])
-    scaleOutAvgPendingAppNumValue = float(parameters[4])
-    scaleOutAvgTaskNodeCPULoadValue = float(parameters[5])
-    scaleInAvgYARNMemoryAvailablePercentageValue = float(parameters[6])
-    scaleInAvgCapacityRemainingGBValue = float(parameters[7])
-    scaleInAvgPendingAppNumValue = float(parameters[8])
-    scaleInAvgTaskNodeCPULoadValue = float(parameters[9])
-
-
-    # 判断逻辑
-    # scaleOut单项条件状态
-    scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus = statistics.mean(
-        YARNMemoryAvailablePercentageList) <= scaleOutAvgYARNMemoryAvailablePercentageValue
-    scaleOutMemoryConditionCapacityRemainingGBStatus = statistics.mean(
-        CapacityRemainingGBList) <= scaleOutAvgCapacityRemainingGBValue
-    scaleOutAppConditionPendingAppNumStatus = statistics.mean(
-        pendingAppNumList) >= scaleOutAvgPendingAppNumValue
-    scaleOutCPULoadStatus = statistics.mean(
-        taskNodeCPULoadList) >= scaleOutAvgTaskNodeCPULoadValue
-    scaleOutcurrentMaxUnitNumStatus = currentMaxUnitNum < maximumUnits
-
-    # scaleOut综合条件
-    scaleOutMemoryCondition = scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus or scaleOutMemoryConditionCapacityRemainingGBStatus
-    scaleOutPendingAppNumCondition = scaleOutAppConditionPendingAppNumStatus
-    scaleOutCPULoadCondition = scaleOutCPULoadStatus
-    scaleOutcurrentMaxUnitCondition = scaleOutcurrentMaxUnitNumStatus
-    scaleOutCondition = scaleOutMemoryCondition and scaleOutPendingAppNumCondition and scaleOutCPULoadCondition and scaleOutcurrentMaxUnitCondition
-
-    # scaleIn单项条件状态
-    scaleInMemoryConditionYARNMemoryAvailablePercentageStatus = statistics.mean(
-        YARNMemoryAvailablePercentageList) > scaleInAvgYARNMemoryAvailablePercentageValue
-    scaleInMemoryConditionCapacityRemainingGBStatus = statistics.mean(
-        CapacityRemainingGBList) > scaleInAvgCapacityRemainingGBValue
-    scaleInAppConditionPendingAppNumStatus = statistics.mean(
-        pendingAppNumList) < scaleInAvgPendingAppNumValue
-    scaleInCPULoadStatus = statistics.mean(
-        taskNodeCPULoadList) < scaleInAvgTaskNodeCPULoadValue
-    scaleIncurrentMaxUnitNumStatus = currentMaxUnitNum > minimumUnits
-
-    # scaleIn综合条件
-    scaleInMemoryCondition = scaleInMemoryConditionYARNMemoryAvailablePercentageStatus or scaleInMemoryConditionCapacityRemainingGBStatus
-    scaleInPendingAppNumCondition = scaleInAppConditionPendingAppNumStatus
-    scaleInCPULoadCondition = scaleInCPULoadStatus
-    scaleIncurrentMaxUnitCondition = scaleIncurrentMaxUnitNumStatus
-    scaleInCondition = (
-        scaleInMemoryCondition or scaleInPendingAppNumCondition or scaleInCPULoadCondition) and scaleIncurrentMaxUnitCondition
-
-    # 确定scaleStatus
-    if scaleOutCondition and not scaleInCondition:
-        return 1  # 执行scaleOut
-    elif not scaleOutCondition and scaleInCondition:
-        return -1  # 执行scaleIn
-    else:
-        return 0  # 无操作
-
-
-# 示例调用，这里需要替换为实际参数
 if __name__ == '__main__':
-    scaleStatus = asyncio.run(determine_scale_status(
-        YARNMemoryAvailablePercentageList=[70, 80, 75],
-        CapacityRemainingGBList=[100, 110, 120],
-        pendingAppNumList=[5, 6, 7],
-        taskNodeCPULoadList=[],
-        currentMaxUnitNum=100
-    ))
-    Utils.logger.info(f"Scale Status: {scaleStatus}")
+    # 配置loguru的logger(由main.py启动时已经配置过)
+    Utils.add_file_sink("managed_scaling_enhanced.log")
+
+    parser = argparse.ArgumentParser(description='Managed Scaling Enhanced for EMR (asyncio)')
+    parser.add_argument('--emr-id', required=True, help='EMR cluster ID')
+    parser.add_argument('--prefix', default='managedScalingEnhanced', help='Parameter prefix (default: managedScalingEnhanced)')
+    parser.add_argument('--spot-switch-on-demand', type=int, default=0, help='Whether to switch to on-demand instances (0: no, 1: yes, default: 0)')
+    parser.add_argument('--hedge-after-seconds', type=float, default=None, help='Send a hedged request to another master when the ResourceManager has not answered within this many seconds (default: disabled)')
+    args = parser.parse_args()
+
+    schedule_async(args.emr_id, args.prefix, args.spot_switch_on_demand, args.hedge_after_seconds)
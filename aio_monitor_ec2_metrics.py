@@ -1,9 +1,9 @@
 import asyncio
 from tools.utils import Utils
 from tools.cloudwatch import CloudWatchMetric
+from tools.aws_clients import registry
 # 配置loguru的logger
-Utils.logger.add("monitor_metrics.log",
-                 format="{time} {level} {message}", level="DEBUG")
+Utils.add_file_sink("monitor_metrics.log")
 
 # 创建CloudWatchMetric实例
 cw_metric = CloudWatchMetric(namespace='AWS/EC2')
@@ -34,7 +34,15 @@ dimensions = [
 ]
 
 
-response = asyncio.run(cw_metric.aioget_metric_statistics(metric_name, dimensions, minutes=100))
+async def main():
+    try:
+        return await cw_metric.aioget_metric_statistics(metric_name, dimensions, minutes=100)
+    finally:
+        # 关闭长期持有的aioboto3客户端
+        await registry.close_aio_clients()
+
+
+response = asyncio.run(main())
 metricsList = [item['Average'] for item in response['Datapoints']]
 Utils.logger.info(f"metricsList: {metricsList}")
 
@@ -0,0 +1,113 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from tools.utils import Utils
+from tools.backtest import DEFAULT_WEIGHTS, Backtester, expand_grid, parse_range
+from tools.simulator import DECISION_SERIES, MetricHistory, load_config
+from simulate import parse_overrides, parse_time
+
+# 结果CSV中参数之后的汇总列
+RESULT_COLUMNS = ('score', 'underProvisionedSeconds', 'overProvisionedUnitHours', 'policyWrites',
+                  'scaleOut', 'scaleIn', 'cooldown', 'capacityUnitHours', 'finalMaximumCapacityUnits')
+
+
+def print_ranking(results, parameter_names, top):
+    header = parameter_names + ['score', 'underHours', 'overUnitHours', 'writes']
+    widths = [max(len(name), 10) for name in header]
+    print('  '.join(f"{name:>{width}}" for name, width in zip(header, widths)))
+    for result in results[:top]:
+        row = [result['parameters'][name] for name in parameter_names] + [
+            result['score'], result['underProvisionedSeconds'] / 3600, result['overProvisionedUnitHours'], result['policyWrites']]
+        print('  '.join(f"{value:>{width}.2f}" if isinstance(value, float) else f"{value:>{width}}"
+                        for value, width in zip(row, widths)))
+
+
+def write_results_csv(results, parameter_names, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank'] + parameter_names + list(RESULT_COLUMNS))
+        for rank, result in enumerate(results, 1):
+            writer.writerow([rank] + [result['parameters'][name] for name in parameter_names]
+                            + [result[column] for column in RESULT_COLUMNS])
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Backtest Managed Scaling Enhanced parameter combinations against recorded metric history')
+    parser.add_argument('--emr-id', required=True, help='EMR cluster ID whose SQLite history is replayed')
+    parser.add_argument('--prefix', default='managedScalingEnhanced', help='Parameter prefix (default: managedScalingEnhanced)')
+    parser.add_argument('--parameters-file', default=None, help='JSON file with {"parameterName": value} to use instead of Parameter Store')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE', help='Fixed override applied to every combination, can be repeated')
+    parser.add_argument('--range', action='append', required=True, metavar='NAME=START:STOP:STEP|NAME=V1,V2',
+                        help='Values to sweep for a parameter (STOP is inclusive), can be repeated')
+    parser.add_argument('--db-path', default=None, help='SQLite file written by yarn_monitor.py (default: <cluster table>.db)')
+    parser.add_argument('--start', default=None, help='Replay start, Unix timestamp or ISO 8601 (default: first sample plus the longest window)')
+    parser.add_argument('--end', default=None, help='Replay end, Unix timestamp or ISO 8601 (default: last sample)')
+    parser.add_argument('--days', type=float, default=None, help='Replay the last N days (ignored when --start is given)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: number of CPUs)')
+    parser.add_argument('--provision-delay-seconds', type=int, default=300, help='Delay before raised MaximumCapacityUnits becomes capacity (default: 300)')
+    parser.add_argument('--release-delay-seconds', type=int, default=60, help='Delay before lowered MaximumCapacityUnits releases capacity (default: 60)')
+    parser.add_argument('--initial-max-units', type=int, default=None, help='MaximumCapacityUnits at the start of the replay (default: minimumUnits)')
+    parser.add_argument('--policy-min-units', type=int, default=0, help='MinimumCapacityUnits of the managed scaling policy (default: 0)')
+    parser.add_argument('--vcores-per-unit', type=float, default=1, help='vCores per capacity unit (default: 1)')
+    parser.add_argument('--apps-running', type=int, default=10, help='Running applications assumed when appsRunning was not recorded (default: 10)')
+    parser.add_argument('--headroom', type=float, default=0.2, help='Capacity headroom above demand that is not counted as over-provisioned (default: 0.2)')
+    parser.add_argument('--pressure-memory-percentage', type=float, default=10, help='Available YARN memory percentage counted as under-provisioned when demand was not recorded (default: 10)')
+    parser.add_argument('--weight-under', type=float, default=DEFAULT_WEIGHTS['underProvisionedHours'], help=f"Score weight per under-provisioned hour (default: {DEFAULT_WEIGHTS['underProvisionedHours']})")
+    parser.add_argument('--weight-over', type=float, default=DEFAULT_WEIGHTS['overProvisionedUnitHours'], help=f"Score weight per over-provisioned unit-hour (default: {DEFAULT_WEIGHTS['overProvisionedUnitHours']})")
+    parser.add_argument('--weight-writes', type=float, default=DEFAULT_WEIGHTS['policyWrites'], help=f"Score weight per policy write (default: {DEFAULT_WEIGHTS['policyWrites']})")
+    parser.add_argument('--top', type=int, default=20, help='Number of ranked combinations to print (default: 20)')
+    parser.add_argument('--output', default=None, help='Write all ranked results to this CSV file')
+    parser.add_argument('--json', action='store_true', help='Print the ranked results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Keep the application INFO logs')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if not args.verbose:
+        Utils.logger.remove()
+        Utils.logger.add(sys.stderr, level="WARNING")
+
+    config = load_config(args.prefix, args.parameters_file, parse_overrides(args.set))
+    ranges = [parse_range(spec) for spec in args.range]
+    combinations = expand_grid(ranges)
+    parameter_names = [name for name, _ in ranges]
+
+    start_time, end_time = parse_time(args.start), parse_time(args.end)
+    if start_time is None and args.days is not None:
+        start_time = (end_time or int(time.time())) - int(args.days * 24 * 60 * 60)
+
+    # 与yarn_monitor.py相同的表名处理
+    table_name = ''.join(c if c.isalnum() or c == '_' else '_' for c in args.emr_id.replace('-', '_'))
+    # 按所有组合中最大的窗口多读取一段数据
+    max_window_minutes = max(
+        [config.get_metric_window_minutes(name, scale_status) for name in DECISION_SERIES for scale_status in ('scaleOut', 'scaleIn')]
+        + [max(values) for name, values in ranges if name.endswith('Minutes')])
+    history = MetricHistory.load(
+        table_name, args.db_path,
+        None if start_time is None else start_time - int(max_window_minutes * 60), end_time,
+        config.monitorIntervalSeconds)
+
+    backtester = Backtester(
+        config, history, start_time, end_time,
+        weights={'underProvisionedHours': args.weight_under, 'overProvisionedUnitHours': args.weight_over,
+                 'policyWrites': args.weight_writes},
+        provision_delay_seconds=args.provision_delay_seconds, release_delay_seconds=args.release_delay_seconds,
+        initial_max_units=args.initial_max_units, policy_min_units=args.policy_min_units,
+        vcores_per_unit=args.vcores_per_unit, apps_running=args.apps_running,
+        headroom=args.headroom, pressure_memory_percentage=args.pressure_memory_percentage)
+
+    started = time.perf_counter()
+    results = backtester.run(combinations, workers=args.workers)
+    print(f"Evaluated {len(combinations)} combinations in {time.perf_counter() - started:.1f} seconds.", file=sys.stderr)
+
+    if args.output:
+        write_results_csv(results, parameter_names, args.output)
+    if args.json:
+        print(json.dumps(results[:args.top], indent=2))
+    else:
+        print_ranking(results, parameter_names, args.top)
+
+# python backtest.py --emr-id j-1F74M1P9SC57B --days 30 --range scaleOutFactor=1:2:0.25 --range scaleOutCooldownSeconds=120,300,420 --output ranking.csv
@@ -0,0 +1,359 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from botocore.exceptions import ClientError
+
+
+class CallCounter:
+    """
+    线程安全的调用计数器，按(服务, 操作)统计调用次数。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def record(self, service_name, operation):
+        with self._lock:
+            self.counts[(service_name, operation)] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class FaultInjector:
+    """
+    为本地替身注入延迟和失败：每次调用先等待 latency ± jitter 秒，再按概率抛出错误。
+    """
+
+    def __init__(self, latency_seconds=0.0, jitter_seconds=0.0, failure_rate=0.0, seed=None):
+        """
+        :param latency_seconds: 每次调用的基础延迟(秒)
+        :param jitter_seconds: 延迟的随机抖动范围(秒)
+        :param failure_rate: 调用失败的概率(0~1)
+        :param seed: 随机数种子，便于复现
+        """
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self):
+        """
+        等待注入的延迟。
+
+        :return: 本次调用是否应当失败
+        """
+        with self._lock:
+            delay = max(0.0, self.latency_seconds + self._random.uniform(-self.jitter_seconds, self.jitter_seconds))
+            fail = self._random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        return fail
+
+
+class FakeClusterState:
+    """
+    一个EMR集群的模拟状态：实例清单、Managed Scaling策略、YARN clusterMetrics和每个实例的CPU。
+    所有替身共享同一个状态对象，扩缩容写入的策略会被后续读取看到。
+    """
+
+    def __init__(self, cluster_id='j-BENCHMARK', task_node_count=50, core_node_count=5, use_fleets=True, seed=None):
+        self.cluster_id = cluster_id
+        self.use_fleets = use_fleets
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        collection = 'InstanceFleet' if use_fleets else 'InstanceGroup'
+        self.collections = [
+            {'Id': f'{collection[:2].lower()}-MASTER', 'Type': 'MASTER'},
+            {'Id': f'{collection[:2].lower()}-CORE', 'Type': 'CORE'},
+            {'Id': f'{collection[:2].lower()}-TASK', 'Type': 'TASK'},
+        ]
+        self.instances = [self._instance(i, 'MASTER') for i in range(1)]
+        self.instances += [self._instance(i, 'CORE') for i in range(core_node_count)]
+        self.instances += [self._instance(i, 'TASK') for i in range(task_node_count)]
+
+        self.policy = {
+            'ManagedScalingPolicy': {
+                'ComputeLimits': {
+                    'UnitType': 'InstanceFleetUnits' if use_fleets else 'Instances',
+                    'MinimumCapacityUnits': 10,
+                    'MaximumCapacityUnits': 400,
+                    'MaximumOnDemandCapacityUnits': 100,
+                    'MaximumCoreCapacityUnits': 40,
+                }
+            }
+        }
+        self.cluster_metrics = {
+            'appsSubmitted': 1000, 'appsCompleted': 950, 'appsPending': 5, 'appsRunning': 20,
+            'appsFailed': 3, 'appsKilled': 2,
+            'reservedMB': 8192, 'availableMB': 409600, 'allocatedMB': 3686400, 'totalMB': 4096000,
+            'reservedVirtualCores': 4, 'availableVirtualCores': 100, 'allocatedVirtualCores': 900,
+            'totalVirtualCores': 1000, 'pendingVirtualCores': 64, 'pendingMB': 262144,
+            'containersAllocated': 900, 'containersReserved': 2, 'containersPending': 40,
+            'totalNodes': task_node_count + core_node_count, 'activeNodes': task_node_count + core_node_count,
+            'lostNodes': 0, 'unhealthyNodes': 0, 'decommissioningNodes': 0, 'decommissionedNodes': 0,
+            'rebootedNodes': 0, 'shutdownNodes': 0,
+        }
+        self.cpu_mean = 60.0
+
+    def _instance(self, index, collection_type):
+        collection_id = next(c['Id'] for c in self.collections if c['Type'] == collection_type)
+        instance = {
+            'Id': f'ci-{collection_type[:1]}{index:05d}',
+            'Ec2InstanceId': f'i-{collection_type[:1].lower()}{index:016x}',
+            'InstanceType': 'm5.4xlarge',
+            'Market': 'SPOT' if collection_type == 'TASK' else 'ON_DEMAND',
+            'Status': {'State': 'RUNNING'},
+            'PublicDnsName': '127.0.0.1',
+        }
+        instance['InstanceFleetId' if self.use_fleets else 'InstanceGroupId'] = collection_id
+        return instance
+
+    def cpu_value(self):
+        with self._lock:
+            return max(0.0, min(100.0, self._random.gauss(self.cpu_mean, 10)))
+
+
+class FakeAWSClient:
+    """
+    boto3客户端的本地替身基类：统计每次调用(分页的每一页各算一次)，并注入延迟和失败。
+    """
+
+    service_name = None
+
+    def __init__(self, state, injector=None, counter=None):
+        self.state = state
+        self.injector = injector or FaultInjector()
+        self.counter = counter or CallCounter()
+
+    def _enter(self, operation):
+        self.counter.record(self.service_name, operation)
+        if self.injector.apply():
+            raise ClientError(
+                {'Error': {'Code': 'ThrottlingException', 'Message': 'Injected failure'}}, operation)
+
+    def get_paginator(self, operation):
+        return FakePaginator(self, operation)
+
+
+class FakePaginator:
+    """
+    按NextToken/Marker循环调用替身方法的分页器。
+    """
+
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        method = getattr(self.client, self.operation)
+        token = None
+        while True:
+            page = method(**kwargs, **({'NextToken': token} if token else {}))
+            yield page
+            token = page.get('NextToken') or page.get('Marker')
+            if not token:
+                return
+
+
+def _page(items, token, page_size):
+    start = int(token or 0)
+    end = start + page_size
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+class FakeEMRClient(FakeAWSClient):
+    service_name = 'emr'
+    page_size = 50
+
+    def describe_cluster(self, ClusterId):
+        self._enter('DescribeCluster')
+        return {'Cluster': {'Id': ClusterId, 'MasterPublicDnsName': '127.0.0.1'}}
+
+    def list_instances(self, ClusterId, InstanceGroupTypes=None, InstanceFleetType=None, InstanceStates=None,
+                       NextToken=None, Marker=None):
+        self._enter('ListInstances')
+        types = {c['Id']: c['Type'] for c in self.state.collections}
+        instances = [
+            instance for instance in self.state.instances
+            if (not InstanceStates or instance['Status']['State'] in InstanceStates)
+            and (not InstanceGroupTypes or types[instance.get('InstanceGroupId') or instance.get('InstanceFleetId')] in InstanceGroupTypes)
+        ]
+        page, token = _page(instances, NextToken or Marker, self.page_size)
+        response = {'Instances': page}
+        if token:
+            response['Marker'] = token
+        return response
+
+    def list_instance_groups(self, ClusterId, NextToken=None, Marker=None):
+        self._enter('ListInstanceGroups')
+        if self.state.use_fleets:
+            raise ClientError({'Error': {'Code': 'InvalidRequestException', 'Message': 'Cluster uses fleets'}},
+                              'ListInstanceGroups')
+        return {'InstanceGroups': [{'Id': c['Id'], 'InstanceGroupType': c['Type']} for c in self.state.collections]}
+
+    def list_instance_fleets(self, ClusterId, NextToken=None, Marker=None):
+        self._enter('ListInstanceFleets')
+        if not self.state.use_fleets:
+            raise ClientError({'Error': {'Code': 'InvalidRequestException', 'Message': 'Cluster uses groups'}},
+                              'ListInstanceFleets')
+        return {'InstanceFleets': [{'Id': c['Id'], 'InstanceFleetType': c['Type']} for c in self.state.collections]}
+
+    def get_managed_scaling_policy(self, ClusterId):
+        self._enter('GetManagedScalingPolicy')
+        return json.loads(json.dumps(self.state.policy))
+
+    def put_managed_scaling_policy(self, ClusterId, ManagedScalingPolicy):
+        self._enter('PutManagedScalingPolicy')
+        self.state.policy = {'ManagedScalingPolicy': json.loads(json.dumps(ManagedScalingPolicy))}
+        return {}
+
+    def modify_instance_fleet(self, ClusterId, InstanceFleet):
+        self._enter('ModifyInstanceFleet')
+        return {}
+
+
+class FakeSSMClient(FakeAWSClient):
+    service_name = 'ssm'
+    page_size = 10
+
+    def __init__(self, state, parameters, injector=None, counter=None):
+        """
+        :param parameters: {完整参数名: 值}，例如 {'/managedScalingEnhanced/minimumUnits': 300}
+        """
+        super().__init__(state, injector, counter)
+        self.parameters = {name: str(value) for name, value in parameters.items()}
+
+    def get_parameters_by_path(self, Path, Recursive=False, WithDecryption=False, NextToken=None):
+        self._enter('GetParametersByPath')
+        items = [{'Name': name, 'Value': value, 'Version': 1}
+                 for name, value in sorted(self.parameters.items()) if name.startswith(f"{Path}/")]
+        page, token = _page(items, NextToken, self.page_size)
+        response = {'Parameters': page}
+        if token:
+            response['NextToken'] = token
+        return response
+
+    def get_parameter(self, Name, WithDecryption=False):
+        self._enter('GetParameter')
+        return {'Parameter': {'Name': Name, 'Value': self.parameters[Name], 'Version': 1}}
+
+
+class FakeCloudWatchClient(FakeAWSClient):
+    service_name = 'cloudwatch'
+    page_size = 100
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy=None, NextToken=None):
+        self._enter('GetMetricData')
+        page, token = _page(MetricDataQueries, NextToken, self.page_size)
+        start = StartTime.replace(tzinfo=timezone.utc, second=0, microsecond=0)
+        minutes = max(1, int((EndTime.replace(tzinfo=timezone.utc) - start).total_seconds() // 60))
+        results = []
+        for query in page:
+            timestamps = [start + timedelta(minutes=i) for i in range(minutes)]
+            results.append({
+                'Id': query['Id'],
+                'Timestamps': timestamps,
+                'Values': [self.state.cpu_value() for _ in timestamps],
+                'StatusCode': 'Complete',
+            })
+        response = {'MetricDataResults': results}
+        if token:
+            response['NextToken'] = token
+        return response
+
+    def get_metric_statistics(self, Namespace, MetricName, Dimensions, StartTime, EndTime, Period, Statistics):
+        self._enter('GetMetricStatistics')
+        minutes = max(1, int((EndTime - StartTime).total_seconds() // Period))
+        return {'Datapoints': [
+            {'Timestamp': StartTime + timedelta(seconds=i * Period), 'Average': self.state.cpu_value()}
+            for i in range(minutes)]}
+
+
+class FakeYarnResourceManager:
+    """
+    本地HTTP服务形式的YARN ResourceManager替身，按路径统计请求次数，支持注入延迟和500错误。
+    """
+
+    def __init__(self, state, injector=None):
+        self.state = state
+        self.injector = injector or FaultInjector()
+        self.counter = Counter()
+        self._lock = threading.Lock()
+        self.server = None
+
+    def _route(self, path):
+        if path == '/ws/v1/cluster/metrics':
+            return {'clusterMetrics': dict(self.state.cluster_metrics)}
+        if path == '/ws/v1/cluster/info':
+            return {'clusterInfo': {'id': 1, 'state': 'STARTED', 'haState': 'ACTIVE'}}
+        if path == '/ws/v1/cluster/scheduler':
+            return {'scheduler': {'schedulerInfo': {'type': 'capacityScheduler', 'queueName': 'root', 'queues': {'queue': []}}}}
+        return None
+
+    def start(self):
+        """
+        在随机端口上启动服务。
+
+        :return: 监听端口
+        """
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 头部和正文分两次写出，关闭Nagle避免与延迟ACK叠加产生约40ms的额外延迟
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                with fake._lock:
+                    fake.counter[path] += 1
+                body = fake._route(path)
+                if fake.injector.apply() or body is None:
+                    status, payload = (500, b'') if body is not None else (404, b'')
+                else:
+                    status, payload = 200, json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, name="fake-yarn-rm", daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counter)
+
+
+def install_fake_clients(registry, clients):
+    """
+    把替身客户端放入进程级AWS客户端注册表，之后所有get_client调用都返回替身。
+
+    :param registry: tools.aws_clients.AWSClientRegistry 实例
+    :param clients: FakeAWSClient 列表
+    """
+    for client in clients:
+        registry._clients[(client.service_name, None)] = client
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# 从仓库根目录导入 tools、yarn_monitor 和 managed_scaling_enhanced
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.utils import Utils
+from tools.aws_clients import registry
+from benchmark.fakes import (CallCounter, FaultInjector, FakeClusterState, FakeEMRClient, FakeSSMClient,
+                             FakeCloudWatchClient, FakeYarnResourceManager, install_fake_clients)
+
+# 与 create_parameter_store.py 相同的默认参数
+DEFAULT_PARAMETERS = {
+    'minimumUnits': 300,
+    'maximumUnits': 1000,
+    'spotInstancesTimeout': 60 * 30,
+    'monitorIntervalSeconds': 30,
+    'actionIntervalSeconds': 30,
+    'inventoryRefreshSeconds': 60,
+    'scaleOutAvgYARNMemoryAvailablePercentageValue': 30,
+    'scaleOutAvgYARNMemoryAvailablePercentageMinutes': 5,
+    'scaleOutAvgCapacityRemainingGBValue': 256,
+    'scaleOutAvgCapacityRemainingGBMinutes': 5,
+    'scaleOutAvgPendingAppNumValue': 3,
+    'scaleOutAvgPendingAppNumMinutes': 5,
+    'scaleOutAvgTaskNodeCPULoadValue': 42,
+    'scaleOutAvgTaskNodeCPULoadMinutes': 15,
+    'scaleInAvgYARNMemoryAvailablePercentageValue': 40,
+    'scaleInAvgYARNMemoryAvailablePercentageMinutes': 3,
+    'scaleInAvgCapacityRemainingGBValue': 5120,
+    'scaleInAvgCapacityRemainingGBMinutes': 3,
+    'scaleInAvgPendingAppNumValue': 2,
+    'scaleInAvgPendingAppNumMinutes': 2,
+    'scaleInAvgTaskNodeCPULoadValue': 30,
+    'scaleInAvgTaskNodeCPULoadMinutes': 15,
+    'scaleOutFactor': 1.5,
+    'scaleInFactor': 1.7,
+    'maximumOnDemandInstancesNumValue': 160,
+    'scaleOutCooldownSeconds': 60 * 7,
+    'scaleInCooldownSeconds': 60 * 5,
+    'forecastEnabled': 0,
+    'forecastLeadSeconds': 300,
+    'forecastAlpha': 0.5,
+    'forecastBeta': 0.2,
+    'scaleOutSizingMode': 'factor',
+    'demandHeadroom': 0.2,
+    'unitVirtualCores': 1,
+    'unitMemoryMB': 0,
+    'queueScaleOutThresholds': '{}',
+}
+
+
+def summarize(durations):
+    """
+    汇总一组耗时(秒)。
+
+    :param durations: 耗时列表
+    :return: {'count', 'mean', 'p50', 'p95', 'max', 'total'}，单位毫秒
+    """
+    if not durations:
+        return {'count': 0}
+    ordered = sorted(durations)
+    return {
+        'count': len(ordered),
+        'mean': statistics.mean(ordered) * 1000,
+        'p50': ordered[len(ordered) // 2] * 1000,
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max': ordered[-1] * 1000,
+        'total': sum(ordered) * 1000,
+    }
+
+
+def measure(func, iterations):
+    """
+    重复执行func并记录每次耗时，异常计数后继续。
+
+    :return: (耗时列表, 失败次数)
+    """
+    durations = []
+    errors = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            errors += 1
+        durations.append(time.perf_counter() - started)
+    return durations, errors
+
+
+class Benchmark:
+    """
+    在本地替身上运行采集器和控制器，统计每个场景的耗时、SQLite耗时和每个API的调用次数。
+
+    EMR、SSM、CloudWatch以替身客户端的形式注入共享的AWS客户端注册表，
+    YARN ResourceManager是本机上的HTTP服务，所有SQLite文件写入临时目录，整个过程不访问网络。
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.prefix = 'managedScalingEnhanced'
+        self.state = FakeClusterState(task_node_count=args.task_nodes, seed=args.seed)
+        self.cluster_id = self.state.cluster_id
+        self.counter = CallCounter()
+        # 失败只在测量的场景内注入，准备阶段(加载配置、预填充数据、创建控制器)不受影响
+        aws_injector = FaultInjector(args.aws_latency_ms / 1000, args.aws_jitter_ms / 1000, 0.0, args.seed)
+        rm_injector = FaultInjector(args.rm_latency_ms / 1000, args.rm_jitter_ms / 1000, 0.0, args.seed)
+        self.injectors = [aws_injector, rm_injector]
+
+        parameters = {f'/{self.prefix}/{name}': value for name, value in DEFAULT_PARAMETERS.items()}
+        install_fake_clients(registry, [
+            FakeEMRClient(self.state, aws_injector, self.counter),
+            FakeSSMClient(self.state, parameters, aws_injector, self.counter),
+            FakeCloudWatchClient(self.state, aws_injector, self.counter),
+        ])
+        self.rm = FakeYarnResourceManager(self.state, rm_injector)
+        self.results = {}
+
+    def run(self):
+        port = self.rm.start()
+        try:
+            # 替身就绪后才导入，模块级的客户端会拿到替身
+            import yarn_monitor
+            from managed_scaling_enhanced import ManagedScalingEnhanced
+            from tools.emr_yarn import EMRMetricManager
+            from tools.emr_ec2_metrics import NodeMetricsRetriever
+            from tools.inventory import get_inventory
+            from tools.metrics_store import get_metrics_store
+            from tools.ssm import get_config_cache
+            from tools.tick_metrics import tick_metrics
+            from tools.yarn_rm import get_yarn_rm_client
+
+            get_yarn_rm_client(self.cluster_id, port=port)
+            config = get_config_cache(self.prefix).get_config()
+            get_inventory(self.cluster_id, refresh_interval_seconds=int(config.get('inventoryRefreshSeconds', 60)))
+            table_name = yarn_monitor.sanitize_table_name(self.cluster_id.replace('-', '_'))
+            store = get_metrics_store(table_name)
+
+            # 预填充历史数据，使所有时间窗口都有足够的样本
+            now = int(time.time())
+            interval = config.monitorIntervalSeconds
+            _, values = yarn_monitor.derive_sample(self.state.cluster_metrics)
+            started = time.perf_counter()
+            for timestamp in range(now - self.args.history_minutes * 60, now, interval):
+                store.append(timestamp, values)
+            store.flush()
+            self.results['history_prefill'] = {
+                'samples': self.args.history_minutes * 60 // interval,
+                'sqlite_ms': (time.perf_counter() - started) * 1000,
+            }
+
+            def collect():
+                metrics = yarn_monitor.get_cluster_metrics(self.cluster_id)
+                write_started = time.perf_counter()
+                yarn_monitor.write_metrics_to_sqlite(store, metrics)
+                collector_sqlite.append(time.perf_counter() - write_started)
+
+            collector_sqlite = []
+            self._scenario('collector_sample', collect, self.args.samples, sqlite=collector_sqlite)
+
+            lookback_minutes = int(max(config.scaleOutAvgTaskNodeCPULoadMinutes, config.scaleInAvgTaskNodeCPULoadMinutes))
+            self._scenario('task_cpu_ingest',
+                           lambda: yarn_monitor.ingest_task_node_cpu(self.cluster_id, table_name, lookback_minutes),
+                           self.args.ingests)
+
+            manager = EMRMetricManager()
+            self._scenario('metric_windows_read',
+                           lambda: manager.get_metric_windows(self.cluster_id, config), self.args.ticks,
+                           sqlite=None, sqlite_is_wall=True)
+
+            retriever = NodeMetricsRetriever()
+            self._scenario('cloudwatch_task_cpu',
+                           lambda: retriever.get_task_node_metrics(self.cluster_id, ['TASK'], ['RUNNING'], lookback_minutes),
+                           self.args.ingests)
+
+            controller = ManagedScalingEnhanced(emr_id=self.cluster_id, prefix=self.prefix)
+            decisions = []
+            tick_metrics._histograms.clear()
+            self._scenario('controller_tick', lambda: decisions.append(controller.tick()), self.args.ticks)
+            self.results['controller_tick']['decisions'] = {
+                str(status): decisions.count(status) for status in sorted(set(decisions), key=str)}
+            self.results['controller_tick']['phases_ms'] = {
+                phase: histogram.sum * 1000 for (cluster_id, phase), histogram in sorted(tick_metrics._histograms.items())
+                if cluster_id == self.cluster_id}
+            self.results['controller_tick']['sqlite_ms'] = self.results['controller_tick']['phases_ms'].get('metric_read', 0.0)
+
+            store.close()
+        finally:
+            self.rm.stop()
+        return self.results
+
+    def _scenario(self, name, func, iterations, sqlite=None, sqlite_is_wall=False):
+        """
+        运行一个场景，记录耗时和该场景内的AWS/RM调用次数。
+        """
+        self.counter.reset()
+        rm_before = self.rm.snapshot()
+        for injector in self.injectors:
+            injector.failure_rate = self.args.failure_rate
+        try:
+            durations, errors = measure(func, iterations)
+        finally:
+            for injector in self.injectors:
+                injector.failure_rate = 0.0
+        rm_after = self.rm.snapshot()
+
+        result = summarize(durations)
+        result['errors'] = errors
+        if sqlite is not None:
+            result['sqlite_ms'] = sum(sqlite) * 1000
+        elif sqlite_is_wall:
+            result['sqlite_ms'] = result.get('total', 0.0)
+        result['aws_calls'] = {f"{service}:{operation}": count
+                               for (service, operation), count in sorted(self.counter.snapshot().items())}
+        result['rm_calls'] = {path: count - rm_before.get(path, 0)
+                              for path, count in sorted(rm_after.items()) if count - rm_before.get(path, 0)}
+        self.results[name] = result
+
+
+def print_report(results):
+    for name, result in results.items():
+        print(f"== {name}")
+        for key in ('count', 'mean', 'p50', 'p95', 'max', 'total', 'errors', 'samples', 'sqlite_ms'):
+            if key in result:
+                value = result[key]
+                print(f"   {key:<10} {value:.2f}" if isinstance(value, float) else f"   {key:<10} {value}")
+        for key in ('decisions', 'phases_ms', 'aws_calls', 'rm_calls'):
+            if result.get(key):
+                print(f"   {key}:")
+                for item, value in result[key].items():
+                    print(f"      {item:<40} {value:.2f}" if isinstance(value, float) else f"      {item:<40} {value}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Offline benchmark for Managed Scaling Enhanced')
+    parser.add_argument('--ticks', type=int, default=20, help='Controller ticks to run (default: 20)')
+    parser.add_argument('--samples', type=int, default=50, help='Collector samples to take (default: 50)')
+    parser.add_argument('--ingests', type=int, default=5, help='Task node CPU ingest runs (default: 5)')
+    parser.add_argument('--task-nodes', type=int, default=200, help='Number of fake task nodes (default: 200)')
+    parser.add_argument('--history-minutes', type=int, default=60, help='Minutes of metric history to prefill (default: 60)')
+    parser.add_argument('--aws-latency-ms', type=float, default=20, help='Injected latency per AWS API call (default: 20)')
+    parser.add_argument('--aws-jitter-ms', type=float, default=5, help='Injected latency jitter per AWS API call (default: 5)')
+    parser.add_argument('--rm-latency-ms', type=float, default=5, help='Injected latency per ResourceManager request (default: 5)')
+    parser.add_argument('--rm-jitter-ms', type=float, default=2, help='Injected latency jitter per ResourceManager request (default: 2)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Probability that any fake call fails (default: 0)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Keep the application INFO logs')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if not args.verbose:
+        Utils.logger.remove()
+        Utils.logger.add(sys.stderr, level="ERROR")
+
+    # 所有SQLite文件和日志写入临时目录
+    with tempfile.TemporaryDirectory(prefix='mse-benchmark-') as workdir:
+        os.chdir(workdir)
+        results = Benchmark(args).run()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+# python benchmark/run.py --ticks 50 --task-nodes 500 --aws-latency-ms 30
@@ -1,8 +1,7 @@
 from tools.utils import Utils
 from tools.ssm import AWSSSMClient
 # 配置loguru的logger
-Utils.logger.add("parameter_store.log",
-                 format="{time} {level} {message}", level="DEBUG")
+Utils.add_file_sink("parameter_store.log")
 
 
 def main():
@@ -21,6 +20,7 @@ def main():
         f'{prefix}/spotInstancesTimeout': 60*30,
         f'{prefix}/monitorIntervalSeconds': 30,
         f'{prefix}/actionIntervalSeconds': 30,
+        f'{prefix}/inventoryRefreshSeconds': 60,  # 实例清单缓存的刷新间隔
 
         f'{prefix}/scaleOutAvgYARNMemoryAvailablePercentageValue': 30,
         f'{prefix}/scaleOutAvgYARNMemoryAvailablePercentageMinutes': 5,
@@ -46,7 +46,23 @@ def main():
         f'{prefix}/maximumOnDemandInstancesNumValue': 160,  # 针对defalut情况下：on_demand instance num = core node num   
 
         f'{prefix}/scaleOutCooldownSeconds': 60 * 7,
-        f'{prefix}/scaleInCooldownSeconds': 60 * 5,      
+        f'{prefix}/scaleInCooldownSeconds': 60 * 5,
+
+        # 需求预测(可选)：预测值在lead time内越过扩容阈值时提前扩容
+        f'{prefix}/forecastEnabled': 0,  # 1: 启用
+        f'{prefix}/forecastLeadSeconds': 300,  # 扩容到位需要的时间
+        f'{prefix}/forecastAlpha': 0.5,  # 水平的平滑系数
+        f'{prefix}/forecastBeta': 0.2,  # 趋势的平滑系数
+
+        # 扩容的容量计算方式(可选)：factor 按系数逐步增加，demand 按等待和预留的资源一次到位
+        f'{prefix}/scaleOutSizingMode': 'factor',
+        f'{prefix}/demandHeadroom': 0.2,  # 需求之上保留的余量比例
+        f'{prefix}/unitVirtualCores': 1,  # 每个容量Unit的vCore数
+        f'{prefix}/unitMemoryMB': 0,  # 每个容量Unit的内存(MB)，0表示按集群的totalMB/totalVirtualCores估算
+
+        # 队列扩容阈值(可选)：JSON，任一队列的窗口平均值达到阈值时直接扩容
+        # 例如 {"root.etl": {"PendingApps": 1, "PendingVirtualCores": 64, "Minutes": 5}}
+        f'{prefix}/queueScaleOutThresholds': '{}',
     }
 
     # 创建AWSSSMClient实例
@@ -1,53 +1,250 @@
 import argparse
-import boto3
+import json
 import time
+from datetime import datetime, timedelta
 from managed_scaling_enhanced import ManagedScalingEnhanced
 from tools.utils import Utils
+from tools.ssm import get_config_cache
+from tools.yarn_rm import get_yarn_rm_client
+from tools.emr_yarn import YarnClusterSnapshot
+from tools.metrics_store import METRIC_COLUMNS, get_metrics_store
+from tools.ring_buffer import RingBufferMetrics, AsyncPersistenceSink
+from tools.tick_metrics import tick_metrics
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
 
 # 配置loguru的logger
-Utils.logger.add("managed_scaling_enhanced.log", format="{time} {level} {message}", level="DEBUG")
+Utils.add_file_sink("managed_scaling_enhanced.log")
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Managed Scaling Enhanced for EMR')
-    parser.add_argument('--emr-id', required=True, help='EMR cluster ID')
+    parser.add_argument('--emr-id', help='EMR cluster ID (required unless --clusters-file is given)')
     parser.add_argument('--prefix', default='managedScalingEnhanced', help='Parameter prefix (default: managedScalingEnhanced)')
     parser.add_argument('--spot-switch-on-demand', type=int, default=0, help='Whether to switch to on-demand instances (0: no, 1: yes, default: 0)')
-    return parser.parse_args()
+    parser.add_argument('--hedge-after-seconds', type=float, default=None, help='Send a hedged request to another master when the ResourceManager has not answered within this many seconds (default: disabled)')
+    parser.add_argument('--unified', action='store_true', help='Run the YARN metric collector in this process and decide from in-memory ring buffers (no separate yarn_monitor.py needed)')
+    parser.add_argument('--async-tick', action='store_true', help='Run the controller tick on asyncio, fetching all inputs concurrently')
+    parser.add_argument('--clusters-file', help='JSON file with a list of {"emrId", "prefix", "spotSwitchOnDemand"} objects; runs collector and controller for all of them in this process')
+    parser.add_argument('--max-workers', type=int, default=10, help='Size of the worker pool shared by all clusters in --clusters-file mode (default: 10)')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve per-phase tick latency metrics in OpenMetrics format on http://127.0.0.1:PORT/metrics (default: disabled)')
+    parser.add_argument('--metrics-textfile', default=None, help='Periodically write per-phase tick latency metrics to this file for the node_exporter textfile collector (default: disabled)')
+    args = parser.parse_args()
+    if not args.emr_id and not args.clusters_file:
+        parser.error('--emr-id or --clusters-file is required')
+    return args
+
+class UnifiedCollectorController:
+    """
+    单进程模式：采集器把每个样本写入内存环形缓冲区，决策引擎直接从缓冲区读取时间窗口，
+    SQLite只作为异步持久化的落盘目标。每次采样后如果到了执行间隔就立即做决策，
+    样本到决策之间几乎没有延迟。
+    """
+
+    def __init__(self, emr_id, prefix, spot_switch_on_demand=0, sink=None):
+        """
+        :param emr_id: EMR集群ID
+        :param prefix: 参数前缀
+        :param spot_switch_on_demand: 是否补充On-Demand实例 (0: 否, 1: 是)
+        :param sink: 共享的AsyncPersistenceSink(多集群模式)，默认为本集群单独创建
+        """
+        # 采集相关函数复用yarn_monitor，仅在单进程模式下导入
+        import yarn_monitor
+        self.yarn_monitor = yarn_monitor
+
+        self.emr_id = emr_id
+        self.config = get_config_cache(prefix).get_config()
+        self.table_name = yarn_monitor.sanitize_table_name(emr_id.replace('-', '_'))
+        self.store = get_metrics_store(self.table_name)
+        self._owns_sink = sink is None
+        self.sink = sink or AsyncPersistenceSink(self.store)
+
+        # 缓冲区至少能容纳最大时间窗口的两倍样本
+        max_window_minutes = max(
+            self.config.get_metric_window_minutes(metric_name, scale_status)
+            for metric_name in METRIC_COLUMNS
+            for scale_status in ('scaleOut', 'scaleIn'))
+        capacity = max(128, int(max_window_minutes * 60 // self.config.monitorIntervalSeconds) * 2)
+        self.ring_buffer = RingBufferMetrics(capacity)
+
+        self.controller = ManagedScalingEnhanced(
+            emr_id=emr_id, prefix=prefix, spot_switch_on_demand=spot_switch_on_demand, metric_source=self.ring_buffer)
+
+        # 用SQLite中已有的历史数据预热，重启后无需等待窗口重新填满
+        try:
+            self.ring_buffer.load(self.controller.emr_metric_manager.get_metric_windows(emr_id, self.config, max_window_minutes))
+        except Exception as e:
+            Utils.logger.warning(f"Could not warm up ring buffer from SQLite: {e}")
+
+        self.last_tick_time = 0
+
+    @Utils.exception_handler
+    def collect_and_tick(self):
+        """
+        采集一个样本写入环形缓冲区和持久化队列，到了执行间隔时立即用同一份数据做决策。
+        """
+        with tick_metrics.time(self.emr_id, 'rm'):
+            metrics = self.yarn_monitor.get_cluster_metrics(self.emr_id)
+        timestamp, values = self.yarn_monitor.derive_sample(metrics)
+        self.ring_buffer.append(timestamp, values)
+        self.sink.put(timestamp, values, self.store)
+
+        action_interval_seconds = get_config_cache(self.controller.prefix).get_config().actionIntervalSeconds
+        if time.time() - self.last_tick_time >= action_interval_seconds:
+            self.last_tick_time = time.time()
+            self.controller.tick(YarnClusterSnapshot.from_metrics(self.emr_id, metrics))
+
+    def close(self):
+        if self._owns_sink:
+            self.sink.close()
+        self.store.close()
+
 
 @Utils.exception_handler
-def run_managed_scaling_enhanced(emr_id, prefix, spot_switch_on_demand):
-    managed_scaling_enhanced_client = ManagedScalingEnhanced(emr_id=emr_id, prefix=prefix, spot_switch_on_demand=spot_switch_on_demand)
-
-    scaleStatus = managed_scaling_enhanced_client.determine_scale_status()
-    Utils.logger.info(f"Scale Status: {scaleStatus}")
-
-    if scaleStatus == 1:
-        Utils.logger.info("Executing scale out operation...")
-        managed_scaling_enhanced_client.scale_out()
-    elif scaleStatus == -1:
-        Utils.logger.info("Executing scale in operation...")
-        managed_scaling_enhanced_client.scale_in()
-    else:
-        Utils.logger.info("No scaling operation required.")
+def schedule_unified(emr_id, prefix, spot_switch_on_demand=0, hedge_after_seconds=None):
+    """
+    以单进程模式运行采集器和控制器。
+
+    :param emr_id: EMR集群ID
+    :param prefix: 参数前缀
+    :param spot_switch_on_demand: 是否补充On-Demand实例 (0: 否, 1: 是)
+    :param hedge_after_seconds: ResourceManager对冲请求的延迟预算(秒)，为None时不对冲
+    """
+    scheduler = BackgroundScheduler()
+
+    # 初始化共享的ResourceManager客户端(连接池、超时、重试和熔断)
+    get_yarn_rm_client(emr_id, hedge_after_seconds=hedge_after_seconds)
+
+    runner = UnifiedCollectorController(emr_id, prefix, spot_switch_on_demand)
+    config = runner.config
+
+    # 采集间隔决定决策的最小延迟，决策本身仍按actionIntervalSeconds执行
+    scheduler.add_job(runner.collect_and_tick, 'interval', seconds=config.monitorIntervalSeconds)
+
+    # 队列指标采集，直接写入SQLite供队列阈值判断读取
+    scheduler.add_job(runner.yarn_monitor.queue_table_main, 'interval', args=[
+                      emr_id, runner.table_name], seconds=config.monitorIntervalSeconds)
+
+    # Task Node CPU增量采集
+    lookback_minutes = int(max(config.scaleOutAvgTaskNodeCPULoadMinutes, config.scaleInAvgTaskNodeCPULoadMinutes))
+    scheduler.add_job(runner.yarn_monitor.ingest_task_node_cpu, 'interval', args=[
+                      emr_id, runner.table_name, lookback_minutes], seconds=runner.yarn_monitor.TASK_NODE_CPU_INTERVAL_SECONDS)
+
+    scheduler.start()
+
+    try:
+        # 主线程继续运行，直到按Ctrl+C或发生异常
+        while True:
+            time.sleep(1)
+    except (KeyboardInterrupt, SystemExit):
+        # 关闭调度器
+        scheduler.shutdown()
+        runner.close()
+        Utils.logger.info("Scheduler shutdown successfully.")
+
+
+def load_clusters_file(path, default_prefix='managedScalingEnhanced', default_spot_switch_on_demand=0):
+    """
+    读取多集群配置文件。
+
+    :param path: JSON文件路径，内容为 [{"emrId": "j-xxx", "prefix": "...", "spotSwitchOnDemand": 0}, ...]
+    :param default_prefix: 未指定prefix时使用的参数前缀
+    :param default_spot_switch_on_demand: 未指定spotSwitchOnDemand时使用的值
+    :return: [(emr_id, prefix, spot_switch_on_demand), ...]
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    return [
+        (entry['emrId'], entry.get('prefix', default_prefix), int(entry.get('spotSwitchOnDemand', default_spot_switch_on_demand)))
+        for entry in entries
+    ]
+
+
+@Utils.exception_handler
+def schedule_multi_cluster(clusters, hedge_after_seconds=None, max_workers=10):
+    """
+    在一个进程中为多个集群运行采集器和控制器。
+
+    所有集群共用一个调度器和线程池、一个持久化写入线程和一个存储维护线程；
+    AWS客户端、参数缓存(同一前缀只加载一次)和ResourceManager连接池都是进程级共享的。
+    每个集群的任务按 序号/集群数 的比例错开首次执行时间，把API调用均匀分布在整个间隔内。
+
+    :param clusters: [(emr_id, prefix, spot_switch_on_demand), ...]
+    :param hedge_after_seconds: ResourceManager对冲请求的延迟预算(秒)，为None时不对冲
+    :param max_workers: 共享线程池的大小
+    """
+    scheduler = BackgroundScheduler(executors={'default': ThreadPoolExecutor(max_workers)},
+                                    job_defaults={'coalesce': True, 'max_instances': 1})
+    sink = AsyncPersistenceSink()
+
+    runners = []
+    for emr_id, prefix, spot_switch_on_demand in clusters:
+        get_yarn_rm_client(emr_id, hedge_after_seconds=hedge_after_seconds)
+        try:
+            runners.append(UnifiedCollectorController(emr_id, prefix, spot_switch_on_demand, sink=sink))
+        except Exception as e:
+            # 单个集群初始化失败不影响其他集群
+            Utils.logger.error(f"Failed to initialise cluster '{emr_id}', skipping it: {e}")
+
+    now = datetime.now()
+    for i, runner in enumerate(runners):
+        config = runner.config
+        stagger = i / len(runners)
+
+        scheduler.add_job(runner.collect_and_tick, 'interval', seconds=config.monitorIntervalSeconds,
+                          next_run_time=now + timedelta(seconds=stagger * config.monitorIntervalSeconds),
+                          id=f"collect-{runner.emr_id}")
+
+        scheduler.add_job(runner.yarn_monitor.queue_table_main, 'interval', args=[
+                          runner.emr_id, runner.table_name], seconds=config.monitorIntervalSeconds,
+                          next_run_time=now + timedelta(seconds=stagger * config.monitorIntervalSeconds),
+                          id=f"queues-{runner.emr_id}")
+
+        lookback_minutes = int(max(config.scaleOutAvgTaskNodeCPULoadMinutes, config.scaleInAvgTaskNodeCPULoadMinutes))
+        cpu_interval_seconds = runner.yarn_monitor.TASK_NODE_CPU_INTERVAL_SECONDS
+        scheduler.add_job(runner.yarn_monitor.ingest_task_node_cpu, 'interval', args=[
+                          runner.emr_id, runner.table_name, lookback_minutes], seconds=cpu_interval_seconds,
+                          next_run_time=now + timedelta(seconds=stagger * cpu_interval_seconds),
+                          id=f"task-cpu-{runner.emr_id}")
+
+    Utils.logger.info(f"Scheduled {len(runners)} of {len(clusters)} clusters on a shared pool of {max_workers} workers.")
+    scheduler.start()
+
+    try:
+        # 主线程继续运行，直到按Ctrl+C或发生异常
+        while True:
+            time.sleep(1)
+    except (KeyboardInterrupt, SystemExit):
+        # 关闭调度器
+        scheduler.shutdown()
+        sink.close()
+        for runner in runners:
+            runner.close()
+        Utils.logger.info("Scheduler shutdown successfully.")
+
 
 @Utils.exception_handler
-def schedule_main(emr_id, prefix):
+def schedule_main(emr_id, prefix, spot_switch_on_demand=0, hedge_after_seconds=None):
     """
-    初始化调度器并添加run_managed_scaling_enhanced函数作为定时任务。
+    初始化常驻的ManagedScalingEnhanced控制器，并将其tick方法添加为定时任务。
 
     :param emr_id: EMR集群ID
     :param prefix: 参数前缀
+    :param spot_switch_on_demand: 是否补充On-Demand实例 (0: 否, 1: 是)
+    :param hedge_after_seconds: ResourceManager对冲请求的延迟预算(秒)，为None时不对冲
     """
     scheduler = BackgroundScheduler()
 
+    # 初始化共享的ResourceManager客户端(连接池、超时、重试和熔断)
+    get_yarn_rm_client(emr_id, hedge_after_seconds=hedge_after_seconds)
+
     # 从AWS参数存储中获取监控间隔时间
-    ssm_client = boto3.client('ssm')
-    monitor_interval_seconds = int(ssm_client.get_parameter(
-        Name=f"/{prefix}/actionIntervalSeconds", WithDecryption=True)["Parameter"]["Value"])
+    monitor_interval_seconds = get_config_cache(prefix).get_config().actionIntervalSeconds
+
+    # 控制器在进程生命周期内常驻，tick之间复用客户端、配置和冷却状态
+    controller = ManagedScalingEnhanced(emr_id=emr_id, prefix=prefix, spot_switch_on_demand=spot_switch_on_demand)
 
-    # 添加定时任务，每隔monitor_interval_seconds秒执行一次run_managed_scaling_enhanced函数
-    scheduler.add_job(run_managed_scaling_enhanced, 'interval', args=[emr_id, prefix, args.spot_switch_on_demand], seconds=monitor_interval_seconds)
+    # 添加定时任务，每隔monitor_interval_seconds秒执行一次controller.tick
+    scheduler.add_job(controller.tick, 'interval', seconds=monitor_interval_seconds)
 
     # 启动调度器
     scheduler.start()
@@ -65,6 +262,22 @@ if __name__ == '__main__':
     # 解析命令行参数
     args = parse_arguments()
 
-    schedule_main(args.emr_id, args.prefix)
+    # 导出每个阶段的tick耗时
+    if args.metrics_port is not None:
+        tick_metrics.start_http_server(args.metrics_port)
+    if args.metrics_textfile:
+        tick_metrics.start_textfile_writer(args.metrics_textfile)
+
+    if args.clusters_file:
+        schedule_multi_cluster(load_clusters_file(args.clusters_file, args.prefix, args.spot_switch_on_demand),
+                               args.hedge_after_seconds, args.max_workers)
+    elif args.async_tick:
+        from aio_managed_scaling_enhanced import schedule_async
+        schedule_async(args.emr_id, args.prefix, args.spot_switch_on_demand, args.hedge_after_seconds)
+    elif args.unified:
+        schedule_unified(args.emr_id, args.prefix, args.spot_switch_on_demand, args.hedge_after_seconds)
+    else:
+        schedule_main(args.emr_id, args.prefix, args.spot_switch_on_demand, args.hedge_after_seconds)
 
-# python main.py --emr-id j-1F74M1P9SC57B --prefix managedScalingEnhanced 
\ No newline at end of file
+# python main.py --emr-id j-1F74M1P9SC57B --prefix managedScalingEnhanced
+# python main.py --clusters-file clusters.json --max-workers 16
@@ -1,83 +1,162 @@
+import os
+import time
 import statistics
 import sqlite3
+from dataclasses import fields
 from datetime import datetime, timedelta
 from tools.utils import Utils
-from tools.ssm import AWSSSMClient
+from tools.ssm import get_config_cache
 from tools.emr_ec2_metrics import NodeMetricsRetriever
 from tools.emr_yarn import EMRMetricManager
 from tools.emr import AWSEMRClient
+from tools.inventory import get_inventory
+from tools.tick_metrics import tick_metrics
+from tools.metrics_store import METRIC_COLUMNS
+from tools.scaling_policy import (LazyInputs, decide_scale_status, compute_scale_out_units, compute_scale_in_units,
+                                  compute_demand_scale_out_units, get_sizing_settings)
+from tools.forecast import DemandForecaster, get_forecast_settings
+from tools.yarn_queues import get_queue_thresholds, check_queue_thresholds
+
+# 本地最新样本的年龄不超过多少个采样间隔时，决策直接使用本地的clusterMetrics
+LOCAL_SNAPSHOT_MAX_AGE_INTERVALS = 3
 
 # 配置loguru的logger
-# Utils.logger.add("managed_scaling_enhanced.log",
-#                  format="{time} {level} {message}", level="DEBUG")
+# Utils.add_file_sink("managed_scaling_enhanced.log")
 
 
 class ManagedScalingEnhanced:
-    def __init__(self, emr_id='j-1F74M1P9SC57B', prefix="managedScalingEnhanced",spot_switch_on_demand=0):
+    def __init__(self, emr_id='j-1F74M1P9SC57B', prefix="managedScalingEnhanced",spot_switch_on_demand=0, metric_source=None):
+        """
+        :param emr_id: EMR集群ID
+        :param prefix: 参数前缀
+        :param spot_switch_on_demand: 是否补充On-Demand实例 (0: 否, 1: 是)
+        :param metric_source: 提供get_metric_windows的指标来源，默认读取yarn_monitor写入的SQLite，
+                              单进程模式下传入内存中的RingBufferMetrics
+        """
         self.emr_id = emr_id
         self.prefix = prefix
         self.spot_switch_on_demand = spot_switch_on_demand
         # self.last_scale_out_time = 0
         # self.last_scale_in_time = 0
-        self.ssm_client = AWSSSMClient()
         self.nodeMetrics_client = NodeMetricsRetriever()
         self.emr_metric_manager = EMRMetricManager()
+        self.metric_source = metric_source or self.emr_metric_manager
+        self.emr_client = AWSEMRClient()
         self.parameters = self._get_parameters()
+        self.inventory = get_inventory(emr_id, emr_client=self.emr_client,
+                                       refresh_interval_seconds=int(self.config.get('inventoryRefreshSeconds', 60)))
+        self._last_scale_times_mtime = None
         self.get_last_scale_times()
+        self.yarn_snapshot = None
+        # 需求预测模型在tick之间常驻，每个新样本只增量更新一次
+        self.forecaster = DemandForecaster()
+
+    @Utils.exception_handler
+    def refresh(self):
+        """
+        在每次tick开始时增量刷新配置和状态：配置由共享缓存按TTL和版本号刷新，
+        冷却状态只有在SQLite文件发生变化(例如本进程刚完成扩缩容)时才重新读取，
+        与每次tick新建对象时的行为保持一致。
+        """
+        if get_config_cache(self.prefix).get_config() is not self.config:
+            self._get_parameters()
+            Utils.logger.info(f"Parameters for prefix '/{self.prefix}' changed, reloaded.")
+
+        sanitized_table_name = self.sanitize_table_name(f"{self.emr_id}_ms_last_scale_times")
+        db_path = f"{sanitized_table_name}.db"
+        if os.path.exists(db_path) and os.path.getmtime(db_path) != self._last_scale_times_mtime:
+            self.get_last_scale_times()
+
+        # 每个tick使用新的YARN快照
+        self.yarn_snapshot = None
+
+    @Utils.exception_handler
+    def tick(self, snapshot=None):
+        """
+        执行一次完整的扩缩容判断和操作。控制器对象在进程生命周期内常驻，
+        客户端、配置和状态在tick之间复用。
+
+        :param snapshot: 已获取的YarnClusterSnapshot(例如单进程模式下采集器刚拿到的数据)，默认新建
+        :return: 本次的扩缩容状态 (1: scaleOut, -1: scaleIn, 0: 无操作)
+        """
+        started = time.monotonic()
+        try:
+            with tick_metrics.time(self.emr_id, 'config'):
+                self.refresh()
+
+            # 每个tick只获取一次YARN集群指标快照，决策和扩缩容共用
+            if snapshot is None:
+                snapshot = self.get_yarn_snapshot()
+
+            scaleStatus = self.determine_scale_status(snapshot)
+            self.execute_scale_status(scaleStatus, snapshot)
+            return scaleStatus
+        finally:
+            tick_metrics.record_tick(self.emr_id, time.monotonic() - started, self.actionIntervalSeconds)
+
+    @Utils.exception_handler
+    def execute_scale_status(self, scaleStatus, snapshot=None):
+        """
+        按扩缩容状态执行对应的操作。
+
+        :param scaleStatus: 1: scaleOut, -1: scaleIn, 0: 无操作
+        :param snapshot: 本次tick的YarnClusterSnapshot
+        """
+        Utils.logger.info(f"Scale Status: {scaleStatus}")
+
+        if scaleStatus == 1:
+            Utils.logger.info("Executing scale out operation...")
+            self.scale_out(snapshot)
+        elif scaleStatus == -1:
+            Utils.logger.info("Executing scale in operation...")
+            self.scale_in(snapshot)
+        else:
+            Utils.logger.info("No scaling operation required.")
 
     @Utils.exception_handler
     def get_current_max_unit_num(self):
-        emr_client = AWSEMRClient()
-        policy = emr_client.get_managed_scaling_policy(self.emr_id)
+        with tick_metrics.time(self.emr_id, 'policy_read'):
+            policy = self.emr_client.get_managed_scaling_policy(self.emr_id)
         compute_limits = policy.get(
             'ManagedScalingPolicy', {}).get('ComputeLimits', {})
         return compute_limits.get('MaximumCapacityUnits', 0)
 
+    @Utils.exception_handler
+    def get_yarn_snapshot(self):
+        """
+        创建本次tick的YARN集群指标快照，determine_scale_status、scale_out和scale_in共用同一份数据。
+        优先使用采集器写入本地表的最新样本，本地样本过旧时才请求ResourceManager。
+
+        :return: YarnClusterSnapshot 实例
+        """
+        self.yarn_snapshot = self.emr_metric_manager.get_yarn_snapshot(
+            self.emr_id, max_age_seconds=LOCAL_SNAPSHOT_MAX_AGE_INTERVALS * self.config.monitorIntervalSeconds)
+        return self.yarn_snapshot
+
+    def _resolve_yarn_snapshot(self, snapshot):
+        """
+        返回传入的快照；未传入时复用本次tick已有的快照，都没有时新建一个。
+        """
+        if snapshot is not None:
+            self.yarn_snapshot = snapshot
+        elif self.yarn_snapshot is None:
+            self.get_yarn_snapshot()
+        return self.yarn_snapshot
+
     @Utils.exception_handler
     def _get_parameters(self):
-        parameter_names = [
-            f'/{self.prefix}/minimumUnits',
-            f'/{self.prefix}/maximumUnits',
-            f'/{self.prefix}/scaleOutAvgYARNMemoryAvailablePercentageValue',
-            f'/{self.prefix}/scaleOutAvgCapacityRemainingGBValue',
-            f'/{self.prefix}/scaleOutAvgPendingAppNumValue',
-            f'/{self.prefix}/scaleOutAvgTaskNodeCPULoadValue',
-            f'/{self.prefix}/scaleInAvgYARNMemoryAvailablePercentageValue',
-            f'/{self.prefix}/scaleInAvgCapacityRemainingGBValue',
-            f'/{self.prefix}/scaleInAvgPendingAppNumValue',
-            f'/{self.prefix}/scaleInAvgTaskNodeCPULoadValue',
-            f'/{self.prefix}/scaleOutAvgTaskNodeCPULoadMinutes',
-            f'/{self.prefix}/scaleInAvgTaskNodeCPULoadMinutes',
-            f'/{self.prefix}/scaleOutFactor',
-            f'/{self.prefix}/scaleInFactor',
-            f'/{self.prefix}/spotInstancesTimeout',
-            f'/{self.prefix}/maximumOnDemandInstancesNumValue',
-            f'/{self.prefix}/scaleOutCooldownSeconds',
-            f'/{self.prefix}/scaleInCooldownSeconds',
-        ]
-
-        parameters = [self.ssm_client.get_parameters_from_parameter_store(i) for i in parameter_names]
-
-        # 转换参数类型
-        self.minimumUnits = int(parameters[0])
-        self.maximumUnits = int(parameters[1])
-        self.scaleOutAvgYARNMemoryAvailablePercentageValue = float(parameters[2])
-        self.scaleOutAvgCapacityRemainingGBValue = float(parameters[3])
-        self.scaleOutAvgPendingAppNumValue = float(parameters[4])
-        self.scaleOutAvgTaskNodeCPULoadValue = float(parameters[5])
-        self.scaleInAvgYARNMemoryAvailablePercentageValue = float(parameters[6])
-        self.scaleInAvgCapacityRemainingGBValue = float(parameters[7])
-        self.scaleInAvgPendingAppNumValue = float(parameters[8])
-        self.scaleInAvgTaskNodeCPULoadValue = float(parameters[9])
-        self.scaleOutAvgTaskNodeCPULoadMinutes = float(parameters[10])
-        self.scaleInAvgTaskNodeCPULoadMinutes = float(parameters[11])
-        self.scaleOutFactor = float(parameters[12])
-        self.scaleInFactor = float(parameters[13])
-        self.spotInstancesTimeout = int(parameters[14])
-        self.maximumOnDemandInstancesNumValue = int(parameters[15])
-        self.scaleOutCooldownSeconds = int(parameters[16])
-        self.scaleInCooldownSeconds = int(parameters[17])
+        """
+        从共享的Parameter Store配置缓存中读取参数，并展开为实例属性。
 
+        :return: ScalingConfig 实例
+        """
+        self.config = get_config_cache(self.prefix).get_config()
+
+        # 保留原有的实例属性，方便扩缩容逻辑直接引用
+        for f in fields(self.config):
+            if f.name not in ('prefix', 'raw'):
+                setattr(self, f.name, getattr(self.config, f.name))
+        return self.config
 
     @Utils.exception_handler
     def get_last_scale_times(self):
@@ -97,6 +176,7 @@ class ManagedScalingEnhanced:
             self.last_scale_out_time, self.last_scale_in_time = 0, 0
             Utils.logger.info("No previous scale times found, setting to 0")
         conn.close()
+        self._last_scale_times_mtime = os.path.getmtime(f"{sanitized_table_name}.db")
 
     @Utils.exception_handler
     def update_last_scale_times(self):
@@ -125,179 +205,133 @@ class ManagedScalingEnhanced:
         return ''.join(c if c.isalnum() or c == '_' else '_' for c in table_name)
 
     @Utils.exception_handler
-    def determine_scale_status(self):
-        """
-        根据输入的监控数据和当前Unit，决定是否扩缩容。
+    def get_task_node_cpu(self, window_minutes):
         """
-        currentMaxUnitNum = self.get_current_max_unit_num()
-        Utils.logger.info(
-            f"The current cluster's Maximum Capacity Units value: {currentMaxUnitNum}")
-
-        Utils.logger.info(
-            "Obtain relevant metrics for scaleOut.⬆️ ⬆️ ⬆️ ⬆️ ⬆️ ⬆️ ⬆️")
-
-        scaleOutYARNMemoryAvailablePercentageList = self.emr_metric_manager.get_data_from_sqlite(
-            emr_cluster_id=self.emr_id,
-            metric_name="YARNMemoryAvailablePercentage",
-            prefix=self.prefix,
-            ScaleStatus="scaleOut"
-        )
-        scaleOutCapacityRemainingGBList = self.emr_metric_manager.get_data_from_sqlite(
-            emr_cluster_id=self.emr_id,
-            metric_name="CapacityRemainingGB",
-            prefix=self.prefix,
-            ScaleStatus="scaleOut"
-        )
-        scaleOutpendingAppNumList = self.emr_metric_manager.get_data_from_sqlite(
-            emr_cluster_id=self.emr_id,
-            metric_name="PendingAppNum",
-            prefix=self.prefix,
-            ScaleStatus="scaleOut"
-        )
-        scaleOuttaskNodeCPULoadList = self.nodeMetrics_client.get_task_node_metrics(
-            self.emr_id, instance_group_types_list=['TASK'], instance_states_list=['RUNNING'], window_minutes=self.scaleOutAvgTaskNodeCPULoadMinutes)
-
-        Utils.logger.info(
-            "Obtain relevant metrics for scaleOut.⬇️ ⬇️ ⬇️ ⬇️ ⬇️ ⬇️ ⬇️")
-
-        scaleInYARNMemoryAvailablePercentageList = self.emr_metric_manager.get_data_from_sqlite(
-            emr_cluster_id=self.emr_id,
-            metric_name="YARNMemoryAvailablePercentage",
-            prefix=self.prefix,
-            ScaleStatus="scaleIn"
-        )
-        scaleInCapacityRemainingGBList = self.emr_metric_manager.get_data_from_sqlite(
-            emr_cluster_id=self.emr_id,
-            metric_name="CapacityRemainingGB",
-            prefix=self.prefix,
-            ScaleStatus="scaleIn"
-        )
-        scaleInpendingAppNumList = self.emr_metric_manager.get_data_from_sqlite(
-            emr_cluster_id=self.emr_id,
-            metric_name="PendingAppNum",
-            prefix=self.prefix,
-            ScaleStatus="scaleIn"
-        )
-        scaleIntaskNodeCPULoadList = self.nodeMetrics_client.get_task_node_metrics(
-            self.emr_id, instance_group_types_list=['TASK'], instance_states_list=['RUNNING'], window_minutes=self.scaleInAvgTaskNodeCPULoadMinutes)
-
-        monitoring_data_lists = [
-            scaleOutYARNMemoryAvailablePercentageList,
-            scaleOutCapacityRemainingGBList,
-            scaleOutpendingAppNumList,
-            scaleOuttaskNodeCPULoadList,
-            scaleInYARNMemoryAvailablePercentageList,
-            scaleInCapacityRemainingGBList,
-            scaleInpendingAppNumList,
-            scaleIntaskNodeCPULoadList
-        ]
-
-        if not all(monitoring_data_lists):
-            Utils.logger.info(
-                "At least one of the input monitoring data lists is empty, so no scaling operations will be performed.")
-            return 0
-
-        # 判断逻辑
-        # scaleOut单项条件状态 🐒
-        scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus = statistics.mean(
-            scaleOutYARNMemoryAvailablePercentageList)*100 <= self.scaleOutAvgYARNMemoryAvailablePercentageValue
-        Utils.logger.info(
-            f"scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus: {scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus}, scaleOutYARNMemoryAvailablePercentageList mean: {statistics.mean(scaleOutYARNMemoryAvailablePercentageList)*100}, scaleOutAvgYARNMemoryAvailablePercentageValue: {self.scaleOutAvgYARNMemoryAvailablePercentageValue}")
-
-        scaleOutMemoryConditionCapacityRemainingGBStatus = statistics.mean(
-            scaleOutCapacityRemainingGBList) <= self.scaleOutAvgCapacityRemainingGBValue
-        Utils.logger.info(
-            f"scaleOutMemoryConditionCapacityRemainingGBStatus: {scaleOutMemoryConditionCapacityRemainingGBStatus}, scaleOutCapacityRemainingGBList mean: {statistics.mean(scaleOutCapacityRemainingGBList)}, scaleOutAvgCapacityRemainingGBValue: {self.scaleOutAvgCapacityRemainingGBValue}")
-
-        scaleOutAppConditionPendingAppNumStatus = statistics.mean(
-            scaleOutpendingAppNumList) >= self.scaleOutAvgPendingAppNumValue
-        Utils.logger.info(
-            f"scaleOutAppConditionPendingAppNumStatus: {scaleOutAppConditionPendingAppNumStatus}, scaleOutpendingAppNumList mean: {statistics.mean(scaleOutpendingAppNumList)}, scaleOutAvgPendingAppNumValue: {self.scaleOutAvgPendingAppNumValue}")
+        获取Task Node的每分钟平均CPU。优先读取yarn_monitor写入的本地数据，
+        本地没有数据或窗口未填满(例如采集器未运行或刚启动)时回退到CloudWatch。
 
-        scaleOutCPULoadStatus = statistics.mean(
-            scaleOuttaskNodeCPULoadList) >= self.scaleOutAvgTaskNodeCPULoadValue
-        Utils.logger.info(
-            f"scaleOutCPULoadStatus: {scaleOutCPULoadStatus}, scaleOuttaskNodeCPULoadList mean: {statistics.mean(scaleOuttaskNodeCPULoadList)}, scaleOutAvgTaskNodeCPULoadValue: {self.scaleOutAvgTaskNodeCPULoadValue}")
-
-        scaleOutcurrentMaxUnitNumStatus = currentMaxUnitNum < self.maximumUnits
-        Utils.logger.info(
-            f"scaleOutcurrentMaxUnitNumStatus: {scaleOutcurrentMaxUnitNumStatus}, currentMaxUnitNum: {currentMaxUnitNum}, maximumUnits: {self.maximumUnits}")
-
-        # scaleOut综合条件
-        scaleOutMemoryCondition = scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus or scaleOutMemoryConditionCapacityRemainingGBStatus
-        Utils.logger.info(
-            f"scaleOutMemoryCondition: {scaleOutMemoryCondition}")
-
-        scaleOutPendingAppNumCondition = scaleOutAppConditionPendingAppNumStatus
-        Utils.logger.info(
-            f"scaleOutPendingAppNumCondition: {scaleOutPendingAppNumCondition}")
-
-        scaleOutCPULoadCondition = scaleOutCPULoadStatus
-        Utils.logger.info(
-            f"scaleOutCPULoadCondition: {scaleOutCPULoadCondition}")
-
-        scaleOutcurrentMaxUnitCondition = scaleOutcurrentMaxUnitNumStatus
-        Utils.logger.info(
-            f"scaleOutcurrentMaxUnitCondition: {scaleOutcurrentMaxUnitCondition}")
+        :param window_minutes: 时间窗口(分钟)
+        :return: 每分钟平均CPU列表
+        """
+        with tick_metrics.time(self.emr_id, 'metric_read'):
+            records = self.emr_metric_manager.get_task_node_cpu_from_sqlite(self.emr_id, window_minutes)
+        if records:
+            return records
 
-        scaleOutCondition = (scaleOutMemoryCondition or scaleOutPendingAppNumCondition) and scaleOutCPULoadCondition and scaleOutcurrentMaxUnitCondition
-        Utils.logger.info(f"scaleOutCondition: {scaleOutCondition}")
+        Utils.logger.info(f"No complete local task node CPU data for the last {window_minutes} minutes, falling back to CloudWatch.")
+        with tick_metrics.time(self.emr_id, 'cloudwatch'):
+            return self.nodeMetrics_client.get_task_node_metrics(
+                self.emr_id, instance_group_types_list=['TASK'], instance_states_list=['RUNNING'], window_minutes=window_minutes)
 
-        # scaleIn单项条件状态 🐒
-        scaleInMemoryConditionYARNMemoryAvailablePercentageStatus = statistics.mean(
-            scaleInYARNMemoryAvailablePercentageList)*100 > self.scaleInAvgYARNMemoryAvailablePercentageValue
-        Utils.logger.info(
-            f"scaleInMemoryConditionYARNMemoryAvailablePercentageStatus: {scaleInMemoryConditionYARNMemoryAvailablePercentageStatus}, scaleInYARNMemoryAvailablePercentageList mean: {statistics.mean(scaleInYARNMemoryAvailablePercentageList)*100}, scaleInAvgYARNMemoryAvailablePercentageValue: {self.scaleInAvgYARNMemoryAvailablePercentageValue}")
+    @Utils.exception_handler
+    def determine_scale_status(self, snapshot=None):
+        """
+        根据输入的监控数据和当前Unit，决定是否扩缩容。
+        指标时间窗口、Task Node CPU、需求预测和队列阈值都只在判断树需要时才获取。
 
-        scaleInMemoryConditionCapacityRemainingGBStatus = statistics.mean(
-            scaleInCapacityRemainingGBList) > self.scaleInAvgCapacityRemainingGBValue
+        :param snapshot: 本次tick的YarnClusterSnapshot，会继续传给scale_out/scale_in使用
+        """
+        self._resolve_yarn_snapshot(snapshot)
+        currentMaxUnitNum = self.get_current_max_unit_num()
         Utils.logger.info(
-            f"scaleInMemoryConditionCapacityRemainingGBStatus: {scaleInMemoryConditionCapacityRemainingGBStatus}, scaleInCapacityRemainingGBList mean: {statistics.mean(scaleInCapacityRemainingGBList)}, scaleInAvgCapacityRemainingGBValue: {self.scaleInAvgCapacityRemainingGBValue}")
+            f"The current cluster's Maximum Capacity Units value: {currentMaxUnitNum}")
 
-        scaleInAppConditionPendingAppNumStatus = statistics.mean(
-            scaleInpendingAppNumList) < self.scaleInAvgPendingAppNumValue
-        Utils.logger.info(
-            f"scaleInAppConditionPendingAppNumStatus: {scaleInAppConditionPendingAppNumStatus}, scaleInpendingAppNumList mean: {statistics.mean(scaleInpendingAppNumList)}, scaleInAvgPendingAppNumValue: {self.scaleInAvgPendingAppNumValue}")
+        metricWindows = []
+
+        def get_metric_windows():
+            # 一次扫描读取所有指标，扩容和缩容的各个时间窗口都从同一结果中切片
+            if not metricWindows:
+                with tick_metrics.time(self.emr_id, 'metric_read'):
+                    metricWindows.append(self.metric_source.get_metric_windows(self.emr_id, self.config))
+            return metricWindows[0]
+
+        def window_mean(metricName, scaleStatus):
+            return lambda: self._mean(get_metric_windows().get_window(metricName, scaleStatus, self.config))
+
+        inputs = LazyInputs({
+            # 未启用预测时不需要读取指标
+            'forecastBreach': lambda: get_forecast_settings(self.config)[0] and self.check_forecast(get_metric_windows()),
+            'queueBreach': self.check_queues,
+            'scaleOut.TaskNodeCPULoad': lambda: self._mean(self.get_task_node_cpu(self.scaleOutAvgTaskNodeCPULoadMinutes)),
+            'scaleIn.TaskNodeCPULoad': lambda: self._mean(self.get_task_node_cpu(self.scaleInAvgTaskNodeCPULoadMinutes)),
+            **{f"{scaleStatus}.{metricName}": window_mean(metricName, scaleStatus)
+               for scaleStatus in ('scaleOut', 'scaleIn') for metricName in METRIC_COLUMNS},
+        })
+        return self.evaluate_scale_status(currentMaxUnitNum, inputs)
 
-        scaleInCPULoadStatus = statistics.mean(
-            scaleIntaskNodeCPULoadList) < self.scaleInAvgTaskNodeCPULoadValue
-        Utils.logger.info(
-            f"scaleInCPULoadStatus: {scaleInCPULoadStatus}, scaleIntaskNodeCPULoadList mean: {statistics.mean(scaleIntaskNodeCPULoadList)}, scaleInAvgTaskNodeCPULoadValue: {self.scaleInAvgTaskNodeCPULoadValue}")
+    @staticmethod
+    def _mean(values):
+        """
+        计算平均值，数据为空时返回None(判断树视为数据不足)。
+        """
+        return statistics.mean(values) if values else None
 
-        scaleIncurrentMaxUnitNumStatus = currentMaxUnitNum > self.minimumUnits
-        Utils.logger.info(
-            f"scaleIncurrentMaxUnitNumStatus: {scaleIncurrentMaxUnitNumStatus}, currentMaxUnitNum: {currentMaxUnitNum}, minimumUnits: {self.minimumUnits}")
+    @Utils.exception_handler
+    def check_forecast(self, metric_windows):
+        """
+        用本次读取的指标中的新样本增量更新需求预测，判断lead time内是否会越过扩容阈值。
+        只有在Parameter Store中设置了 forecastEnabled=1 时才生效。
 
-        # scaleIn综合条件
-        scaleInMemoryCondition = scaleInMemoryConditionYARNMemoryAvailablePercentageStatus or scaleInMemoryConditionCapacityRemainingGBStatus
-        Utils.logger.info(f"scaleInMemoryCondition: {scaleInMemoryCondition}")
+        :param metric_windows: 本次tick读取的MetricWindows
+        :return: 预测是否越过扩容阈值
+        """
+        enabled, leadSeconds, alpha, beta = get_forecast_settings(self.config)
+        if not enabled:
+            return False
+
+        self.forecaster.set_smoothing(alpha, beta)
+        self.forecaster.observe(metric_windows)
+        forecastBreach, projected = self.forecaster.check(self.config, leadSeconds)
+        if projected is None:
+            Utils.logger.info("Not enough samples for the demand forecast yet.")
+        else:
+            Utils.logger.info(f"Demand forecast in {leadSeconds} seconds: {projected}, breach: {forecastBreach}")
+        return forecastBreach
 
-        scaleInPendingAppNumCondition = scaleInAppConditionPendingAppNumStatus
-        Utils.logger.info(
-            f"scaleInPendingAppNumCondition: {scaleInPendingAppNumCondition}")
+    @Utils.exception_handler
+    def check_queues(self):
+        """
+        判断是否有队列的窗口平均值达到了Parameter Store中 queueScaleOutThresholds 设置的扩容阈值。
+        繁忙的高优先级队列在集群整体平均值中会被空闲队列掩盖，达到阈值的队列直接触发扩容。
 
-        scaleInCPULoadCondition = scaleInCPULoadStatus
-        Utils.logger.info(
-            f"scaleInCPULoadCondition: {scaleInCPULoadCondition}")
+        :return: 是否有队列达到阈值
+        """
+        thresholds = get_queue_thresholds(self.config)
+        if not thresholds:
+            return False
 
-        scaleIncurrentMaxUnitCondition = scaleIncurrentMaxUnitNumStatus
-        Utils.logger.info(
-            f"scaleIncurrentMaxUnitCondition: {scaleIncurrentMaxUnitCondition}")
+        with tick_metrics.time(self.emr_id, 'metric_read'):
+            queueMeans = self.emr_metric_manager.get_queue_means(self.emr_id, thresholds, self.config.monitorIntervalSeconds)
+        breaches = check_queue_thresholds(thresholds, queueMeans)
+        for queueName, metricName, mean, threshold in breaches:
+            Utils.logger.info(f"Queue '{queueName}' {metricName} average {mean} reached the scale out threshold {threshold}")
+        return bool(breaches)
 
-        scaleInCondition = (
-            scaleInMemoryCondition or scaleInPendingAppNumCondition or scaleInCPULoadCondition) and scaleIncurrentMaxUnitCondition
-        Utils.logger.info(f"scaleInCondition: {scaleInCondition}")
+    @Utils.exception_handler
+    def evaluate_scale_status(self, currentMaxUnitNum, inputs):
+        """
+        用短路求值的判断树做出扩缩容判断，只获取仍可能改变结果的输入，并记录跳过的输入。
+        同步的determine_scale_status和异步的tick共用此方法，保证两者的判断逻辑一致。
 
-        # 确定scaleStatus
-        if scaleOutCondition and not scaleInCondition:
-            return 1  # 执行scaleOut
-        elif not scaleOutCondition and scaleInCondition:
-            return -1  # 执行scaleIn
-        else:
-            return 0  # 无操作
+        :param currentMaxUnitNum: 当前Managed Scaling策略的MaximumCapacityUnits
+        :param inputs: 按输入名返回输入值的函数(LazyInputs)，输入名见 tools.scaling_policy.DECISION_INPUTS
+        :return: 1: scaleOut, -1: scaleIn, 0: 无操作
+        """
+        # 判断逻辑与回放模拟器共用 tools.scaling_policy 中的纯函数
+        scaleStatus, conditions, skipped = decide_scale_status(self.config, currentMaxUnitNum, inputs)
+        # 输入和条件作为结构化字段记录，只有DEBUG级别启用时才格式化
+        Utils.logger.bind(scaleStatus=scaleStatus, skipped=skipped).opt(lazy=True).debug(
+            "Decision inputs: {}, conditions: {}",
+            lambda: Utils.truncate(inputs.values), lambda: Utils.truncate(conditions))
+        if 'insufficientData' in conditions:
+            Utils.logger.info(
+                f"Monitoring data for {conditions['insufficientData']} is empty, so no scaling operations will be performed.")
+        return scaleStatus
 
     @Utils.exception_handler
-    def scale_out(self):
+    def scale_out(self, snapshot=None):
+        snapshot = self._resolve_yarn_snapshot(snapshot)
+
         # 获取当前时间戳
         current_time = datetime.now().timestamp()
         Utils.logger.info(f"⌛️ last_scale_out_time: {self.last_scale_out_time}")
@@ -307,14 +341,20 @@ class ManagedScalingEnhanced:
             Utils.logger.info(f"⌛️ Skipping scale out operation due to cooldown period ({self.scaleOutCooldownSeconds} seconds).")
             return
               
-        pending_virtual_cores = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'pendingVirtualCores')
-        apps_pending = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'appsPending')
-        total_virtual_cores = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'totalVirtualCores')
-        apps_running = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'appsRunning')
-        reserved_virtual_cores = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'reservedVirtualCores')
-
+        pending_virtual_cores = snapshot.get('pendingVirtualCores')
+        apps_pending = snapshot.get('appsPending')
+        total_virtual_cores = snapshot.get('totalVirtualCores')
+        apps_running = snapshot.get('appsRunning')
+        reserved_virtual_cores = snapshot.get('reservedVirtualCores')
+
+        # 扩容的容量计算方式：factor(按系数逐步增加) 或 demand(按等待和预留的资源一次到位)
+        sizing_mode, demand_headroom, unit_virtual_cores, unit_memory_mb = get_sizing_settings(self.config)
+
+        if sizing_mode == 'demand':
+            Utils.logger.info(f"Demand sizing: {pending_virtual_cores} pending vCores, {snapshot.get('pendingMB')} pending MB, "
+                              f"{reserved_virtual_cores} reserved vCores, {snapshot.get('reservedMB')} reserved MB.")
         # 如果没有等待分配资源的应用程序且集群资源利用率较低,则直接返回
-        if apps_pending == 0:
+        elif apps_pending == 0:
             if reserved_virtual_cores <= 2:
                 Utils.logger.info("No pending applications and cluster resource utilization is low, skipping scale out operation.")
                 return
@@ -324,36 +364,37 @@ class ManagedScalingEnhanced:
             Utils.logger.info(f"There are {apps_pending} pending applications, proceeding with scale out operation.")
 
         # 获取当前策略
-        emr_client = AWSEMRClient()
-        current_policy = emr_client.get_managed_scaling_policy(self.emr_id)
+        emr_client = self.emr_client
+        with tick_metrics.time(self.emr_id, 'policy_read'):
+            current_policy = emr_client.get_managed_scaling_policy(self.emr_id)
         current_max_capacity_units = current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits']
         current_min_capacity_units = current_policy['ManagedScalingPolicy']['ComputeLimits']['MinimumCapacityUnits']
 
-        # 计算新的 MaximumCapacityUnits
-        if apps_pending == 0:
-            new_max_capacity_units = current_max_capacity_units + int(reserved_virtual_cores * self.scaleOutFactor)
-        
+        # 计算新的 MaximumCapacityUnits(不低于MinimumCapacityUnits + 1，不超过maximumUnits)
+        if sizing_mode == 'demand':
+            new_max_capacity_units = compute_demand_scale_out_units(
+                self.config, current_max_capacity_units, current_min_capacity_units,
+                snapshot, demand_headroom, unit_virtual_cores, unit_memory_mb)
+            if new_max_capacity_units is None:
+                Utils.logger.info(f"Current MaximumCapacityUnits {current_max_capacity_units} already covers the demand, skipping scale out operation.")
+                return
+            Utils.logger.info(f"Demand sizing target: {new_max_capacity_units} units (current {current_max_capacity_units}, headroom {demand_headroom}).")
         else:
-            new_max_capacity_units = current_max_capacity_units + int(
-                (total_virtual_cores / apps_running) * self.scaleOutFactor
-            )
-        Utils.logger.info(f"init current_max_capacity_units: {current_max_capacity_units}")
-        Utils.logger.info(f"init total_virtual_cores: {total_virtual_cores}")
-        Utils.logger.info(f"init self.scaleOutFactor: {self.scaleOutFactor}")
-        Utils.logger.info(f"init apps_running: {apps_running}")        
-        Utils.logger.info(f"init new_max_capacity_units: {new_max_capacity_units}")
-
-        # 确保新的 MaximumCapacityUnits 大于 MinimumCapacityUnits
-        new_max_capacity_units = max(new_max_capacity_units, current_min_capacity_units + 1)
-
-        # 确保新的 MaximumCapacityUnits 不超过最大限制
-        new_max_capacity_units = min(new_max_capacity_units, self.maximumUnits)
+            new_max_capacity_units = compute_scale_out_units(
+                self.config, current_max_capacity_units, current_min_capacity_units,
+                apps_pending, reserved_virtual_cores, total_virtual_cores, apps_running)
+            Utils.logger.info(f"init current_max_capacity_units: {current_max_capacity_units}")
+            Utils.logger.info(f"init total_virtual_cores: {total_virtual_cores}")
+            Utils.logger.info(f"init self.scaleOutFactor: {self.scaleOutFactor}")
+            Utils.logger.info(f"init apps_running: {apps_running}")
+            Utils.logger.info(f"init new_max_capacity_units: {new_max_capacity_units}")
 
         # 更新 MaximumCapacityUnits
         current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] = new_max_capacity_units
 
         # 应用新策略
-        emr_client.put_managed_scaling_policy(self.emr_id, current_policy['ManagedScalingPolicy'])
+        with tick_metrics.time(self.emr_id, 'policy_write'):
+            emr_client.put_managed_scaling_policy(self.emr_id, current_policy['ManagedScalingPolicy'])
 
         # 记录新策略到 SQLite
         sanitized_table_name = self.sanitize_table_name(f"{self.emr_id}_ms_invoke_log")
@@ -381,17 +422,20 @@ class ManagedScalingEnhanced:
             min_max_capacity_units = c.fetchone()[0]
             conn.close()
 
+            # 与基线相同，在应用新策略之后重新读取totalVirtualCores，不使用扩容前的快照
             total_virtual_cores = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'totalVirtualCores')
             if min_max_capacity_units > total_virtual_cores:
                 # 需要补充 On-Demand 实例
                 on_demand_units_to_add = min_max_capacity_units - total_virtual_cores
                 current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumOnDemandCapacityUnits'] += on_demand_units_to_add
-                emr_client.put_managed_scaling_policy(self.emr_id, current_policy['ManagedScalingPolicy'])
+                with tick_metrics.time(self.emr_id, 'policy_write'):
+                    emr_client.put_managed_scaling_policy(self.emr_id, current_policy['ManagedScalingPolicy'])
                 Utils.logger.info(f"Added {on_demand_units_to_add} On-Demand units to the policy.")
 
 
     @Utils.exception_handler
-    def scale_in(self):
+    def scale_in(self, snapshot=None):
+        snapshot = self._resolve_yarn_snapshot(snapshot)
 
         # 获取当前时间戳
         current_time = datetime.now().timestamp()
@@ -403,36 +447,30 @@ class ManagedScalingEnhanced:
             return
 
         # 获取 YARN 指标
-        pending_virtual_cores = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'pendingVirtualCores')
-        apps_pending = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'appsPending')
-        total_virtual_cores = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'totalVirtualCores')
-        apps_running = self.emr_metric_manager.get_yarn_metrics(self.emr_id, 'appsRunning')
+        pending_virtual_cores = snapshot.get('pendingVirtualCores')
+        apps_pending = snapshot.get('appsPending')
+        total_virtual_cores = snapshot.get('totalVirtualCores')
+        apps_running = snapshot.get('appsRunning')
 
         # 获取当前策略
-        emr_client = AWSEMRClient()
-        current_policy = emr_client.get_managed_scaling_policy(self.emr_id)
+        emr_client = self.emr_client
+        with tick_metrics.time(self.emr_id, 'policy_read'):
+            current_policy = emr_client.get_managed_scaling_policy(self.emr_id)
         current_max_capacity_units = current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits']
         current_max_core_units = current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCoreCapacityUnits']
 
-        # 如果 apps_pending 为 0
+        # 如果 apps_pending 为 0，直接缩到最小值
         if apps_pending == 0:
             Utils.logger.info("No pending applications, setting minimum capacity.")
-            current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] = self.minimumUnits
-            current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumOnDemandCapacityUnits'] = self.maximumOnDemandInstancesNumValue
-
-        # 如果 apps_pending 不为 0
-        else:
-            # 更新 MaximumOnDemandCapacityUnits
-            current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumOnDemandCapacityUnits'] = self.maximumOnDemandInstancesNumValue
-
-            # 计算新的 MaximumCapacityUnits
-            new_max_capacity_units = max(self.minimumUnits, current_max_capacity_units - int((total_virtual_cores / apps_running) * self.scaleInFactor))
 
-            # 更新 MaximumCapacityUnits
-            current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] = new_max_capacity_units
+        # 更新 MaximumOnDemandCapacityUnits 和 MaximumCapacityUnits
+        current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumOnDemandCapacityUnits'] = self.maximumOnDemandInstancesNumValue
+        current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] = compute_scale_in_units(
+            self.config, current_max_capacity_units, apps_pending, total_virtual_cores, apps_running)
 
         # 应用新策略
-        emr_client.put_managed_scaling_policy(self.emr_id, current_policy['ManagedScalingPolicy'])
+        with tick_metrics.time(self.emr_id, 'policy_write'):
+            emr_client.put_managed_scaling_policy(self.emr_id, current_policy['ManagedScalingPolicy'])
 
         # 记录新策略到 SQLite
         sanitized_table_name = self.sanitize_table_name(f"{self.emr_id}_ms_invoke_log")
@@ -456,15 +494,16 @@ class ManagedScalingEnhanced:
 
 
         # 修改 Instance Fleets
-        instance_fleets = emr_client.list_instance_fleets(ClusterId=self.emr_id)['InstanceFleets']
-        for fleet in instance_fleets:
-            if fleet['InstanceFleetType'] == 'TASK':
-                emr_client.modify_instance_fleet(
-                    ClusterId=self.emr_id,
-                    InstanceFleet={
-                        'InstanceFleetId': fleet['Id'],
-                        'TargetOnDemandCapacity': 0,
-                        'TargetSpotCapacity': current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] - current_max_core_units
-                    }
-                )
-                Utils.logger.info(f"Modified Instance Fleet {fleet['Id']} to have 0 On-Demand instances and {current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] - current_max_core_units} Spot instances.")
\ No newline at end of file
+        with tick_metrics.time(self.emr_id, 'fleet'):
+            instance_fleets = self.inventory.get_instance_fleets()
+            for fleet in instance_fleets:
+                if fleet['InstanceFleetType'] == 'TASK':
+                    emr_client.modify_instance_fleet(
+                        ClusterId=self.emr_id,
+                        InstanceFleet={
+                            'InstanceFleetId': fleet['Id'],
+                            'TargetOnDemandCapacity': 0,
+                            'TargetSpotCapacity': current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] - current_max_core_units
+                        }
+                    )
+                    Utils.logger.info(f"Modified Instance Fleet {fleet['Id']} to have 0 On-Demand instances and {current_policy['ManagedScalingPolicy']['ComputeLimits']['MaximumCapacityUnits'] - current_max_core_units} Spot instances.")
\ No newline at end of file
@@ -0,0 +1,114 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from tools.utils import Utils
+from tools.simulator import DECISION_SERIES, MetricHistory, ScalingSimulator, load_config
+
+# 时间线CSV的列
+TIMELINE_COLUMNS = ('timestamp', 'time', 'scaleStatus', 'action', 'maximumCapacityUnits', 'capacityUnits', 'pendingAppNum',
+                    'scaleOutYARNMemoryAvailablePercentage', 'scaleOutCapacityRemainingGB', 'scaleOutPendingAppNum', 'scaleOutTaskNodeCPULoad',
+                    'scaleInYARNMemoryAvailablePercentage', 'scaleInCapacityRemainingGB', 'scaleInPendingAppNum', 'scaleInTaskNodeCPULoad')
+
+
+def parse_time(value):
+    """
+    解析命令行中的时间：Unix时间戳或ISO 8601格式(本地时间)。
+    """
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp())
+
+
+def parse_overrides(items):
+    """
+    解析 --set name=value 参数。
+    """
+    overrides = {}
+    for item in items or []:
+        name, _, value = item.partition('=')
+        if not value:
+            raise ValueError(f"Invalid --set value '{item}', expected name=value")
+        overrides[name.strip()] = value.strip()
+    return overrides
+
+
+def write_timeline_csv(timeline, output):
+    writer = csv.writer(output)
+    writer.writerow(TIMELINE_COLUMNS)
+    for entry in timeline:
+        writer.writerow([
+            entry['timestamp'], datetime.fromtimestamp(entry['timestamp']).isoformat(), entry['scaleStatus'], entry['action'],
+            entry['maximumCapacityUnits'], entry['capacityUnits'], entry['pendingAppNum'],
+            *(entry['scaleOutMeans'][name] for name in DECISION_SERIES),
+            *(entry['scaleInMeans'][name] for name in DECISION_SERIES),
+        ])
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Replay recorded metric history through the Managed Scaling Enhanced decision engine')
+    parser.add_argument('--emr-id', required=True, help='EMR cluster ID whose SQLite history is replayed')
+    parser.add_argument('--prefix', default='managedScalingEnhanced', help='Parameter prefix (default: managedScalingEnhanced)')
+    parser.add_argument('--parameters-file', default=None, help='JSON file with {"parameterName": value} to use instead of Parameter Store')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE', help='Override a parameter for this replay, can be repeated')
+    parser.add_argument('--db-path', default=None, help='SQLite file written by yarn_monitor.py (default: <cluster table>.db)')
+    parser.add_argument('--start', default=None, help='Replay start, Unix timestamp or ISO 8601 (default: first sample plus the longest window)')
+    parser.add_argument('--end', default=None, help='Replay end, Unix timestamp or ISO 8601 (default: last sample)')
+    parser.add_argument('--days', type=float, default=None, help='Replay the last N days (ignored when --start is given)')
+    parser.add_argument('--provision-delay-seconds', type=int, default=300, help='Delay before raised MaximumCapacityUnits becomes capacity (default: 300)')
+    parser.add_argument('--release-delay-seconds', type=int, default=60, help='Delay before lowered MaximumCapacityUnits releases capacity (default: 60)')
+    parser.add_argument('--initial-max-units', type=int, default=None, help='MaximumCapacityUnits at the start of the replay (default: minimumUnits)')
+    parser.add_argument('--policy-min-units', type=int, default=0, help='MinimumCapacityUnits of the managed scaling policy (default: 0)')
+    parser.add_argument('--vcores-per-unit', type=float, default=1, help='vCores per capacity unit, used when totalVirtualCores was not recorded (default: 1)')
+    parser.add_argument('--apps-running', type=int, default=10, help='Running applications assumed when appsRunning was not recorded (default: 10)')
+    parser.add_argument('--headroom', type=float, default=0.2, help='Capacity headroom above demand that is not counted as over-provisioned (default: 0.2)')
+    parser.add_argument('--pressure-memory-percentage', type=float, default=10, help='Available YARN memory percentage counted as under-provisioned when demand was not recorded (default: 10)')
+    parser.add_argument('--output', default=None, help='Write the timeline CSV to this file (default: stdout)')
+    parser.add_argument('--json', action='store_true', help='Print the timeline and summary as JSON instead of CSV')
+    parser.add_argument('--verbose', action='store_true', help='Keep the application INFO logs')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if not args.verbose:
+        Utils.logger.remove()
+        Utils.logger.add(sys.stderr, level="WARNING")
+
+    config = load_config(args.prefix, args.parameters_file, parse_overrides(args.set))
+    start_time, end_time = parse_time(args.start), parse_time(args.end)
+    if start_time is None and args.days is not None:
+        start_time = (end_time or int(time.time())) - int(args.days * 24 * 60 * 60)
+
+    # 与yarn_monitor.py相同的表名处理
+    table_name = ''.join(c if c.isalnum() or c == '_' else '_' for c in args.emr_id.replace('-', '_'))
+    # 多读取一个最大窗口的数据，使回放起点的窗口也是完整的
+    max_window_minutes = max(config.get_metric_window_minutes(name, scale_status)
+                             for name in DECISION_SERIES for scale_status in ('scaleOut', 'scaleIn'))
+    history = MetricHistory.load(
+        table_name, args.db_path,
+        None if start_time is None else start_time - int(max_window_minutes * 60), end_time,
+        config.monitorIntervalSeconds)
+
+    simulator = ScalingSimulator(
+        config, history, args.provision_delay_seconds, args.release_delay_seconds,
+        args.initial_max_units, args.policy_min_units, args.vcores_per_unit, args.apps_running,
+        args.headroom, args.pressure_memory_percentage)
+    result = simulator.run(start_time, end_time)
+
+    if args.json:
+        output = open(args.output, 'w') if args.output else sys.stdout
+        json.dump(result, output, indent=2)
+    else:
+        output = open(args.output, 'w', newline='') if args.output else sys.stdout
+        write_timeline_csv(result['timeline'], output)
+    if args.output:
+        output.close()
+    print(json.dumps(result['summary'], indent=2), file=sys.stderr)
+
+# python simulate.py --emr-id j-1F74M1P9SC57B --days 30 --parameters-file params.json --set scaleOutFactor=2 --output timeline.csv
@@ -0,0 +1,42 @@
+from tools.ssm import ScalingConfig
+
+# 测试使用的必需参数
+PARAMETERS = {
+    'minimumUnits': 300,
+    'maximumUnits': 1000,
+    'spotInstancesTimeout': 1800,
+    'monitorIntervalSeconds': 30,
+    'actionIntervalSeconds': 30,
+    'scaleOutAvgYARNMemoryAvailablePercentageValue': 30,
+    'scaleOutAvgYARNMemoryAvailablePercentageMinutes': 5,
+    'scaleOutAvgCapacityRemainingGBValue': 256,
+    'scaleOutAvgCapacityRemainingGBMinutes': 5,
+    'scaleOutAvgPendingAppNumValue': 3,
+    'scaleOutAvgPendingAppNumMinutes': 5,
+    'scaleOutAvgTaskNodeCPULoadValue': 42,
+    'scaleOutAvgTaskNodeCPULoadMinutes': 15,
+    'scaleInAvgYARNMemoryAvailablePercentageValue': 40,
+    'scaleInAvgYARNMemoryAvailablePercentageMinutes': 3,
+    'scaleInAvgCapacityRemainingGBValue': 5120,
+    'scaleInAvgCapacityRemainingGBMinutes': 3,
+    'scaleInAvgPendingAppNumValue': 2,
+    'scaleInAvgPendingAppNumMinutes': 2,
+    'scaleInAvgTaskNodeCPULoadValue': 30,
+    'scaleInAvgTaskNodeCPULoadMinutes': 15,
+    'scaleOutFactor': 1.5,
+    'scaleInFactor': 1.7,
+    'maximumOnDemandInstancesNumValue': 160,
+    'scaleOutCooldownSeconds': 420,
+    'scaleInCooldownSeconds': 300,
+}
+
+
+def make_config(**overrides):
+    """
+    构造测试用的 ScalingConfig，参数值与Parameter Store中一样以字符串传入。
+
+    :param overrides: 覆盖或追加的参数(包括可选参数)
+    :return: ScalingConfig 实例
+    """
+    values = {name: str(value) for name, value in dict(PARAMETERS, **overrides).items()}
+    return ScalingConfig.from_parameters('test', values)
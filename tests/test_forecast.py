@@ -0,0 +1,96 @@
+import unittest
+
+from tools.forecast import DemandForecaster, HoltForecaster
+from tools.metrics_store import MetricWindows
+from tests.helpers import make_config
+
+
+class HoltForecasterTest(unittest.TestCase):
+
+    def test_no_forecast_without_samples(self):
+        self.assertIsNone(HoltForecaster().forecast(60))
+
+    def test_constant_series(self):
+        model = HoltForecaster()
+        for timestamp in range(0, 600, 30):
+            model.update(timestamp, 5)
+        self.assertAlmostEqual(model.forecast(300), 5)
+
+    def test_linear_trend_per_second(self):
+        model = HoltForecaster(alpha=0.8, beta=0.5)
+        for timestamp in range(0, 3000, 30):
+            model.update(timestamp, timestamp * 0.1)
+        self.assertAlmostEqual(model.trend, 0.1, places=3)
+        self.assertAlmostEqual(model.forecast(300), 2970 * 0.1 + 30, places=1)
+
+    def test_irregular_intervals(self):
+        model = HoltForecaster(alpha=0.8, beta=0.5)
+        timestamp = 0
+        for step in [30, 60, 30, 90, 30] * 20:
+            timestamp += step
+            model.update(timestamp, timestamp * 0.1)
+        self.assertAlmostEqual(model.trend, 0.1, places=3)
+
+    def test_ignores_missing_and_stale_samples(self):
+        model = HoltForecaster()
+        model.update(30, 1)
+        model.update(60, None)
+        model.update(30, 100)
+        model.update(20, 100)
+        self.assertEqual(model.samples, 1)
+        self.assertEqual(model.forecast(0), 1)
+
+
+class DemandForecasterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = make_config()
+
+    @staticmethod
+    def feed(forecaster, pending, memory=0.8, capacity=1000, samples=20):
+        for i in range(samples):
+            forecaster.update(i * 30, {'PendingAppNum': pending(i), 'YARNMemoryAvailablePercentage': memory,
+                                       'CapacityRemainingGB': capacity})
+
+    def test_no_forecast_before_min_samples(self):
+        forecaster = DemandForecaster(min_samples=10)
+        self.feed(forecaster, lambda i: 0, samples=9)
+        self.assertEqual(forecaster.check(self.config, 300), (False, None))
+
+    def test_stable_demand_does_not_breach(self):
+        forecaster = DemandForecaster()
+        self.feed(forecaster, lambda i: 1)
+        breached, projected = forecaster.check(self.config, 300)
+        self.assertFalse(breached)
+        self.assertAlmostEqual(projected['PendingAppNum'], 1)
+
+    def test_rising_pending_apps_breach(self):
+        forecaster = DemandForecaster(alpha=0.8, beta=0.5)
+        # 每30秒增加0.15个等待应用，当前约2.85个，5分钟后超过阈值3
+        self.feed(forecaster, lambda i: i * 0.15)
+        self.assertTrue(forecaster.check(self.config, 300)[0])
+        self.assertFalse(forecaster.check(self.config, 0)[0])
+
+    def test_memory_projection_breach(self):
+        forecaster = DemandForecaster()
+        self.feed(forecaster, lambda i: 0, memory=0.25)
+        self.assertTrue(forecaster.check(self.config, 300)[0])
+
+    def test_capacity_projection_breach(self):
+        forecaster = DemandForecaster()
+        self.feed(forecaster, lambda i: 0, capacity=100)
+        self.assertTrue(forecaster.check(self.config, 300)[0])
+
+    def test_observe_processes_each_sample_once(self):
+        forecaster = DemandForecaster()
+        timestamps = list(range(0, 300, 30))
+        columns = {'PendingAppNum': [1] * 10, 'YARNMemoryAvailablePercentage': [0.5] * 10, 'CapacityRemainingGB': [500] * 10}
+        self.assertEqual(forecaster.observe(MetricWindows(timestamps, columns, 270, 30)), 10)
+        self.assertEqual(forecaster.observe(MetricWindows(timestamps, columns, 270, 30)), 0)
+        timestamps = timestamps[1:] + [300]
+        self.assertEqual(forecaster.observe(MetricWindows(timestamps, columns, 300, 30)), 1)
+        self.assertEqual(forecaster.models['PendingAppNum'].samples, 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import math
+import unittest
+
+from tools.metrics_store import MetricWindows
+from tools.ring_buffer import RingBufferMetrics
+from tests.helpers import make_config
+
+
+class MetricWindowsTest(unittest.TestCase):
+
+    def test_returns_window_suffix(self):
+        timestamps = list(range(0, 600, 30))
+        windows = MetricWindows(timestamps, {'PendingAppNum': list(range(20))}, 570, 30)
+        # 5分钟窗口从270开始，包含 270..570 共11个点
+        self.assertEqual(windows.get('PendingAppNum', 5), list(range(9, 20)))
+
+    def test_insufficient_data(self):
+        # 5分钟期望10个点，少于7个时数据不足
+        timestamps = list(range(420, 600, 30))
+        windows = MetricWindows(timestamps, {'PendingAppNum': [1] * len(timestamps)}, 570, 30)
+        self.assertEqual(windows.get('PendingAppNum', 5), [])
+
+    def test_completeness_threshold(self):
+        timestamps = list(range(390, 600, 30))
+        windows = MetricWindows(timestamps, {'PendingAppNum': [1] * len(timestamps)}, 570, 30)
+        self.assertEqual(len(windows.get('PendingAppNum', 5)), 7)
+
+    def test_missing_values_do_not_count(self):
+        timestamps = list(range(270, 600, 30))
+        values = [1, None, None, None, None, None, 3, 4, 5, 6, 7]
+        windows = MetricWindows(timestamps, {'PendingAppNum': values}, 570, 30)
+        self.assertEqual(windows.get('PendingAppNum', 5), [])
+        values[1] = 0
+        self.assertEqual(windows.get('PendingAppNum', 5), [1, 0, 3, 4, 5, 6, 7])
+
+    def test_get_window_uses_config_minutes(self):
+        config = make_config(scaleInAvgPendingAppNumMinutes=1)
+        timestamps = list(range(0, 600, 30))
+        windows = MetricWindows(timestamps, {'PendingAppNum': list(range(20))}, 570, 30)
+        self.assertEqual(windows.get_window('PendingAppNum', 'scaleIn', config), [17, 18, 19])
+
+
+class RingBufferMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = make_config()
+
+    def test_missing_values_are_none(self):
+        buffer = RingBufferMetrics(10)
+        buffer.append(0, {'PendingAppNum': 1, 'CapacityRemainingGB': None})
+        buffer.append(30, {'PendingAppNum': 2})
+        windows = buffer.get_metric_windows('j-TEST', self.config, max_window_minutes=5, end_time=30)
+        self.assertEqual(windows.timestamps, [0, 30])
+        self.assertEqual(windows.columns['PendingAppNum'], [1, 2])
+        self.assertEqual(windows.columns['CapacityRemainingGB'], [None, None])
+        self.assertFalse(any(isinstance(value, float) and math.isnan(value)
+                             for values in windows.columns.values() for value in values))
+
+    def test_missing_values_fail_completeness(self):
+        buffer = RingBufferMetrics(100)
+        for timestamp in range(0, 600, 30):
+            buffer.append(timestamp, {'PendingAppNum': 1, 'YARNMemoryAvailablePercentage': None})
+        windows = buffer.get_metric_windows('j-TEST', self.config, max_window_minutes=5, end_time=570)
+        self.assertEqual(len(windows.get('PendingAppNum', 5)), 11)
+        self.assertEqual(windows.get('YARNMemoryAvailablePercentage', 5), [])
+
+    def test_overwrites_oldest_samples(self):
+        buffer = RingBufferMetrics(3)
+        for timestamp in range(5):
+            buffer.append(timestamp, {'PendingAppNum': timestamp})
+        windows = buffer.get_metric_windows('j-TEST', self.config, max_window_minutes=5, end_time=4)
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(windows.timestamps, [2, 3, 4])
+        self.assertEqual(windows.columns['PendingAppNum'], [2, 3, 4])
+
+    def test_window_bounds(self):
+        buffer = RingBufferMetrics(100)
+        for timestamp in range(0, 600, 30):
+            buffer.append(timestamp, {'PendingAppNum': timestamp})
+        windows = buffer.get_metric_windows('j-TEST', self.config, max_window_minutes=1, end_time=300)
+        self.assertEqual(windows.timestamps, [240, 270, 300])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import random
+import unittest
+
+from tools.scaling_policy import (DECISION_INPUTS, DECISION_METRIC_INPUTS, LazyInputs, compute_demand_scale_out_units,
+                                  decide_scale_status)
+from tests.helpers import make_config
+
+# 不触发扩容也不触发缩容的输入
+NEUTRAL_INPUTS = {
+    'forecastBreach': False,
+    'queueBreach': False,
+    'scaleOut.YARNMemoryAvailablePercentage': 0.35,
+    'scaleOut.CapacityRemainingGB': 1000,
+    'scaleOut.PendingAppNum': 2,
+    'scaleOut.TaskNodeCPULoad': 50,
+    'scaleIn.YARNMemoryAvailablePercentage': 0.35,
+    'scaleIn.CapacityRemainingGB': 1000,
+    'scaleIn.PendingAppNum': 2,
+    'scaleIn.TaskNodeCPULoad': 35,
+}
+
+
+def eager_scale_status(config, current_max_unit_num, inputs):
+    """
+    逐项计算全部条件的参考实现，任一指标数据不足时不扩缩容。
+    """
+    if any(inputs[name] is None for name in DECISION_METRIC_INPUTS):
+        return 0
+    breach = bool(inputs['forecastBreach']) or bool(inputs['queueBreach'])
+    scale_out = (((inputs['scaleOut.YARNMemoryAvailablePercentage'] * 100 <= config.scaleOutAvgYARNMemoryAvailablePercentageValue
+                   or inputs['scaleOut.CapacityRemainingGB'] <= config.scaleOutAvgCapacityRemainingGBValue
+                   or inputs['scaleOut.PendingAppNum'] >= config.scaleOutAvgPendingAppNumValue)
+                  and inputs['scaleOut.TaskNodeCPULoad'] >= config.scaleOutAvgTaskNodeCPULoadValue)
+                 or breach) and current_max_unit_num < config.maximumUnits
+    scale_in = (inputs['scaleIn.YARNMemoryAvailablePercentage'] * 100 > config.scaleInAvgYARNMemoryAvailablePercentageValue
+                or inputs['scaleIn.CapacityRemainingGB'] > config.scaleInAvgCapacityRemainingGBValue
+                or inputs['scaleIn.PendingAppNum'] < config.scaleInAvgPendingAppNumValue
+                or inputs['scaleIn.TaskNodeCPULoad'] < config.scaleInAvgTaskNodeCPULoadValue) \
+        and current_max_unit_num > config.minimumUnits and not breach
+    if scale_out and not scale_in:
+        return 1
+    if scale_in and not scale_out:
+        return -1
+    return 0
+
+
+class DecideScaleStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = make_config()
+
+    def decide(self, current_max_unit_num=500, **overrides):
+        inputs = dict(NEUTRAL_INPUTS, **{name.replace('__', '.'): value for name, value in overrides.items()})
+        lazy_inputs = LazyInputs({name: (lambda value=value: value) for name, value in inputs.items()})
+        status, conditions, skipped = decide_scale_status(self.config, current_max_unit_num, lazy_inputs)
+        return status, conditions, skipped, lazy_inputs
+
+    def test_neutral_inputs_do_nothing(self):
+        status, conditions, skipped, _ = self.decide()
+        self.assertEqual(status, 0)
+        self.assertNotIn('insufficientData', conditions)
+        # 内存和等待应用都不满足扩容条件时不需要扩容窗口的CPU
+        self.assertIn('scaleOut.TaskNodeCPULoad', skipped)
+
+    def test_scale_out_on_memory_and_cpu(self):
+        status, conditions, skipped, _ = self.decide(scaleOut__YARNMemoryAvailablePercentage=0.2)
+        self.assertEqual(status, 1)
+        self.assertTrue(conditions['scaleOutMemoryCondition'])
+        self.assertTrue(conditions['scaleOutCPULoadStatus'])
+        self.assertEqual(skipped, [])
+
+    def test_scale_out_on_capacity_remaining_and_cpu(self):
+        status, conditions, _, _ = self.decide(scaleOut__CapacityRemainingGB=100)
+        self.assertEqual(status, 1)
+        self.assertTrue(conditions['scaleOutMemoryConditionCapacityRemainingGBStatus'])
+
+    def test_scale_out_on_pending_apps_and_cpu(self):
+        status, conditions, _, _ = self.decide(scaleOut__PendingAppNum=5)
+        self.assertEqual(status, 1)
+        self.assertTrue(conditions['scaleOutAppConditionPendingAppNumStatus'])
+
+    def test_no_scale_out_when_cpu_is_low(self):
+        status, conditions, _, _ = self.decide(scaleOut__PendingAppNum=5, scaleOut__TaskNodeCPULoad=10)
+        self.assertEqual(status, 0)
+        self.assertFalse(conditions['scaleOutCondition'])
+
+    def test_scale_out_on_forecast_breach(self):
+        status, conditions, _, lazy_inputs = self.decide(forecastBreach=True)
+        self.assertEqual(status, 1)
+        self.assertTrue(conditions['scaleOutForecastCondition'])
+        self.assertTrue(conditions['scaleInBlockedByBreach'])
+        # 执行扩容前补齐了全部指标
+        self.assertTrue(all(name in lazy_inputs.values for name in DECISION_METRIC_INPUTS))
+
+    def test_scale_out_on_queue_breach(self):
+        status, conditions, _, _ = self.decide(queueBreach=True)
+        self.assertEqual(status, 1)
+        self.assertTrue(conditions['scaleOutQueueCondition'])
+
+    def test_no_scale_out_at_maximum_units(self):
+        status, conditions, skipped, _ = self.decide(
+            current_max_unit_num=self.config.maximumUnits, scaleOut__YARNMemoryAvailablePercentage=0.1)
+        self.assertEqual(status, 0)
+        self.assertFalse(conditions['scaleOutcurrentMaxUnitNumStatus'])
+        self.assertIn('scaleOut.YARNMemoryAvailablePercentage', skipped)
+
+    def test_breach_at_maximum_units_blocks_scale_in(self):
+        status, conditions, _, _ = self.decide(
+            current_max_unit_num=self.config.maximumUnits, forecastBreach=True, scaleIn__YARNMemoryAvailablePercentage=0.9)
+        self.assertEqual(status, 0)
+        self.assertTrue(conditions['scaleInBlockedByBreach'])
+
+    def test_scale_in_on_each_condition(self):
+        for name, value in (('scaleIn.YARNMemoryAvailablePercentage', 0.5), ('scaleIn.CapacityRemainingGB', 6000),
+                            ('scaleIn.PendingAppNum', 1), ('scaleIn.TaskNodeCPULoad', 10)):
+            with self.subTest(name=name):
+                status, conditions, _, _ = self.decide(**{name.replace('.', '__'): value})
+                self.assertEqual(status, -1)
+                self.assertTrue(conditions['scaleInCondition'])
+
+    def test_no_scale_in_at_minimum_units(self):
+        status, conditions, _, _ = self.decide(
+            current_max_unit_num=self.config.minimumUnits, scaleIn__YARNMemoryAvailablePercentage=0.9)
+        self.assertEqual(status, 0)
+        self.assertFalse(conditions['scaleIncurrentMaxUnitNumStatus'])
+
+    def test_queue_breach_blocks_scale_in_at_maximum_units(self):
+        status, conditions, _, _ = self.decide(
+            current_max_unit_num=self.config.maximumUnits, queueBreach=True, scaleIn__PendingAppNum=0)
+        self.assertEqual(status, 0)
+        self.assertTrue(conditions['scaleInBlockedByBreach'])
+
+    def test_insufficient_data_for_needed_input(self):
+        status, conditions, skipped, _ = self.decide(scaleOut__YARNMemoryAvailablePercentage=None)
+        self.assertEqual(status, 0)
+        self.assertEqual(conditions['insufficientData'], 'scaleOut.YARNMemoryAvailablePercentage')
+        self.assertIn('scaleIn.YARNMemoryAvailablePercentage', skipped)
+
+    def test_insufficient_data_blocks_scale_out(self):
+        # 扩容不需要缩容窗口的CPU，但执行前补齐指标时发现数据不足
+        status, conditions, _, _ = self.decide(scaleOut__PendingAppNum=5, scaleIn__TaskNodeCPULoad=None)
+        self.assertEqual(status, 0)
+        self.assertEqual(conditions['insufficientData'], 'scaleIn.TaskNodeCPULoad')
+
+    def test_insufficient_data_blocks_scale_in(self):
+        status, conditions, _, _ = self.decide(scaleIn__YARNMemoryAvailablePercentage=0.9, scaleOut__TaskNodeCPULoad=None)
+        self.assertEqual(status, 0)
+        self.assertEqual(conditions['insufficientData'], 'scaleOut.TaskNodeCPULoad')
+
+    def test_unused_missing_input_does_not_matter_without_action(self):
+        status, conditions, skipped, _ = self.decide(scaleOut__TaskNodeCPULoad=None)
+        self.assertEqual(status, 0)
+        self.assertNotIn('insufficientData', conditions)
+        self.assertIn('scaleOut.TaskNodeCPULoad', skipped)
+
+    def test_matches_eager_evaluation(self):
+        choices = {
+            'forecastBreach': (False, False, True),
+            'queueBreach': (False, False, True),
+            'scaleOut.YARNMemoryAvailablePercentage': (0.1, 0.5, None),
+            'scaleOut.CapacityRemainingGB': (100, 1000, None),
+            'scaleOut.PendingAppNum': (1, 5, None),
+            'scaleOut.TaskNodeCPULoad': (20, 60, None),
+            'scaleIn.YARNMemoryAvailablePercentage': (0.1, 0.5, None),
+            'scaleIn.CapacityRemainingGB': (100, 6000, None),
+            'scaleIn.PendingAppNum': (1, 5, None),
+            'scaleIn.TaskNodeCPULoad': (20, 60, None),
+        }
+        rng = random.Random(42)
+        for _ in range(2000):
+            inputs = {name: rng.choice(values) for name, values in choices.items()}
+            current_max_unit_num = rng.choice((self.config.minimumUnits, 500, self.config.maximumUnits))
+            lazy_inputs = LazyInputs({name: (lambda value=value: value) for name, value in inputs.items()})
+            status, _, _ = decide_scale_status(self.config, current_max_unit_num, lazy_inputs)
+            self.assertEqual(status, eager_scale_status(self.config, current_max_unit_num, inputs), inputs)
+
+
+class LazyInputsTest(unittest.TestCase):
+
+    def test_loads_each_input_once(self):
+        calls = []
+        lazy_inputs = LazyInputs({name: (lambda name=name: calls.append(name) or 1) for name in DECISION_INPUTS})
+        self.assertEqual(lazy_inputs('scaleOut.PendingAppNum'), 1)
+        self.assertEqual(lazy_inputs('scaleOut.PendingAppNum'), 1)
+        self.assertEqual(calls, ['scaleOut.PendingAppNum'])
+        self.assertEqual(lazy_inputs.values, {'scaleOut.PendingAppNum': 1})
+
+    def test_caches_missing_values(self):
+        calls = []
+        lazy_inputs = LazyInputs({'scaleIn.TaskNodeCPULoad': lambda: calls.append(1)})
+        self.assertIsNone(lazy_inputs('scaleIn.TaskNodeCPULoad'))
+        self.assertIsNone(lazy_inputs('scaleIn.TaskNodeCPULoad'))
+        self.assertEqual(len(calls), 1)
+
+    def test_skipped_inputs_are_never_loaded(self):
+        config = make_config()
+        loaded = []
+        lazy_inputs = LazyInputs({name: (lambda name=name: loaded.append(name) or NEUTRAL_INPUTS[name])
+                                  for name in DECISION_INPUTS})
+        _, _, skipped = decide_scale_status(config, config.maximumUnits, lazy_inputs)
+        self.assertTrue(skipped)
+        self.assertFalse(set(skipped) & set(loaded))
+
+
+class ComputeDemandScaleOutUnitsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = make_config()
+
+    def test_sizes_by_virtual_cores(self):
+        metrics = {'allocatedVirtualCores': 400, 'pendingVirtualCores': 80, 'reservedVirtualCores': 20}
+        self.assertEqual(compute_demand_scale_out_units(self.config, 400, 300, metrics, headroom=0.2), 600)
+
+    def test_sizes_by_memory_when_it_needs_more_units(self):
+        # 每个Unit按集群平均 4096MB/vCore 估算，内存需求 2,457,600MB = 600 Unit
+        metrics = {'allocatedVirtualCores': 400, 'allocatedMB': 2457600, 'totalVirtualCores': 1000, 'totalMB': 4096000}
+        self.assertEqual(compute_demand_scale_out_units(self.config, 400, 300, metrics, headroom=0), 600)
+
+    def test_explicit_unit_memory(self):
+        metrics = {'allocatedVirtualCores': 100, 'allocatedMB': 800 * 1024}
+        self.assertEqual(compute_demand_scale_out_units(self.config, 400, 300, metrics, headroom=0, unit_memory_mb=1024), 800)
+
+    def test_unit_virtual_cores(self):
+        metrics = {'allocatedVirtualCores': 2000}
+        self.assertEqual(compute_demand_scale_out_units(self.config, 400, 300, metrics, headroom=0, unit_virtual_cores=4), 500)
+
+    def test_skips_when_current_maximum_covers_demand(self):
+        metrics = {'allocatedVirtualCores': 300, 'pendingVirtualCores': None}
+        self.assertIsNone(compute_demand_scale_out_units(self.config, 400, 300, metrics, headroom=0.2))
+
+    def test_capped_at_maximum_units(self):
+        metrics = {'allocatedVirtualCores': 5000}
+        self.assertEqual(compute_demand_scale_out_units(self.config, 400, 300, metrics), self.config.maximumUnits)
+
+    def test_above_minimum_units(self):
+        metrics = {'allocatedVirtualCores': 101}
+        self.assertEqual(compute_demand_scale_out_units(self.config, 100, 300, metrics, headroom=0), 301)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+
+from tools.yarn_queues import parse_scheduler_queues
+
+CAPACITY_SCHEDULER = {
+    'scheduler': {
+        'schedulerInfo': {
+            'type': 'capacityScheduler',
+            'queues': {'queue': [
+                {
+                    'queueName': 'default',
+                    'queuePath': 'root.default',
+                    'numPendingApplications': 0,
+                    'numActiveApplications': 1,
+                    'resourcesUsed': {'memory': 2048, 'vCores': 2},
+                    'absoluteUsedCapacity': 10.0,
+                    'absoluteMaxCapacity': 100.0,
+                },
+                {
+                    'queueName': 'analytics',
+                    'queuePath': 'root.analytics',
+                    'queues': {'queue': [{
+                        'queueName': 'etl',
+                        'queuePath': 'root.analytics.etl',
+                        'numPendingApplications': 3,
+                        'numActiveApplications': 2,
+                        'pendingContainers': 7,
+                        'resourcesUsed': {'memory': 8192, 'vCores': 4},
+                        'maxEffectiveCapacity': {'memory': 65536, 'vCores': 32},
+                        'absoluteUsedCapacity': 40.0,
+                        'absoluteMaxCapacity': 50.0,
+                        'resources': {'resourceUsagesByPartition': [
+                            {'partitionName': 'gpu', 'pending': {'memory': 999, 'vCores': 9}},
+                            {'partitionName': '', 'pending': {'memory': 4096, 'vCores': 3}},
+                        ]},
+                    }]},
+                },
+            ]},
+        },
+    },
+}
+
+FAIR_SCHEDULER = {
+    'scheduler': {
+        'schedulerInfo': {
+            'type': 'fairScheduler',
+            'rootQueue': {
+                'queueName': 'root',
+                'clusterResources': {'memory': 100000, 'vCores': 100},
+                'childQueues': {'queue': [
+                    {
+                        'queueName': 'root.default',
+                        'numPendingApps': 0,
+                        'numActiveApps': 0,
+                        'usedResources': {'memory': 0, 'vCores': 0},
+                        'demandResources': {'memory': 0, 'vCores': 0},
+                        'maxResources': {'memory': 0, 'vCores': 0},
+                    },
+                    {
+                        'queueName': 'root.adhoc',
+                        'childQueues': {'queue': {
+                            'queueName': 'root.adhoc.users',
+                            'numPendingApps': 2,
+                            'numActiveApps': 1,
+                            'usedResources': {'memory': 20000, 'vCores': 10},
+                            'demandResources': {'memory': 30000, 'vCores': 12},
+                            'maxResources': {'memory': 200000, 'vCores': 200},
+                        }},
+                    },
+                ]},
+            },
+        },
+    },
+}
+
+
+class CapacitySchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queues = parse_scheduler_queues(CAPACITY_SCHEDULER)
+
+    def test_leaf_queues_by_path(self):
+        self.assertEqual(set(self.queues), {'root.default', 'root.analytics.etl'})
+
+    def test_default_partition_pending_resources(self):
+        etl = self.queues['root.analytics.etl']
+        self.assertEqual(etl['PendingApps'], 3)
+        self.assertEqual(etl['ActiveApps'], 2)
+        self.assertEqual(etl['PendingContainers'], 7)
+        self.assertEqual(etl['PendingMB'], 4096)
+        self.assertEqual(etl['PendingVirtualCores'], 3)
+        self.assertEqual(etl['UsedMB'], 8192)
+        self.assertEqual(etl['MaxVirtualCores'], 32)
+        self.assertEqual(etl['AbsoluteUsedCapacity'], 40.0)
+
+    def test_missing_fields(self):
+        default = self.queues['root.default']
+        self.assertEqual(default['PendingMB'], 0)
+        self.assertEqual(default['PendingContainers'], 0)
+        self.assertIsNone(default['MaxMB'])
+
+    def test_without_outer_scheduler_key(self):
+        self.assertEqual(parse_scheduler_queues(CAPACITY_SCHEDULER['scheduler']), self.queues)
+
+
+class FairSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queues = parse_scheduler_queues(FAIR_SCHEDULER)
+
+    def test_leaf_queues_including_single_child(self):
+        self.assertEqual(set(self.queues), {'root.default', 'root.adhoc.users'})
+
+    def test_pending_is_demand_minus_used(self):
+        users = self.queues['root.adhoc.users']
+        self.assertEqual(users['PendingApps'], 2)
+        self.assertEqual(users['PendingMB'], 10000)
+        self.assertEqual(users['PendingVirtualCores'], 2)
+        self.assertEqual(users['AbsoluteUsedCapacity'], 20.0)
+        # 最大资源超过集群资源时按100%计算
+        self.assertEqual(users['AbsoluteMaxCapacity'], 100.0)
+
+    def test_unset_max_resources(self):
+        default = self.queues['root.default']
+        self.assertIsNone(default['MaxMB'])
+        self.assertEqual(default['AbsoluteUsedCapacity'], 0.0)
+
+
+class EmptySchedulerTest(unittest.TestCase):
+
+    def test_no_queues(self):
+        self.assertEqual(parse_scheduler_queues({'scheduler': {'schedulerInfo': {}}}), {})
+        self.assertEqual(parse_scheduler_queues({}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from contextlib import AsyncExitStack
+import boto3
+import aioboto3
+from botocore.config import Config
+from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+
+
+class AWSClientRegistry:
+    """
+    进程级共享的AWS客户端注册表。
+
+    每个(服务, 区域)只创建一个boto3客户端，统一配置连接池大小、自适应重试和超时，
+    避免每次实例化都重新解析凭证和Endpoint。aioboto3客户端同样长期持有，
+    按事件循环区分，在close_aio_clients时统一关闭。
+    """
+
+    def __init__(self, max_pool_connections=50, max_attempts=10, connect_timeout=5, read_timeout=30):
+        """
+        :param max_pool_connections: 每个客户端的最大连接池大小
+        :param max_attempts: 自适应重试模式下的最大尝试次数
+        :param connect_timeout: 连接超时(秒)
+        :param read_timeout: 读取超时(秒)
+        """
+        self.config = Config(
+            max_pool_connections=max_pool_connections,
+            retries={'mode': 'adaptive', 'max_attempts': max_attempts},
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+        )
+        self._lock = threading.Lock()
+        self._session = None
+        self._clients = {}
+        self._aio_session = None
+        self._aio_clients = {}
+        self._aio_exit_stacks = {}
+        self._aio_locks = {}
+
+    def get_client(self, service_name, region_name=None):
+        """
+        获取指定服务和区域的共享boto3客户端。
+
+        :param service_name: AWS服务名称，例如 'emr'
+        :param region_name: 区域，默认使用环境中的默认区域
+        :return: boto3客户端
+        """
+        key = (service_name, region_name)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        # boto3的Session不是线程安全的，创建客户端时需要加锁；创建好的客户端可以跨线程共享
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if self._session is None:
+                    self._session = boto3.session.Session()
+                client = self._session.client(service_name, region_name=region_name, config=self.config)
+                self._clients[key] = client
+                Utils.logger.info(f"Created shared boto3 client for service '{service_name}' (region: {region_name or 'default'})")
+            return client
+
+    async def get_aio_client(self, service_name, region_name=None):
+        """
+        获取当前事件循环中指定服务和区域的长期aioboto3客户端。
+
+        :param service_name: AWS服务名称，例如 'cloudwatch'
+        :param region_name: 区域，默认使用环境中的默认区域
+        :return: aioboto3客户端
+        """
+        loop = asyncio.get_running_loop()
+        key = (service_name, region_name, loop)
+        client = self._aio_clients.get(key)
+        if client is not None:
+            return client
+
+        # 并发的协程可能同时第一次请求同一个客户端，加锁保证只创建一个
+        lock = self._aio_locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            client = self._aio_clients.get(key)
+            if client is not None:
+                return client
+            if self._aio_session is None:
+                self._aio_session = aioboto3.Session()
+            exit_stack = self._aio_exit_stacks.get(loop)
+            if exit_stack is None:
+                exit_stack = AsyncExitStack()
+                self._aio_exit_stacks[loop] = exit_stack
+            client = await exit_stack.enter_async_context(
+                self._aio_session.client(service_name, region_name=region_name, config=self.config))
+            self._aio_clients[key] = client
+            Utils.logger.info(f"Created shared aioboto3 client for service '{service_name}' (region: {region_name or 'default'})")
+            return client
+
+    async def close_aio_clients(self):
+        """
+        关闭当前事件循环中创建的所有aioboto3客户端。
+        """
+        loop = asyncio.get_running_loop()
+        exit_stack = self._aio_exit_stacks.pop(loop, None)
+        self._aio_locks.pop(loop, None)
+        for key in [key for key in self._aio_clients if key[2] is loop]:
+            del self._aio_clients[key]
+        if exit_stack is not None:
+            await exit_stack.aclose()
+
+
+registry = AWSClientRegistry()
+
+
+def get_client(service_name, region_name=None):
+    """
+    从进程级注册表获取共享的boto3客户端。
+
+    :param service_name: AWS服务名称
+    :param region_name: 区域
+    :return: boto3客户端
+    """
+    return registry.get_client(service_name, region_name)
+
+
+async def get_aio_client(service_name, region_name=None):
+    """
+    从进程级注册表获取共享的aioboto3客户端。
+
+    :param service_name: AWS服务名称
+    :param region_name: 区域
+    :return: aioboto3客户端
+    """
+    return await registry.get_aio_client(service_name, region_name)
@@ -0,0 +1,183 @@
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .utils import Utils
+from .simulator import DECISION_SERIES, ScalingSimulator, override_config
+
+# 评分的默认权重：每小时容量不足、每个多余的Unit小时、每次策略写入
+DEFAULT_WEIGHTS = {
+    'underProvisionedHours': 100.0,
+    'overProvisionedUnitHours': 1.0,
+    'policyWrites': 0.5,
+}
+
+# 工作进程内共享的回放状态，由 _init_worker 设置
+_worker_state = None
+
+
+def parse_range(spec):
+    """
+    解析一个参数范围。
+
+    :param spec: 'name=start:stop:step'(包含stop) 或 'name=v1,v2,v3'
+    :return: (参数名, 取值列表)
+    """
+    name, _, values = spec.partition('=')
+    name, values = name.strip(), values.strip()
+    if not name or not values:
+        raise ValueError(f"Invalid range '{spec}', expected name=start:stop:step or name=v1,v2,...")
+    if ':' in values:
+        start, stop, step = (float(v) for v in values.split(':'))
+        if step <= 0:
+            raise ValueError(f"Invalid range '{spec}', step must be positive")
+        count = int(round((stop - start) / step)) + 1
+        values = [round(start + i * step, 10) for i in range(count) if start + i * step <= stop + 1e-9]
+    else:
+        values = [float(v) for v in values.split(',')]
+    # 整数值保持为int，结果中的参数与Parameter Store中的写法一致
+    return name, [int(v) if v.is_integer() else v for v in values]
+
+
+def expand_grid(ranges):
+    """
+    展开所有参数组合。
+
+    :param ranges: [(参数名, 取值列表)]
+    :return: [{参数名: 值}] 列表
+    """
+    names = [name for name, _ in ranges]
+    return [dict(zip(names, values)) for values in itertools.product(*(values for _, values in ranges))]
+
+
+def score(summary, weights=None):
+    """
+    计算一次回放的得分，越低越好。
+
+    :param summary: ScalingSimulator.run 返回的汇总
+    :param weights: 评分权重，默认为 DEFAULT_WEIGHTS
+    :return: 得分
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    return (summary['underProvisionedSeconds'] / 3600 * weights['underProvisionedHours']
+            + summary['overProvisionedUnitHours'] * weights['overProvisionedUnitHours']
+            + summary['policyWrites'] * weights['policyWrites'])
+
+
+def _init_worker(state):
+    """
+    工作进程初始化：保存历史数据(含已预计算的窗口聚合)和回放参数。
+    fork方式启动时直接继承父进程内存，不需要序列化。
+    """
+    global _worker_state
+    _worker_state = state
+    # 工作进程只需要汇总结果，不输出每次回放的日志
+    Utils.logger.remove()
+
+
+def _evaluate(overrides):
+    """
+    在工作进程中回放一个参数组合。
+    """
+    state = _worker_state
+    config = override_config(state['config'], overrides)
+    simulator = ScalingSimulator(config, state['history'], **state['simulator_kwargs'])
+    summary = simulator.run(state['start_time'], state['end_time'], record_timeline=False)['summary']
+    return {'parameters': overrides, 'score': score(summary, state['weights']), **summary}
+
+
+class Backtester:
+    """
+    在历史数据上并行评估参数组合。
+
+    回放前在父进程中按所有组合用到的(tick间隔, 指标, 窗口)预先计算窗口平均值，
+    工作进程通过fork继承这些结果，每个组合的回放只剩决策循环本身。
+    """
+
+    def __init__(self, config, history, start_time=None, end_time=None, weights=None, **simulator_kwargs):
+        """
+        :param config: 基础配置(ScalingConfig)，每个组合在其上覆盖参数
+        :param history: MetricHistory 实例
+        :param start_time: 回放起点，默认为第一个样本之后所有组合中最大窗口的位置
+        :param end_time: 回放终点，默认为最后一个样本
+        :param weights: 评分权重，默认为 DEFAULT_WEIGHTS
+        :param simulator_kwargs: 传给 ScalingSimulator 的其他参数(延迟、余量等)
+        """
+        self.config = config
+        self.history = history
+        self.start_time = start_time
+        self.end_time = end_time
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.simulator_kwargs = simulator_kwargs
+
+    def _precompute(self, combinations):
+        """
+        计算所有组合共用的tick序列和窗口平均值，写入history的缓存。
+        """
+        configs = [override_config(self.config, overrides) for overrides in combinations]
+        if self.start_time is None and self.history.timestamps:
+            # 所有组合使用同一个起点，保证tick序列和缓存可以共用、结果可以比较
+            max_window_minutes = max(config.get_metric_window_minutes(name, scale_status)
+                                     for config in configs for name in DECISION_SERIES
+                                     for scale_status in ('scaleOut', 'scaleIn'))
+            self.start_time = self.history.timestamps[0] + int(max_window_minutes * 60)
+
+        started = time.perf_counter()
+        windows = set()
+        for config in configs:
+            ticks_key = config.actionIntervalSeconds
+            for name in DECISION_SERIES:
+                for scale_status in ('scaleOut', 'scaleIn'):
+                    windows.add((ticks_key, name, config.get_metric_window_minutes(name, scale_status)))
+        tick_series = {}
+        for interval, name, window_minutes in sorted(windows):
+            if interval not in tick_series:
+                tick_series[interval] = self.history.ticks(interval, self.start_time, self.end_time)
+                ticks = tick_series[interval]
+                for column in ('PendingAppNum', 'YARNMemoryAvailablePercentage') + tuple(self.history.snapshot_columns):
+                    self.history.latest(ticks, column)
+            self.history.window_means(tick_series[interval], name, window_minutes)
+        Utils.logger.info(
+            f"Precomputed {len(windows)} window aggregates over {len(tick_series)} tick series in {time.perf_counter() - started:.3f} seconds.")
+
+    def run(self, combinations, workers=None, chunksize=None):
+        """
+        评估所有参数组合并按得分从低到高排序。
+
+        :param combinations: [{参数名: 值}] 列表
+        :param workers: 工作进程数，默认为CPU核数
+        :param chunksize: 每次分发给工作进程的组合数，默认按组合数和进程数计算
+        :return: 按得分排序的结果列表
+        """
+        # 预计算时会校验所有参数名，错误在父进程中报出
+        self._precompute(combinations)
+
+        state = {
+            'config': self.config,
+            'history': self.history,
+            'simulator_kwargs': self.simulator_kwargs,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'weights': self.weights,
+        }
+        workers = workers or os.cpu_count() or 1
+        chunksize = chunksize or max(1, len(combinations) // (workers * 4))
+
+        started = time.perf_counter()
+        if workers == 1:
+            global _worker_state
+            _worker_state = state
+            results = [_evaluate(overrides) for overrides in combinations]
+        else:
+            # fork启动的工作进程直接共享父进程中已经预计算的缓存；不支持fork的平台会序列化一次
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(state,)) as executor:
+                results = list(executor.map(_evaluate, combinations, chunksize=chunksize))
+
+        results.sort(key=lambda result: result['score'])
+        Utils.logger.info(
+            f"Evaluated {len(combinations)} combinations with {workers} workers in {time.perf_counter() - started:.3f} seconds.")
+        return results
@@ -1,8 +1,6 @@
-import boto3
-import aioboto3
-import asyncio
 from datetime import datetime, timedelta
 from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+from .aws_clients import get_client, get_aio_client
 
 
 class CloudWatchMetric:
@@ -22,7 +20,7 @@ class CloudWatchMetric:
         """
         Utils.logger.info(
             f"Retrieving metric statistics for '{metric}' (sync)")
-        sync_client = boto3.client('cloudwatch')
+        sync_client = get_client('cloudwatch')
         if statistics is None:
             statistics = ['Average']
         response = sync_client.get_metric_statistics(
@@ -38,6 +36,66 @@ class CloudWatchMetric:
             f"Successfully retrieved metric statistics for '{metric}' (sync)")
         return response
 
+    @Utils.exception_handler
+    def get_metric_data(self, metric_data_queries, minutes=15):
+        """
+        同步通过GetMetricData批量获取指标数据，自动跟随NextToken分页。
+        单次请求最多包含500个查询。
+
+        :param metric_data_queries: MetricDataQueries 列表(不超过500个)
+        :param minutes: 查询最近多少分钟的数据
+        :return: 按查询Id合并后的 {Id: (Timestamps, Values)}
+        """
+        Utils.logger.info(
+            f"Retrieving metric data for {len(metric_data_queries)} queries (sync)")
+        sync_client = get_client('cloudwatch')
+        end_time = datetime.utcnow()
+        paginator = sync_client.get_paginator('get_metric_data')
+        results = {}
+        for page in paginator.paginate(
+            MetricDataQueries=metric_data_queries,
+            StartTime=end_time - timedelta(minutes=minutes),
+            EndTime=end_time,
+            ScanBy='TimestampAscending',
+        ):
+            for result in page['MetricDataResults']:
+                timestamps, values = results.setdefault(result['Id'], ([], []))
+                timestamps.extend(result['Timestamps'])
+                values.extend(result['Values'])
+        Utils.logger.info(
+            f"Successfully retrieved metric data for {len(results)} queries (sync)")
+        return results
+
+    @Utils.exception_handler
+    async def aioget_metric_data(self, metric_data_queries, minutes=15):
+        """
+        异步通过GetMetricData批量获取指标数据，自动跟随NextToken分页。
+        单次请求最多包含500个查询。
+
+        :param metric_data_queries: MetricDataQueries 列表(不超过500个)
+        :param minutes: 查询最近多少分钟的数据
+        :return: 按查询Id合并后的 {Id: (Timestamps, Values)}
+        """
+        Utils.logger.info(
+            f"Retrieving metric data for {len(metric_data_queries)} queries (async)")
+        async_client = await get_aio_client('cloudwatch')
+        end_time = datetime.utcnow()
+        paginator = async_client.get_paginator('get_metric_data')
+        results = {}
+        async for page in paginator.paginate(
+            MetricDataQueries=metric_data_queries,
+            StartTime=end_time - timedelta(minutes=minutes),
+            EndTime=end_time,
+            ScanBy='TimestampAscending',
+        ):
+            for result in page['MetricDataResults']:
+                timestamps, values = results.setdefault(result['Id'], ([], []))
+                timestamps.extend(result['Timestamps'])
+                values.extend(result['Values'])
+        Utils.logger.info(
+            f"Successfully retrieved metric data for {len(results)} queries (async)")
+        return results
+
     @Utils.exception_handler
     async def aioget_metric_statistics(self, metric, dimensions, minutes=15, statistics=None, period=60):
         """
@@ -47,17 +105,16 @@ class CloudWatchMetric:
             f"Retrieving metric statistics for '{metric}' (async)")
         if statistics is None:
             statistics = ['Average']
-        session = aioboto3.Session()
-        async with session.client('cloudwatch') as async_client:
-            response = await async_client.get_metric_statistics(
-                Namespace=self.namespace,
-                MetricName=metric,
-                Dimensions=dimensions,
-                StartTime=datetime.utcnow() - timedelta(minutes=minutes),
-                EndTime=datetime.utcnow(),
-                Period=period,
-                Statistics=statistics,
-            )
-            Utils.logger.info(
-                f"Successfully retrieved metric statistics for '{metric}' (async)")
-            return response
+        async_client = await get_aio_client('cloudwatch')
+        response = await async_client.get_metric_statistics(
+            Namespace=self.namespace,
+            MetricName=metric,
+            Dimensions=dimensions,
+            StartTime=datetime.utcnow() - timedelta(minutes=minutes),
+            EndTime=datetime.utcnow(),
+            Period=period,
+            Statistics=statistics,
+        )
+        Utils.logger.info(
+            f"Successfully retrieved metric statistics for '{metric}' (async)")
+        return response
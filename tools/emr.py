@@ -1,6 +1,6 @@
-import boto3
+from botocore.exceptions import ClientError
 from .utils import Utils  # 使用相对导入从同一包内导入Utils类
-import random
+from .aws_clients import get_client, get_aio_client
 
 class AWSEMRClient:
     """
@@ -8,7 +8,7 @@ class AWSEMRClient:
     """
 
     def __init__(self):
-        self.emr_client = boto3.client('emr')
+        self.emr_client = get_client('emr')
 
     @Utils.exception_handler
     def get_nodes_ec2_ids(self, cluster_id, instance_group_types_list=['TASK'], instance_states_list=['RUNNING']):
@@ -22,18 +22,16 @@ class AWSEMRClient:
 
         instance_ids = []
 
-        # 获取集群实例
-        instances = self.emr_client.list_instances(
+        # 获取集群实例(跟随Marker分页)
+        paginator = self.emr_client.get_paginator('list_instances')
+        for page in paginator.paginate(
             ClusterId=cluster_id,
             InstanceGroupTypes=instance_group_types_list,
             InstanceStates=instance_states_list
-        )
-
-        # 提取EC2实例ID
-        for instance in instances.get('Instances', []):
-            instance_id = instance['Ec2InstanceId']
-            instance_ids.append(instance_id)
-            Utils.logger.info(f"Found instance ID: {instance_id}")
+        ):
+            # 提取EC2实例ID
+            for instance in page.get('Instances', []):
+                instance_ids.append(instance['Ec2InstanceId'])
 
         Utils.logger.info(
             f"Found {len(instance_ids)} instance IDs for cluster '{cluster_id}'")
@@ -42,47 +40,76 @@ class AWSEMRClient:
     
 
     @Utils.exception_handler
-    def get_yarn_rm_url(self, cluster_id):
-        # """
-        # 从指定的EMR集群获取YARN ResourceManager URL。
+    def list_all_instances(self, cluster_id, instance_states_list=None):
+        """
+        分页获取指定EMR集群的所有实例。
 
-        # :param emr_cluster_id: EMR集群ID
-        # :return: YARN ResourceManager URL
-        # """
-        # cluster_details = self.emr_client.describe_cluster(ClusterId=cluster_id)
-        # cluster_details = cluster_details['Cluster']
+        :param cluster_id: EMR集群ID
+        :param instance_states_list: 实例状态列表，为None时不筛选
+        :return: 实例详情列表
+        """
+        kwargs = {'ClusterId': cluster_id}
+        if instance_states_list:
+            kwargs['InstanceStates'] = instance_states_list
 
-        # # 获取主节点的公共DNS
-        # master_public_dns = cluster_details['MasterPublicDnsName']
+        instances = []
+        paginator = self.emr_client.get_paginator('list_instances')
+        for page in paginator.paginate(**kwargs):
+            instances.extend(page.get('Instances', []))
+        return instances
 
-        # # 构造YARN ResourceManager URL
-        # yarn_rm_url = f'http://{master_public_dns}:8088'
-        # return yarn_rm_url
+    @Utils.exception_handler
+    def get_instance_collection_types(self, cluster_id):
+        """
+        获取指定EMR集群所有实例组或实例队列的类型。
 
+        :param cluster_id: EMR集群ID
+        :return: {实例组ID或实例队列ID: 'MASTER' | 'CORE' | 'TASK'}
+        """
+        collection_types = {}
+        for operation, key, type_key in (
+            ('list_instance_groups', 'InstanceGroups', 'InstanceGroupType'),
+            ('list_instance_fleets', 'InstanceFleets', 'InstanceFleetType'),
+        ):
+            try:
+                for page in self.emr_client.get_paginator(operation).paginate(ClusterId=cluster_id):
+                    for collection in page.get(key, []):
+                        collection_types[collection['Id']] = collection[type_key]
+            except ClientError as e:
+                # 集群只会使用实例组或实例队列中的一种
+                Utils.logger.debug(f"{operation} not applicable for cluster '{cluster_id}': {e}")
+        return collection_types
 
+    @Utils.exception_handler
+    def get_master_public_dns_list(self, cluster_id):
         """
-        从指定的EMR集群获取一个随机的YARN ResourceManager URL。
+        获取指定EMR集群所有主节点的公共DNS。
 
-        :param emr_cluster_id: EMR集群ID
-        :return: 一个随机的YARN ResourceManager URL
+        :param cluster_id: EMR集群ID
+        :return: 主节点公共DNS列表
         """
         cluster_details = self.emr_client.describe_cluster(ClusterId=cluster_id)
         cluster_details = cluster_details['Cluster']
 
-        # 获取所有主节点的公共DNS
         if 'MasterPublicDnsNameList' in cluster_details:
             # 多主节点架构
-            master_public_dns_list = [instance['PublicDnsName'] for instance in cluster_details['MasterPublicDnsNameList']]
-        else:
-            # 单主节点架构
-            master_public_dns_list = [cluster_details['MasterPublicDnsName']]
+            return [instance['PublicDnsName'] for instance in cluster_details['MasterPublicDnsNameList']]
+        # 单主节点架构
+        return [cluster_details['MasterPublicDnsName']]
+
+    @Utils.exception_handler
+    def get_yarn_rm_url(self, cluster_id):
+        """
+        从指定的EMR集群获取当前 ACTIVE 的 YARN ResourceManager URL。
 
-        # 构造所有YARN ResourceManager URLs
-        yarn_rm_urls = [f'http://{master_public_dns}:8088' for master_public_dns in master_public_dns_list]
+        主节点列表和 ACTIVE 地址由进程级共享的 YarnRMEndpointResolver 缓存，
+        不会在每次调用时请求 describe_cluster。
 
-        # 随机选择一个URL
-        random_yarn_rm_url = random.choice(yarn_rm_urls)
-        return random_yarn_rm_url
+        :param cluster_id: EMR集群ID
+        :return: ACTIVE YARN ResourceManager URL
+        """
+        from .yarn_rm import get_endpoint_resolver  # 避免与yarn_rm模块循环导入
+        return get_endpoint_resolver(cluster_id, emr_client=self).get_active_url()
 
     @Utils.exception_handler
     def get_managed_scaling_policy(self, cluster_id):
@@ -98,11 +125,26 @@ class AWSEMRClient:
         policy = self.emr_client.get_managed_scaling_policy(
             ClusterId=cluster_id)
 
-        Utils.logger.info(
-            f"Managed Scaling policy for cluster '{cluster_id}': {policy}")
+        Utils.logger.opt(lazy=True).debug(
+            "Managed Scaling policy for cluster '{}': {}", lambda: cluster_id, lambda: Utils.truncate(policy))
 
         return policy
 
+    @Utils.exception_handler
+    async def aioget_managed_scaling_policy(self, cluster_id):
+        """
+        异步获取指定EMR集群的Managed Scaling策略详情。
+        :param cluster_id: EMR集群的ID
+        :return: Managed Scaling策略详情
+        """
+        Utils.logger.info(
+            f"Fetching Managed Scaling policy for cluster '{cluster_id}' asynchronously")
+        client = await get_aio_client('emr')
+        policy = await client.get_managed_scaling_policy(ClusterId=cluster_id)
+        Utils.logger.opt(lazy=True).debug(
+            "Managed Scaling policy for cluster '{}': {}", lambda: cluster_id, lambda: Utils.truncate(policy))
+        return policy
+
     @Utils.exception_handler
     def put_managed_scaling_policy(self, cluster_id, policy):
         """
@@ -120,8 +162,9 @@ class AWSEMRClient:
             ManagedScalingPolicy=policy
         )
 
-        Utils.logger.info(
-            f"Managed Scaling policy updated for cluster '{cluster_id}': {response}")
+        Utils.logger.info(f"Managed Scaling policy updated for cluster '{cluster_id}'")
+        Utils.logger.opt(lazy=True).debug(
+            "put_managed_scaling_policy response: {}", lambda: Utils.truncate(response))
 
         return response
 
@@ -135,7 +178,7 @@ class AWSEMRClient:
         :return: 实例队列列表
         """
         response = self.emr_client.list_instance_fleets(ClusterId=ClusterId)
-        Utils.logger.info(f"Instance fleets response: {response}")
+        Utils.logger.opt(lazy=True).debug("Instance fleets response: {}", lambda: Utils.truncate(response))
         return response
 
     @Utils.exception_handler
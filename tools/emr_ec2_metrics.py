@@ -1,49 +1,146 @@
+import asyncio
 from .utils import Utils
 from .cloudwatch import CloudWatchMetric
-from .emr import AWSEMRClient
+from .inventory import get_inventory
 from collections import defaultdict
 
 class NodeMetricsRetriever:
     def __init__(self, namespace='AWS/EC2', metric_name='CPUUtilization'):
         self.namespace = namespace
         self.metric_name = metric_name
-        self.emr_client = AWSEMRClient()
         self.cw_metric = CloudWatchMetric(namespace=self.namespace)
-        self.max_dimensions = 30  # 设置 Dimensions 参数的最大大小
+        self.max_queries = 500  # GetMetricData 单次请求最多包含的查询数
+        self.period = 60
+
+    def _build_queries(self, node_ids):
+        """
+        为每个实例构造一个 GetMetricData 查询。
+
+        :param node_ids: EC2实例ID列表
+        :return: MetricDataQueries 列表
+        """
+        return [
+            {
+                'Id': f"m{i}",
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': self.namespace,
+                        'MetricName': self.metric_name,
+                        'Dimensions': [{'Name': 'InstanceId', 'Value': node_id}],
+                    },
+                    'Period': self.period,
+                    'Stat': 'Average',
+                },
+                'ReturnData': True,
+            }
+            for i, node_id in enumerate(node_ids)
+        ]
+
+    @Utils.exception_handler
+    def get_node_metric_series(self, node_ids, window_minutes):
+        """
+        获取每个实例在时间窗口内的指标序列。
+
+        :param node_ids: EC2实例ID列表
+        :param window_minutes: 时间窗口(分钟)
+        :return: {实例ID: [(Unix时间戳, 值), ...]}，按时间升序排列
+        """
+        series = {}
+        queries = self._build_queries(node_ids)
+        for i in range(0, len(queries), self.max_queries):
+            results = self.cw_metric.get_metric_data(queries[i:i + self.max_queries], minutes=window_minutes)
+            series.update(self._to_series(node_ids, results))
+        return series
+
+    @Utils.exception_handler
+    async def aioget_node_metric_series(self, node_ids, window_minutes):
+        """
+        异步获取每个实例在时间窗口内的指标序列，超过500个实例时各批次并发请求。
+
+        :param node_ids: EC2实例ID列表
+        :param window_minutes: 时间窗口(分钟)
+        :return: {实例ID: [(Unix时间戳, 值), ...]}，按时间升序排列
+        """
+        series = {}
+        queries = self._build_queries(node_ids)
+        batches = await asyncio.gather(*(
+            self.cw_metric.aioget_metric_data(queries[i:i + self.max_queries], minutes=window_minutes)
+            for i in range(0, len(queries), self.max_queries)))
+        for results in batches:
+            series.update(self._to_series(node_ids, results))
+        return series
+
+    @staticmethod
+    def _to_series(node_ids, results):
+        """
+        把GetMetricData的结果按查询Id映射回实例ID，并转换为按时间升序的 (Unix时间戳, 值) 列表。
+        """
+        return {
+            node_ids[int(query_id[1:])]: sorted(
+                (int(timestamp.timestamp()), value) for timestamp, value in zip(timestamps, values))
+            for query_id, (timestamps, values) in results.items()
+        }
+
+    def _average_by_timestamp(self, series):
+        """
+        按时间戳对齐所有实例的值并求平均，返回按时间升序排列的每分钟集群平均值。
+        """
+        values_by_timestamp = defaultdict(list)
+        for points in series.values():
+            for timestamp, value in points:
+                values_by_timestamp[timestamp].append(value)
+
+        avg_metrics = [sum(values) / len(values) for _, values in sorted(values_by_timestamp.items())]
+        Utils.logger.opt(lazy=True).debug(
+            "task node Average {} metric ({} points): {}",
+            lambda: self.metric_name, lambda: len(avg_metrics), lambda: Utils.truncate(avg_metrics))
+        return avg_metrics
 
     @Utils.exception_handler
     def get_task_node_metrics(self, emr_id, instance_group_types_list, instance_states_list, window_minutes):
-        node_ids = self.emr_client.get_nodes_ec2_ids(
-            emr_id, instance_group_types_list, instance_states_list)
-        Utils.logger.info(f"{instance_group_types_list} {instance_states_list} window_minutes={window_minutes} nodeids: {node_ids}")
+        """
+        获取指定实例组在时间窗口内的集群平均指标序列。
+
+        每个实例单独查询，按时间戳对齐后对同一分钟内所有实例的值求平均，
+        返回按时间升序排列的每分钟集群平均值。
+
+        :param emr_id: EMR集群ID
+        :param instance_group_types_list: 实例组类型列表，例如 ['TASK']
+        :param instance_states_list: 实例状态列表，例如 ['RUNNING']
+        :param window_minutes: 时间窗口(分钟)
+        :return: 每分钟集群平均值列表
+        """
+        node_ids = get_inventory(emr_id).get_instance_ids(
+            instance_group_types_list, instance_states_list)
+        Utils.logger.info(f"{instance_group_types_list} {instance_states_list} window_minutes={window_minutes} node count: {len(node_ids)}")
+
+        if not node_ids:
+            Utils.logger.warning(
+                f"The current cluster has no task nodes in the {instance_group_types_list} {instance_states_list} window_minutes={window_minutes}.")
+            return []
+
+        # 按时间戳聚合所有实例的值
+        return self._average_by_timestamp(self.get_node_metric_series(node_ids, window_minutes))
+
+    @Utils.exception_handler
+    async def aioget_task_node_metrics(self, emr_id, instance_group_types_list, instance_states_list, window_minutes):
+        """
+        get_task_node_metrics 的异步版本。实例清单来自共享缓存(必要时在线程中刷新)，
+        CloudWatch查询通过长期持有的aioboto3客户端发出。
+
+        :param emr_id: EMR集群ID
+        :param instance_group_types_list: 实例组类型列表，例如 ['TASK']
+        :param instance_states_list: 实例状态列表，例如 ['RUNNING']
+        :param window_minutes: 时间窗口(分钟)
+        :return: 每分钟集群平均值列表
+        """
+        node_ids = await asyncio.to_thread(
+            get_inventory(emr_id).get_instance_ids, instance_group_types_list, instance_states_list)
+        Utils.logger.info(f"{instance_group_types_list} {instance_states_list} window_minutes={window_minutes} node count: {len(node_ids)}")
 
         if not node_ids:
             Utils.logger.warning(
                 f"The current cluster has no task nodes in the {instance_group_types_list} {instance_states_list} window_minutes={window_minutes}.")
             return []
 
-        metrics_list = []
-        batches = [node_ids[i:i+self.max_dimensions] for i in range(0, len(node_ids), self.max_dimensions)]
-
-        for batch in batches:
-            dimensions = [{'Name': 'InstanceId', 'Value': id} for id in batch]
-            response = self.cw_metric.get_metric_statistics(
-                self.metric_name, dimensions, minutes=window_minutes)
-            Utils.logger.info(f"{response}")
-
-            batch_metrics = [metric['Average'] for metric in response['Datapoints']]
-            metrics_list.append(batch_metrics)
-
-        if metrics_list:
-            # 对每个位置的指标值进行平均
-            avg_metrics = []
-            max_length = max(len(batch) for batch in metrics_list)
-            for i in range(max_length):
-                values = [batch[i] for batch in metrics_list if i < len(batch)]
-                avg_metrics.append(sum(values) / len(values))
-
-            Utils.logger.info(f"task node Average {self.metric_name} metric: {avg_metrics}")
-            return avg_metrics
-        else:
-            Utils.logger.info(f"task node Average {self.metric_name} metricsList: []")
-            return []
\ No newline at end of file
+        return self._average_by_timestamp(await self.aioget_node_metric_series(node_ids, window_minutes))
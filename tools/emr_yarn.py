@@ -1,9 +1,14 @@
 import sqlite3
 import time
-import boto3
 from .utils import Utils
-from .emr import AWSEMRClient
-import requests
+from .ssm import get_config_cache
+from .metrics_store import METRIC_COLUMNS, MetricWindows, connect
+from .yarn_queues import QUEUE_THRESHOLD_METRICS, match_queue_name
+from .yarn_rm import get_yarn_rm_client
+from .tick_metrics import tick_metrics
+
+# 采集器写入的Task Node CPU数据点间隔(秒)
+TASK_NODE_CPU_PERIOD_SECONDS = 60
 
 class EMRMetricManager:
     """
@@ -11,7 +16,7 @@ class EMRMetricManager:
     """
 
     def __init__(self):
-        self.ssm_client = boto3.client('ssm')
+        self._connections = {}
 
     @Utils.exception_handler
     def sanitize_table_name(self, table_name):
@@ -24,7 +29,7 @@ class EMRMetricManager:
         return ''.join(c if c.isalnum() or c == '_' else '_' for c in table_name)
 
     @Utils.exception_handler
-    def get_data_from_sqlite(self, emr_cluster_id='j-1F74M1P9SC57B', metric_name='PendingAppNum', prefix='managedScalingEnhanced', ScaleStatus='scaleOut'):
+    def get_data_from_sqlite(self, emr_cluster_id='j-1F74M1P9SC57B', metric_name='PendingAppNum', prefix='managedScalingEnhanced', ScaleStatus='scaleOut', config=None):
         """
         从SQLite数据库中获取指定指标的数据。
 
@@ -32,76 +37,291 @@ class EMRMetricManager:
         :param metric_name: 需要查询的指标名称
         :param prefix: 参数前缀
         :param ScaleStatus: 扩缩容状态 ('scaleOut' 或 'scaleIn')
+        :param config: ScalingConfig实例，未传入时从共享的配置缓存读取
         :return: 指定时间范围内的指标数据列表
         """
-        # 1. 通过emr_cluster_id，查询对应的sqlite文件和表名
-        table_name = self.sanitize_table_name(emr_cluster_id.replace('-', '_'))
-
-        # 2. 检查metric_name是否合法
-        valid_metrics = ['PendingAppNum', 'CapacityRemainingGB', 'YARNMemoryAvailablePercentage']
-        if metric_name not in valid_metrics:
-            Utils.logger.error(f"Invalid metric name: {metric_name}. Valid metrics are: {', '.join(valid_metrics)}")
+        # 检查metric_name是否合法
+        if metric_name not in METRIC_COLUMNS:
+            Utils.logger.error(f"Invalid metric name: {metric_name}. Valid metrics are: {', '.join(METRIC_COLUMNS)}")
             return []
 
-        # 3. 通过prefix，得到monitor_interval_seconds
-        monitor_interval_seconds = int(self.ssm_client.get_parameter(
-            Name=f"/{prefix}/monitorIntervalSeconds", WithDecryption=True)["Parameter"]["Value"])
-
-        # 4. 根据ScaleStatus和metric_name获取时间窗口
-        if ScaleStatus == 'scaleOut':
-            time_range_param_name = f"/{prefix}/scaleOutAvg{metric_name}Minutes"
-        elif ScaleStatus == 'scaleIn':
-            time_range_param_name = f"/{prefix}/scaleInAvg{metric_name}Minutes"
-        else:
+        # 根据ScaleStatus获取时间窗口
+        if ScaleStatus not in ('scaleOut', 'scaleIn'):
             Utils.logger.error(f"Invalid ScaleStatus: {ScaleStatus}. ScaleStatus should be 'scaleOut' or 'scaleIn'.")
             return []
 
-        time_range_minutes = int(self.ssm_client.get_parameter(
-            Name=time_range_param_name, WithDecryption=True)["Parameter"]["Value"])
+        if config is None:
+            config = get_config_cache(prefix).get_config()
+        window_minutes = config.get_metric_window_minutes(metric_name, ScaleStatus)
+        return self.get_metric_windows(emr_cluster_id, config, window_minutes).get(metric_name, window_minutes)
+
+    @Utils.exception_handler
+    def get_metric_windows(self, emr_cluster_id, config, max_window_minutes=None):
+        """
+        一次扫描读取所有指标列，返回可以回答任意(指标, 时间窗口)查询的 MetricWindows。
+
+        :param emr_cluster_id: EMR集群ID
+        :param config: ScalingConfig 实例
+        :param max_window_minutes: 需要读取的最大窗口(分钟)，默认取配置中所有指标窗口的最大值
+        :return: MetricWindows 实例
+        """
+        table_name = self.sanitize_table_name(emr_cluster_id.replace('-', '_'))
+
+        if max_window_minutes is None:
+            max_window_minutes = max(
+                config.get_metric_window_minutes(metric_name, scale_status)
+                for metric_name in METRIC_COLUMNS for scale_status in ('scaleOut', 'scaleIn'))
 
         # 计算时间范围
         end_time = int(time.time())
-        start_time = end_time - time_range_minutes * 60
+        start_time = end_time - int(max_window_minutes * 60)
+
+        # SQL文本固定且参数化，复用连接时sqlite3会缓存预编译语句
+        cursor = self._get_connection(table_name).execute(
+            f"SELECT Timestamp, {', '.join(METRIC_COLUMNS)} FROM {table_name} WHERE Timestamp BETWEEN ? AND ? ORDER BY Timestamp",
+            (start_time, end_time))
+        rows = cursor.fetchall()
 
-        # 连接到SQLite数据库
-        conn = sqlite3.connect(f"{table_name}.db")
-        cursor = conn.cursor()
+        timestamps = [row[0] for row in rows]
+        columns = {metric_name: [row[i + 1] for row in rows] for i, metric_name in enumerate(METRIC_COLUMNS)}
+        return MetricWindows(timestamps, columns, end_time, config.monitorIntervalSeconds)
+
+    def _get_connection(self, table_name):
+        """
+        获取指定表的常驻只读连接。
+        """
+        conn = self._connections.get(table_name)
+        if conn is None:
+            # WAL只读连接，不会与采集器的写入互相阻塞
+            conn = connect(f"{table_name}.db", readonly=True)
+            self._connections[table_name] = conn
+        return conn
 
-        # 查询指定时间范围内的数据
-        cursor.execute(f"SELECT {metric_name} FROM {table_name} WHERE Timestamp BETWEEN {start_time} AND {end_time} ORDER BY Timestamp")
-        records = [row[0] for row in cursor.fetchall()]
+    @Utils.exception_handler
+    def get_task_node_cpu_from_sqlite(self, emr_cluster_id='j-1F74M1P9SC57B', window_minutes=15):
+        """
+        从采集器写入的本地表中读取当前在役Task Node的每分钟平均CPU序列。
 
-        # 计算在时间范围内应该有多少个数据点
-        expected_data_points = time_range_minutes * 60 // monitor_interval_seconds
+        与集群指标相同，窗口内的数据点少于期望值的 MetricWindows.completeness_ratio 时视为数据不足，
+        例如采集器刚启动时，调用方会回退到CloudWatch。
 
-        # 检查数据是否足够
-        if len(records) < expected_data_points * 0.7:
+        :param emr_cluster_id: EMR集群ID
+        :param window_minutes: 时间窗口(分钟)
+        :return: 按时间升序排列的每分钟平均CPU列表，本地没有数据或数据不足时返回空列表
+        """
+        table_name = self.sanitize_table_name(emr_cluster_id.replace('-', '_'))
+
+        end_time = int(time.time())
+        start_time = end_time - int(window_minutes * 60)
+
+        conn = connect(f"{table_name}.db", readonly=True)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""SELECT c.Timestamp, AVG(c.CPUUtilization)
+                    FROM {table_name}_task_cpu c JOIN {table_name}_task_nodes n ON c.InstanceId = n.InstanceId
+                    WHERE n.LeaveTime IS NULL AND c.Timestamp BETWEEN ? AND ?
+                    GROUP BY c.Timestamp ORDER BY c.Timestamp""",
+                (start_time, end_time))
+            records = [row[1] for row in cursor.fetchall()]
+        except sqlite3.OperationalError as e:
+            # 采集器尚未创建Task Node CPU表
+            Utils.logger.warning(f"Task node CPU table not available for cluster '{emr_cluster_id}': {e}")
+            records = []
+        finally:
+            conn.close()
+
+        # CloudWatch的CPU数据粒度为1分钟
+        expected_data_points = int(window_minutes * 60) // TASK_NODE_CPU_PERIOD_SECONDS
+        if records and len(records) < expected_data_points * MetricWindows.completeness_ratio:
             Utils.logger.warning(
-                f"Not enough data in the specified time range ({time_range_minutes} minutes) for metric '{metric_name}'. Expected {expected_data_points} data points, but only got {len(records)}.")
+                f"Not enough local task node CPU data for the last {window_minutes} minutes. Expected {expected_data_points} data points, but only got {len(records)}.")
             return []
+        return records
 
-        # 关闭数据库连接
-        conn.close()
+    @Utils.exception_handler
+    def get_queue_means(self, emr_cluster_id, thresholds, monitor_interval_seconds):
+        """
+        读取配置了阈值的每个队列在各自时间窗口内的指标平均值。
 
-        return records
+        与集群指标相同，窗口内的样本数少于期望值的 MetricWindows.completeness_ratio 时视为数据不足。
 
+        :param emr_cluster_id: EMR集群ID
+        :param thresholds: get_queue_thresholds 的返回值
+        :param monitor_interval_seconds: 采集间隔(秒)
+        :return: {阈值中的队列名: {指标名: 平均值}}，数据不足或没有匹配的队列不包含在内
+        """
+        if not thresholds:
+            return {}
+        table_name = self.sanitize_table_name(emr_cluster_id.replace('-', '_'))
+        conn = self._get_connection(table_name)
+        table_name = f"{table_name}_queues"
+        end_time = int(time.time())
+        averages = ', '.join(f"AVG({name})" for name in QUEUE_THRESHOLD_METRICS)
+        try:
+            queue_names = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT QueueName FROM {table_name} WHERE Timestamp >= ?",
+                (end_time - int(max(t['Minutes'] for t in thresholds.values()) * 60),))]
+            queue_means = {}
+            for threshold_queue_name, queue_thresholds in thresholds.items():
+                queue_name = match_queue_name(threshold_queue_name, queue_names)
+                if queue_name is None:
+                    Utils.logger.warning(f"No recent samples for queue '{threshold_queue_name}' of cluster '{emr_cluster_id}'.")
+                    continue
+                window_seconds = int(queue_thresholds['Minutes'] * 60)
+                row = conn.execute(
+                    f"SELECT COUNT(*), {averages} FROM {table_name} WHERE QueueName = ? AND Timestamp BETWEEN ? AND ?",
+                    (queue_name, end_time - window_seconds, end_time)).fetchone()
+                expected_data_points = window_seconds // monitor_interval_seconds
+                if row[0] < max(1, expected_data_points * MetricWindows.completeness_ratio):
+                    Utils.logger.info(f"Queue '{queue_name}' has {row[0]} of {expected_data_points} expected samples, skipped.")
+                    continue
+                queue_means[threshold_queue_name] = dict(zip(QUEUE_THRESHOLD_METRICS, row[1:]))
+        except sqlite3.OperationalError as e:
+            # 采集器尚未创建队列指标表
+            Utils.logger.warning(f"Queue metric table not available for cluster '{emr_cluster_id}': {e}")
+            return {}
+        return queue_means
 
     @Utils.exception_handler
-    def get_yarn_metrics(self, emr_cluster_id='j-1F74M1P9SC57B',metrics_name='pendingVirtualCores'):
+    def get_latest_cluster_metrics(self, emr_cluster_id='j-1F74M1P9SC57B', max_age_seconds=None):
+        """
+        从采集器写入的本地表中读取最新一个样本的clusterMetrics字段。
+
+        :param emr_cluster_id: EMR集群ID
+        :param max_age_seconds: 样本的最大年龄(秒)，更旧的样本视为不可用，为None时不检查
+        :return: clusterMetrics 字典；没有样本、样本过旧或采集器未保存clusterMetrics字段时返回None
+        """
+        table_name = self.sanitize_table_name(emr_cluster_id.replace('-', '_'))
+        try:
+            cursor = self._get_connection(table_name).execute(
+                f"SELECT * FROM {table_name} ORDER BY Timestamp DESC LIMIT 1")
+            row = cursor.fetchone()
+        except sqlite3.OperationalError as e:
+            # 采集器尚未创建指标表
+            Utils.logger.warning(f"Metric table not available for cluster '{emr_cluster_id}': {e}")
+            return None
+        if row is None:
+            return None
+
+        sample = dict(zip((description[0] for description in cursor.description), row))
+        age_seconds = time.time() - sample.pop('Timestamp')
+        if max_age_seconds is not None and age_seconds > max_age_seconds:
+            Utils.logger.warning(f"Latest local sample of cluster '{emr_cluster_id}' is {age_seconds:.0f} seconds old.")
+            return None
+        metrics = {name: value for name, value in sample.items() if name not in METRIC_COLUMNS and value is not None}
+        # 旧版本采集器只保存三个派生指标
+        if 'totalVirtualCores' not in metrics:
+            return None
+        return metrics
+
+    @Utils.exception_handler
+    def get_yarn_snapshot(self, emr_cluster_id='j-1F74M1P9SC57B', max_age_seconds=None):
+        """
+        创建一次tick使用的YARN集群指标快照。快照在第一次读取时才获取clusterMetrics，
+        之后同一tick内的所有读取都复用同一份数据。
+
+        :param emr_cluster_id: EMR 集群 ID
+        :param max_age_seconds: 传入时优先使用本地表中不超过该年龄的最新样本，没有可用样本时才请求ResourceManager；
+                                为None时始终请求ResourceManager
+        :return: YarnClusterSnapshot 实例
+        """
+        if max_age_seconds is None:
+            return YarnClusterSnapshot(emr_cluster_id, self.fetch_cluster_metrics)
+        return YarnClusterSnapshot(
+            emr_cluster_id, lambda cluster_id: self.fetch_local_cluster_metrics(cluster_id, max_age_seconds))
+
+    @Utils.exception_handler
+    def fetch_local_cluster_metrics(self, emr_cluster_id='j-1F74M1P9SC57B', max_age_seconds=None):
+        """
+        优先从本地表读取clusterMetrics，本地没有足够新的样本时回退到 fetch_cluster_metrics。
+
+        :param emr_cluster_id: EMR 集群 ID
+        :param max_age_seconds: 本地样本的最大年龄(秒)
+        :return: clusterMetrics 字典
+        """
+        with tick_metrics.time(emr_cluster_id, 'metric_read'):
+            metrics = self.get_latest_cluster_metrics(emr_cluster_id, max_age_seconds)
+        if metrics is not None:
+            return metrics
+        Utils.logger.info(f"No recent local cluster metrics for cluster '{emr_cluster_id}', querying the ResourceManager.")
+        return self.fetch_cluster_metrics(emr_cluster_id)
+
+    @Utils.exception_handler
+    def fetch_cluster_metrics(self, emr_cluster_id='j-1F74M1P9SC57B'):
+        """
+        从 YARN ResourceManager 获取完整的 clusterMetrics 文档。
+
+        :param emr_cluster_id: EMR 集群 ID
+        :return: clusterMetrics 字典
+        """
+        with tick_metrics.time(emr_cluster_id, 'rm'):
+            metrics_data = get_yarn_rm_client(emr_cluster_id).get_json('/ws/v1/cluster/metrics')
+        return metrics_data.get('clusterMetrics', {})
+
+    @Utils.exception_handler
+    def get_yarn_metrics(self, emr_cluster_id='j-1F74M1P9SC57B', metrics_name='pendingVirtualCores', snapshot=None):
         """
         从 YARN ResourceManager 获取指定指标的数据。
 
         :param emr_cluster_id: EMR 集群 ID
         :param metrics_name: 需要查询的当前yarn metrics_name ： 目前关注如下：pendingVirtualCores，appsPending，totalVirtualCores
-        :return: 包含 pendingVirtualCores 和 appsPending 指标的字典
+        :param snapshot: 本次tick的YarnClusterSnapshot，传入时直接从快照读取，不再请求ResourceManager
+        :return: 指标值
         """
+        if snapshot is None:
+            snapshot = self.get_yarn_snapshot(emr_cluster_id)
+        return snapshot.get(metrics_name, 0)
+
+
+class YarnClusterSnapshot:
+    """
+    一次tick内的YARN clusterMetrics快照。
+
+    同一个快照只向ResourceManager请求一次，保证同一次决策中的所有指标来自同一时刻。
+    """
 
-        emr_client = AWSEMRClient()
-        yarn_rm_url = emr_client.get_yarn_rm_url(emr_cluster_id)
+    def __init__(self, emr_cluster_id, fetcher):
+        """
+        :param emr_cluster_id: EMR 集群 ID
+        :param fetcher: 获取clusterMetrics的函数，参数为EMR集群ID
+        """
+        self.emr_cluster_id = emr_cluster_id
+        self._fetcher = fetcher
+        self._metrics = None
+        self.fetched_at = None
 
-        # 获取 pendingVirtualCores 指标
-        response = requests.get(f"{yarn_rm_url}/ws/v1/cluster/metrics")
-        response.raise_for_status()
-        metrics = response.json().get('clusterMetrics', {})
-        return metrics.get(metrics_name, 0)
+    @classmethod
+    def from_metrics(cls, emr_cluster_id, metrics):
+        """
+        用已经获取到的clusterMetrics构造快照，不再请求ResourceManager。
 
+        :param emr_cluster_id: EMR 集群 ID
+        :param metrics: clusterMetrics 字典
+        :return: YarnClusterSnapshot 实例
+        """
+        snapshot = cls(emr_cluster_id, None)
+        snapshot._metrics = metrics
+        snapshot.fetched_at = time.time()
+        return snapshot
+
+    @property
+    def metrics(self):
+        """
+        快照中的clusterMetrics字典，首次访问时才请求ResourceManager。
+        """
+        if self._metrics is None:
+            self._metrics = self._fetcher(self.emr_cluster_id)
+            self.fetched_at = time.time()
+            Utils.logger.info(f"YARN cluster metrics snapshot fetched for cluster '{self.emr_cluster_id}'")
+        return self._metrics
+
+    def get(self, metrics_name, default=0):
+        """
+        从快照中读取指定指标。
+
+        :param metrics_name: clusterMetrics中的字段名
+        :param default: 字段不存在时的默认值
+        :return: 指标值
+        """
+        return self.metrics.get(metrics_name, default)
@@ -0,0 +1,155 @@
+from .metrics_store import METRIC_COLUMNS
+
+# 可选参数的默认值(Parameter Store中没有这些参数时使用)
+DEFAULT_FORECAST_LEAD_SECONDS = 300
+DEFAULT_FORECAST_ALPHA = 0.5
+DEFAULT_FORECAST_BETA = 0.2
+DEFAULT_FORECAST_MIN_SAMPLES = 10
+
+
+class HoltForecaster:
+    """
+    带趋势的指数平滑(Holt线性趋势)，支持不等间隔的样本。
+
+    每个样本只做一次常数时间的更新，不保留历史，也不需要重新拟合；
+    趋势以"每秒变化量"保存，因此采样间隔抖动或缺失样本不会放大趋势。
+    """
+
+    def __init__(self, alpha=DEFAULT_FORECAST_ALPHA, beta=DEFAULT_FORECAST_BETA):
+        """
+        :param alpha: 水平的平滑系数(0~1)，越大越贴近最新样本
+        :param beta: 趋势的平滑系数(0~1)，越大对斜率变化越敏感
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.level = None
+        self.trend = 0.0
+        self.last_timestamp = None
+        self.samples = 0
+
+    def update(self, timestamp, value):
+        """
+        用一个新样本更新模型，时间戳不晚于上一个样本的数据会被忽略。
+
+        :param timestamp: 样本时间(Unix时间戳)
+        :param value: 样本值
+        """
+        if value is None or (self.last_timestamp is not None and timestamp <= self.last_timestamp):
+            return
+        if self.level is None:
+            self.level = float(value)
+        else:
+            elapsed = timestamp - self.last_timestamp
+            predicted = self.level + self.trend * elapsed
+            level = self.alpha * value + (1 - self.alpha) * predicted
+            self.trend = self.beta * (level - self.level) / elapsed + (1 - self.beta) * self.trend
+            self.level = level
+        self.last_timestamp = timestamp
+        self.samples += 1
+
+    def forecast(self, horizon_seconds):
+        """
+        预测最后一个样本之后horizon_seconds秒的值。
+
+        :param horizon_seconds: 预测距离(秒)
+        :return: 预测值，没有样本时返回None
+        """
+        if self.level is None:
+            return None
+        return self.level + self.trend * horizon_seconds
+
+
+class DemandForecaster:
+    """
+    对PendingAppNum、YARNMemoryAvailablePercentage和CapacityRemainingGB分别维护一个HoltForecaster，
+    预测在扩容到位所需的时间(lead time)内是否会越过扩容阈值，以便在积压形成之前提前扩容。
+    """
+
+    def __init__(self, alpha=DEFAULT_FORECAST_ALPHA, beta=DEFAULT_FORECAST_BETA, min_samples=DEFAULT_FORECAST_MIN_SAMPLES):
+        """
+        :param alpha: 水平的平滑系数
+        :param beta: 趋势的平滑系数
+        :param min_samples: 模型至少看到多少个样本后才给出预测
+        """
+        self.min_samples = min_samples
+        self.models = {metric_name: HoltForecaster(alpha, beta) for metric_name in METRIC_COLUMNS}
+        self.last_timestamp = None
+
+    def set_smoothing(self, alpha, beta):
+        """
+        更新平滑系数(配置刷新时调用)，已有的水平和趋势保持不变。
+        """
+        for model in self.models.values():
+            model.alpha, model.beta = alpha, beta
+
+    def update(self, timestamp, values):
+        """
+        用一个采样点更新所有指标的模型。
+
+        :param timestamp: 样本时间(Unix时间戳)
+        :param values: {指标名: 值}
+        """
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return
+        for metric_name, model in self.models.items():
+            model.update(timestamp, values.get(metric_name))
+        self.last_timestamp = timestamp
+
+    def observe(self, metric_windows):
+        """
+        把MetricWindows中上次之后的新样本依次送入模型。每个样本只处理一次。
+
+        :param metric_windows: MetricWindows 实例(SQLite或内存环形缓冲区)
+        :return: 本次处理的样本数
+        """
+        timestamps = metric_windows.timestamps
+        start = 0
+        if self.last_timestamp is not None:
+            # 新样本总在末尾，从后往前找到第一个已处理的样本
+            start = len(timestamps)
+            while start > 0 and timestamps[start - 1] > self.last_timestamp:
+                start -= 1
+        columns = metric_windows.columns
+        for i in range(start, len(timestamps)):
+            self.update(timestamps[i], {metric_name: values[i] for metric_name, values in columns.items()})
+        return len(timestamps) - start
+
+    def forecast(self, horizon_seconds):
+        """
+        预测horizon_seconds秒之后各指标的值。
+
+        :param horizon_seconds: 预测距离(秒)
+        :return: {指标名: 预测值}，样本不足时返回None
+        """
+        if any(model.samples < self.min_samples for model in self.models.values()):
+            return None
+        return {metric_name: model.forecast(horizon_seconds) for metric_name, model in self.models.items()}
+
+    def check(self, config, horizon_seconds):
+        """
+        判断预测值是否在lead time内越过扩容阈值(与determine_scale_status的扩容阈值相同)。
+
+        :param config: ScalingConfig 实例
+        :param horizon_seconds: lead time(秒)
+        :return: (是否越过阈值, {指标名: 预测值})，样本不足时为 (False, None)
+        """
+        projected = self.forecast(horizon_seconds)
+        if projected is None:
+            return False, None
+        breached = (projected['PendingAppNum'] >= config.scaleOutAvgPendingAppNumValue
+                    or projected['YARNMemoryAvailablePercentage'] * 100 <= config.scaleOutAvgYARNMemoryAvailablePercentageValue
+                    or projected['CapacityRemainingGB'] <= config.scaleOutAvgCapacityRemainingGBValue)
+        return breached, projected
+
+
+def get_forecast_settings(config):
+    """
+    从可选参数中读取预测设置。
+
+    :param config: ScalingConfig 实例
+    :return: (是否启用, lead time(秒), alpha, beta)
+    """
+    return (int(float(config.get('forecastEnabled', 0))) == 1,
+            float(config.get('forecastLeadSeconds', DEFAULT_FORECAST_LEAD_SECONDS)),
+            float(config.get('forecastAlpha', DEFAULT_FORECAST_ALPHA)),
+            float(config.get('forecastBeta', DEFAULT_FORECAST_BETA)))
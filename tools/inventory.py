@@ -0,0 +1,133 @@
+import threading
+import time
+from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+from .emr import AWSEMRClient
+
+# 仍然占用或即将占用容量的实例状态
+ACTIVE_INSTANCE_STATES = ['AWAITING_FULFILLMENT', 'PROVISIONING', 'BOOTSTRAPPING', 'RUNNING']
+
+
+class EMRInstanceInventory:
+    """
+    EMR集群实例清单缓存。
+
+    分页拉取集群内所有活跃实例，缓存 实例ID -> 实例组/队列、类型、购买方式、状态 的映射，
+    按配置的间隔刷新，每次刷新与上一次的状态做差异比较并记录变化。
+    CPU采集、实例队列修改等所有使用方都从这里读取，而不是各自调用EMR。
+    """
+
+    def __init__(self, cluster_id, emr_client=None, refresh_interval_seconds=60):
+        """
+        :param cluster_id: EMR集群ID
+        :param emr_client: AWSEMRClient实例，默认新建
+        :param refresh_interval_seconds: 清单刷新间隔(秒)
+        """
+        self.cluster_id = cluster_id
+        self.emr_client = emr_client or AWSEMRClient()
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._lock = threading.Lock()
+        self._instances = {}
+        self._collection_types = {}
+        self._instance_fleets = None
+        self._refreshed_at = 0
+        self.last_diff = {'added': [], 'removed': [], 'changed': []}
+
+    @Utils.exception_handler
+    def refresh(self, force=False):
+        """
+        刷新实例清单。未到刷新间隔且非强制刷新时直接返回。
+
+        :param force: 是否忽略刷新间隔
+        :return: 本次刷新的差异 {'added': [...], 'removed': [...], 'changed': [...]}
+        """
+        with self._lock:
+            if not force and self._instances and time.time() - self._refreshed_at < self.refresh_interval_seconds:
+                return None
+
+            instances = {}
+            for instance in self.emr_client.list_all_instances(self.cluster_id, instance_states_list=ACTIVE_INSTANCE_STATES):
+                collection_id = instance.get('InstanceGroupId') or instance.get('InstanceFleetId')
+                instances[instance['Ec2InstanceId']] = {
+                    'CollectionId': collection_id,
+                    'CollectionType': self._get_collection_type(collection_id),
+                    'InstanceType': instance.get('InstanceType'),
+                    'Market': instance.get('Market'),
+                    'State': instance.get('Status', {}).get('State'),
+                }
+
+            previous = self._instances
+            self.last_diff = {
+                'added': [instance_id for instance_id in instances if instance_id not in previous],
+                'removed': [instance_id for instance_id in previous if instance_id not in instances],
+                'changed': [instance_id for instance_id, details in instances.items()
+                            if instance_id in previous and previous[instance_id] != details],
+            }
+            self._instances = instances
+            self._instance_fleets = None
+            self._refreshed_at = time.time()
+
+            Utils.logger.info(
+                f"Instance inventory for cluster '{self.cluster_id}' refreshed: {len(instances)} instances, "
+                f"added {len(self.last_diff['added'])}, removed {len(self.last_diff['removed'])}, changed {len(self.last_diff['changed'])}")
+            return self.last_diff
+
+    def _get_collection_type(self, collection_id):
+        """
+        获取实例组或实例队列的类型(MASTER/CORE/TASK)，遇到未知ID时重新加载映射。
+        """
+        if collection_id not in self._collection_types:
+            self._collection_types = self.emr_client.get_instance_collection_types(self.cluster_id)
+        return self._collection_types.get(collection_id)
+
+    def get_instances(self):
+        """
+        获取实例清单的副本。
+
+        :return: {实例ID: 实例详情}
+        """
+        self.refresh()
+        return dict(self._instances)
+
+    def get_instance_ids(self, instance_group_types_list=None, instance_states_list=None):
+        """
+        按实例组类型和状态筛选实例ID。
+
+        :param instance_group_types_list: 实例组类型列表，例如 ['TASK']，为None时不筛选
+        :param instance_states_list: 实例状态列表，例如 ['RUNNING']，为None时不筛选
+        :return: 实例ID列表
+        """
+        return [
+            instance_id for instance_id, details in self.get_instances().items()
+            if (instance_group_types_list is None or details['CollectionType'] in instance_group_types_list)
+            and (instance_states_list is None or details['State'] in instance_states_list)
+        ]
+
+    def get_instance_fleets(self):
+        """
+        获取集群的实例队列列表，在清单的同一刷新周期内缓存。
+
+        :return: InstanceFleets 列表
+        """
+        self.refresh()
+        if self._instance_fleets is None:
+            self._instance_fleets = self.emr_client.list_instance_fleets(ClusterId=self.cluster_id)['InstanceFleets']
+        return self._instance_fleets
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(cluster_id, **kwargs):
+    """
+    获取指定集群的进程级共享 EMRInstanceInventory，首次调用时按kwargs创建。
+
+    :param cluster_id: EMR集群ID
+    :return: EMRInstanceInventory 实例
+    """
+    with _inventories_lock:
+        inventory = _inventories.get(cluster_id)
+        if inventory is None:
+            inventory = EMRInstanceInventory(cluster_id, **kwargs)
+            _inventories[cluster_id] = inventory
+        return inventory
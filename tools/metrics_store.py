@@ -0,0 +1,731 @@
+import bisect
+import sqlite3
+import threading
+import time
+from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+from .yarn_queues import QUEUE_COLUMNS
+
+# 采集器写入的YARN指标列
+METRIC_COLUMNS = {
+    'PendingAppNum': 'INTEGER',
+    'CapacityRemainingGB': 'REAL',
+    'YARNMemoryAvailablePercentage': 'REAL',
+}
+
+# 采集器同时保存的clusterMetrics原始字段(列名与ResourceManager返回的字段名相同)，
+# 不参与汇总，供决策和回放读取本地的vCore、内存、容器、节点和应用计数。
+# ResourceManager返回的其他数值字段在第一次出现时自动加列。
+CLUSTER_METRIC_COLUMNS = {name: 'INTEGER' for name in (
+    'appsSubmitted', 'appsCompleted', 'appsPending', 'appsRunning', 'appsFailed', 'appsKilled',
+    'reservedMB', 'availableMB', 'allocatedMB', 'pendingMB', 'totalMB',
+    'reservedVirtualCores', 'availableVirtualCores', 'allocatedVirtualCores', 'pendingVirtualCores', 'totalVirtualCores',
+    'containersAllocated', 'containersReserved', 'containersPending',
+    'totalNodes', 'activeNodes', 'lostNodes', 'unhealthyNodes', 'decommissioningNodes', 'decommissionedNodes',
+    'rebootedNodes', 'shutdownNodes',
+)}
+
+# 汇总表的粒度: {表名后缀: 桶宽(秒)}，按从细到粗排列
+ROLLUP_RESOLUTIONS = {
+    '1m': 60,
+    '5m': 300,
+    '1h': 3600,
+}
+
+# 每个汇总表默认的保留天数
+ROLLUP_RETENTION_DAYS = {
+    '1m': 30,
+    '5m': 90,
+    '1h': 365,
+}
+
+# 每个桶为每个指标保存的聚合值
+ROLLUP_AGGREGATES = ('min', 'max', 'sum', 'count', 'last')
+
+
+def connect(db_path, readonly=False, busy_timeout_ms=5000):
+    """
+    打开一个配置好的SQLite连接：WAL日志模式、busy_timeout以及适合指标写入的pragma。
+    读写双方都应通过此函数打开连接，避免 database is locked 错误。
+
+    :param db_path: SQLite文件路径
+    :param readonly: 是否为只读连接
+    :param busy_timeout_ms: 遇到锁时的等待时间(毫秒)
+    :return: sqlite3.Connection
+    """
+    conn = sqlite3.connect(db_path, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        # auto_vacuum 只对新建的数据库生效，需在建表前设置
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL模式下NORMAL只在checkpoint时fsync，提交不再每次落盘
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA wal_autocheckpoint = 1000")
+    return conn
+
+
+def read_series(conn, table_name, metric_name, start_time, end_time, resolution):
+    """
+    从指定粒度读取指标序列，不需要 MetricsStore 实例，回放和回测可以直接使用只读连接。
+
+    原始样本以 (时间戳, 值, 值, 值, 1, 值) 的形式返回，与汇总桶的格式一致。
+    汇总表按桶起点筛选，窗口起点所在的桶会被完整包含。
+
+    :param conn: SQLite连接
+    :param table_name: 指标表名(已经过sanitize处理)
+    :param metric_name: 指标名称，必须是 METRIC_COLUMNS 之一
+    :param start_time: 开始时间(Unix时间戳)
+    :param end_time: 结束时间(Unix时间戳)
+    :param resolution: 汇总表后缀('1m'/'5m'/'1h')，'raw'表示原始样本
+    :return: [(时间戳或桶起点, min, max, sum, count, last), ...]，按时间升序排列
+    """
+    if metric_name not in METRIC_COLUMNS:
+        raise ValueError(f"Unknown metric '{metric_name}'")
+    if resolution == 'raw':
+        rows = conn.execute(
+            f"SELECT Timestamp, {metric_name} FROM {table_name} "
+            f"WHERE Timestamp >= ? AND Timestamp <= ? AND {metric_name} IS NOT NULL ORDER BY Timestamp",
+            (start_time, end_time)).fetchall()
+        return [(timestamp, value, value, value, 1, value) for timestamp, value in rows]
+
+    bucket_start = start_time - start_time % ROLLUP_RESOLUTIONS[resolution]
+    aggregate_columns = ', '.join(f"{metric_name}_{aggregate}" for aggregate in ROLLUP_AGGREGATES)
+    return conn.execute(
+        f"SELECT Bucket, {aggregate_columns} FROM {table_name}_{resolution} "
+        f"WHERE Bucket >= ? AND Bucket <= ? AND {metric_name}_count > 0 ORDER BY Bucket",
+        (bucket_start, end_time)).fetchall()
+
+
+class MetricsStore:
+    """
+    YARN指标的持久化存储。
+
+    整个进程只保持一个WAL模式的连接，样本先进入内存缓冲区，按批量大小或刷新间隔一次性提交；
+    过期数据删除和增量VACUUM在后台线程中按较慢的节奏执行，不再占用每次采样的时间。
+    WAL模式下读者(控制器)可以与写入并发进行。
+
+    每次提交时同一事务内增量更新1分钟、5分钟、1小时三张汇总表(min/max/sum/count/last)，
+    长时间窗口的查询读取汇总表，原始样本只需保留较短时间。
+    每个叶子队列的采样写入 {table_name}_queues 表，Task Node CPU写入 {table_name}_task_cpu 表，
+    实例成员写入 {table_name}_task_nodes 表，都与原始样本共用缓冲区、提交和保留期。
+    """
+
+    def __init__(self, table_name, db_path=None, flush_interval_seconds=60, batch_size=100,
+                 retention_days=30, maintenance_interval_seconds=3600, rollup_retention_days=None):
+        """
+        :param table_name: 指标表名(已经过sanitize处理)
+        :param db_path: SQLite文件路径，默认为 {table_name}.db
+        :param flush_interval_seconds: 缓冲区最长保留时间(秒)，为0时每个样本立即提交
+        :param batch_size: 缓冲区达到该数量时立即提交
+        :param retention_days: 原始样本的保留天数
+        :param maintenance_interval_seconds: 后台清理和VACUUM的执行间隔(秒)
+        :param rollup_retention_days: {汇总表后缀: 保留天数}，默认为 ROLLUP_RETENTION_DAYS
+        """
+        self.table_name = table_name
+        self.db_path = db_path or f"{table_name}.db"
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.maintenance_interval_seconds = maintenance_interval_seconds
+        self.rollup_retention_days = dict(ROLLUP_RETENTION_DAYS, **(rollup_retention_days or {}))
+
+        self._lock = threading.RLock()
+        self._buffer = []
+        self._queue_buffer = []
+        self._task_cpu_buffer = []
+        self._task_node_joins = []
+        self._task_node_leaves = []
+        self._task_high_water_marks = {}
+        self._task_nodes = None
+        self._columns = {}
+        self._last_flush = time.time()
+
+        self._reader = None
+        self._reader_lock = threading.Lock()
+
+        self.conn = connect(self.db_path)
+        self.create_tables()
+
+    @Utils.exception_handler
+    def create_tables(self):
+        """
+        创建指标表和汇总表，如果表不存在。旧版本创建的指标表缺少clusterMetrics列时用ALTER TABLE补齐，
+        汇总表为新建且已有原始样本时，从原始样本回填。
+        """
+        columns = ', '.join(f"{name} {column_type}" for name, column_type in {**METRIC_COLUMNS, **CLUSTER_METRIC_COLUMNS}.items())
+        rollup_columns = ', '.join(
+            f"{name}_{aggregate} {'INTEGER' if aggregate == 'count' else 'REAL'}"
+            for name in METRIC_COLUMNS for aggregate in ROLLUP_AGGREGATES)
+        with self._lock:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} (Timestamp INTEGER PRIMARY KEY, {columns})")
+            self._columns = {row[1]: row[2] for row in self.conn.execute(f"PRAGMA table_info({self.table_name})")}
+            self._columns.pop('Timestamp', None)
+            self._add_columns(CLUSTER_METRIC_COLUMNS)
+            queue_columns = ', '.join(f"{name} {column_type}" for name, column_type in QUEUE_COLUMNS.items())
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.get_queue_table_name()} "
+                f"(Timestamp INTEGER, QueueName TEXT, {queue_columns}, PRIMARY KEY (QueueName, Timestamp))")
+            self.conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.get_queue_table_name()}_ts ON {self.get_queue_table_name()} (Timestamp)")
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.get_task_cpu_table_name()} "
+                f"(Timestamp INTEGER, InstanceId TEXT, CPUUtilization REAL, PRIMARY KEY (InstanceId, Timestamp))")
+            self.conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.get_task_cpu_table_name()}_ts ON {self.get_task_cpu_table_name()} (Timestamp)")
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.get_task_nodes_table_name()} "
+                f"(InstanceId TEXT PRIMARY KEY, JoinTime INTEGER, LeaveTime INTEGER, HighWaterMark INTEGER)")
+            missing_rollups = [
+                suffix for suffix in ROLLUP_RESOLUTIONS
+                if self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                     (self.get_rollup_table_name(suffix),)).fetchone() is None]
+            for suffix in ROLLUP_RESOLUTIONS:
+                self.conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.get_rollup_table_name(suffix)} "
+                    f"(Bucket INTEGER PRIMARY KEY, LastTimestamp INTEGER, {rollup_columns})")
+            self.conn.commit()
+            if missing_rollups:
+                self._backfill_rollups(missing_rollups)
+        Utils.logger.info(f"Table '{self.table_name}' created successfully.")
+
+    def _add_columns(self, columns):
+        """
+        为指标表添加尚不存在的列(不提交事务)。只接受由字母、数字和下划线组成的列名。
+
+        :param columns: {列名: 类型}
+        """
+        added = []
+        for name, column_type in columns.items():
+            if name in self._columns or not name.replace('_', '').isalnum():
+                continue
+            self.conn.execute(f"ALTER TABLE {self.table_name} ADD COLUMN {name} {column_type}")
+            self._columns[name] = column_type
+            added.append(name)
+        if added:
+            Utils.logger.info(f"Added columns {added} to SQLite table '{self.table_name}'.")
+
+    def get_queue_table_name(self):
+        """
+        获取队列指标表名。
+        """
+        return f"{self.table_name}_queues"
+
+    def get_task_cpu_table_name(self):
+        """
+        获取Task Node CPU指标表名。
+        """
+        return f"{self.table_name}_task_cpu"
+
+    def get_task_nodes_table_name(self):
+        """
+        获取Task Node实例成员表名。
+        """
+        return f"{self.table_name}_task_nodes"
+
+    def get_rollup_table_name(self, suffix):
+        """
+        获取指定粒度的汇总表名。
+
+        :param suffix: 汇总表后缀，例如 '5m'
+        :return: 表名
+        """
+        return f"{self.table_name}_{suffix}"
+
+    def _backfill_rollups(self, suffixes, chunk_size=10000):
+        """
+        从原始样本分块回填新建的汇总表，用于已有历史数据的旧数据库升级。
+        """
+        columns = list(METRIC_COLUMNS)
+        cursor = self.conn.execute(
+            f"SELECT Timestamp, {', '.join(columns)} FROM {self.table_name} ORDER BY Timestamp")
+        backfilled = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            samples = [(row[0], dict(zip(columns, row[1:]))) for row in rows]
+            self._update_rollups(samples, suffixes)
+            backfilled += len(rows)
+        self.conn.commit()
+        if backfilled:
+            Utils.logger.info(
+                f"Backfilled rollup tables {suffixes} of '{self.table_name}' from {backfilled} raw samples.")
+
+    def _existing_timestamps(self, timestamps, chunk_size=500):
+        """
+        返回原始表中已经存在的时间戳。
+
+        :param timestamps: 时间戳列表
+        :return: 已存在的时间戳集合
+        """
+        existing = set()
+        for i in range(0, len(timestamps), chunk_size):
+            chunk = timestamps[i:i + chunk_size]
+            existing.update(row[0] for row in self.conn.execute(
+                f"SELECT Timestamp FROM {self.table_name} WHERE Timestamp IN ({', '.join('?' for _ in chunk)})", chunk))
+        return existing
+
+    def _rebuild_rollup_buckets(self, timestamps):
+        """
+        从原始样本重新计算包含指定时间戳的汇总桶(不提交事务)，用于原始样本被替换的情况。
+        """
+        columns = list(METRIC_COLUMNS)
+        for suffix, resolution in ROLLUP_RESOLUTIONS.items():
+            for bucket in sorted({int(timestamp) - int(timestamp) % resolution for timestamp in timestamps}):
+                self.conn.execute(f"DELETE FROM {self.get_rollup_table_name(suffix)} WHERE Bucket = ?", (bucket,))
+                rows = self.conn.execute(
+                    f"SELECT Timestamp, {', '.join(columns)} FROM {self.table_name} WHERE Timestamp >= ? AND Timestamp < ?",
+                    (bucket, bucket + resolution)).fetchall()
+                self._update_rollups([(row[0], dict(zip(columns, row[1:]))) for row in rows], [suffix])
+
+    def _update_rollups(self, samples, suffixes=None):
+        """
+        把一批样本合并到汇总表中(不提交事务)。
+
+        先在内存中按桶聚合，再对每个桶执行一次UPSERT：min/max取较值，sum/count累加，
+        last取时间戳较新的一方，因此乱序或分多次到达的样本也能得到正确结果。
+
+        :param samples: [(timestamp, {列名: 值}), ...]
+        :param suffixes: 需要更新的汇总表后缀列表，默认为全部
+        """
+        columns = list(METRIC_COLUMNS)
+        aggregate_columns = [f"{name}_{aggregate}" for name in columns for aggregate in ROLLUP_AGGREGATES]
+        updates = []
+        for name in columns:
+            updates += [
+                f"{name}_min = COALESCE(MIN({name}_min, excluded.{name}_min), {name}_min, excluded.{name}_min)",
+                f"{name}_max = COALESCE(MAX({name}_max, excluded.{name}_max), {name}_max, excluded.{name}_max)",
+                f"{name}_sum = COALESCE({name}_sum, 0) + COALESCE(excluded.{name}_sum, 0)",
+                f"{name}_count = COALESCE({name}_count, 0) + COALESCE(excluded.{name}_count, 0)",
+                f"{name}_last = CASE WHEN excluded.LastTimestamp >= LastTimestamp AND excluded.{name}_last IS NOT NULL "
+                f"THEN excluded.{name}_last ELSE {name}_last END",
+            ]
+        updates.append("LastTimestamp = MAX(LastTimestamp, excluded.LastTimestamp)")
+        placeholders = ', '.join('?' for _ in range(len(aggregate_columns) + 2))
+
+        for suffix in suffixes or ROLLUP_RESOLUTIONS:
+            resolution = ROLLUP_RESOLUTIONS[suffix]
+            buckets = {}
+            for timestamp, values in sorted(samples, key=lambda sample: sample[0]):
+                bucket = int(timestamp) - int(timestamp) % resolution
+                aggregates = buckets.get(bucket)
+                if aggregates is None:
+                    aggregates = buckets[bucket] = {name: [None, None, 0.0, 0, None] for name in columns}
+                    aggregates['LastTimestamp'] = int(timestamp)
+                aggregates['LastTimestamp'] = max(aggregates['LastTimestamp'], int(timestamp))
+                for name in columns:
+                    value = values.get(name)
+                    if value is None:
+                        continue
+                    current = aggregates[name]
+                    current[0] = value if current[0] is None else min(current[0], value)
+                    current[1] = value if current[1] is None else max(current[1], value)
+                    current[2] += value
+                    current[3] += 1
+                    current[4] = value
+
+            self.conn.executemany(
+                f"INSERT INTO {self.get_rollup_table_name(suffix)} (Bucket, LastTimestamp, {', '.join(aggregate_columns)}) "
+                f"VALUES ({placeholders}) ON CONFLICT(Bucket) DO UPDATE SET {', '.join(updates)}",
+                [(bucket, aggregates['LastTimestamp'], *(value for name in columns for value in aggregates[name]))
+                 for bucket, aggregates in buckets.items()])
+
+    @Utils.exception_handler
+    def append(self, timestamp, values):
+        """
+        写入一个样本到缓冲区，达到批量大小或刷新间隔时提交。
+
+        :param timestamp: 样本的Unix时间戳
+        :param values: {列名: 值}，可以包含METRIC_COLUMNS之外的clusterMetrics字段
+        """
+        with self._lock:
+            self._buffer.append((timestamp, values))
+            self.flush_if_due()
+
+    @Utils.exception_handler
+    def append_queues(self, timestamp, queues):
+        """
+        写入一次队列采样到缓冲区，与集群样本按相同的批量规则提交。
+
+        :param timestamp: 样本的Unix时间戳
+        :param queues: {队列名: {列名: 值}}
+        """
+        with self._lock:
+            self._queue_buffer.extend((timestamp, queue_name, values) for queue_name, values in queues.items())
+            self.flush_if_due()
+
+    @Utils.exception_handler
+    def update_task_node_membership(self, running_ids, now):
+        """
+        根据当前RUNNING的Task Node更新实例成员：记录新加入实例的JoinTime和已离开实例的LeaveTime。
+
+        在役实例及其HighWaterMark在首次调用时从表中加载，之后在内存中维护，变更随下一次提交写入。
+
+        :param running_ids: 当前RUNNING的实例ID列表
+        :param now: 当前Unix时间戳
+        :return: ({实例ID: HighWaterMark}, 新加入的实例ID集合, 已离开的实例ID集合)，新实例的HighWaterMark为None
+        """
+        with self._lock:
+            if self._task_nodes is None:
+                self._task_nodes = dict(self.conn.execute(
+                    f"SELECT InstanceId, HighWaterMark FROM {self.get_task_nodes_table_name()} WHERE LeaveTime IS NULL"))
+            running = set(running_ids)
+            joined = running - set(self._task_nodes)
+            left = set(self._task_nodes) - running
+            for instance_id in joined:
+                self._task_nodes[instance_id] = None
+                self._task_node_joins.append((instance_id, now))
+            for instance_id in left:
+                del self._task_nodes[instance_id]
+                self._task_node_leaves.append((now, instance_id))
+            return {instance_id: self._task_nodes[instance_id] for instance_id in running}, joined, left
+
+    @Utils.exception_handler
+    def append_task_cpu(self, rows, high_water_marks):
+        """
+        写入一批Task Node CPU数据点到缓冲区，与集群样本按相同的批量规则提交。
+
+        :param rows: [(时间戳, 实例ID, CPU利用率), ...]
+        :param high_water_marks: {实例ID: 已写入的最新时间戳}
+        """
+        with self._lock:
+            self._task_cpu_buffer.extend(rows)
+            for instance_id, timestamp in high_water_marks.items():
+                if self._task_nodes is not None and instance_id in self._task_nodes:
+                    self._task_nodes[instance_id] = timestamp
+                self._task_high_water_marks[instance_id] = timestamp
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """
+        任一缓冲区达到批量大小或距上次提交超过刷新间隔时提交。
+        """
+        with self._lock:
+            if (max(len(self._buffer), len(self._queue_buffer), len(self._task_cpu_buffer)) >= self.batch_size
+                    or time.time() - self._last_flush >= self.flush_interval_seconds):
+                self.flush()
+
+    @Utils.exception_handler
+    def flush(self):
+        """
+        将缓冲区中的样本在一个事务中批量提交。
+        """
+        with self._lock:
+            try:
+                self._flush_buffers()
+            except Exception:
+                # 回滚本次未提交的写入，缓冲区中的样本保留到下一次重试
+                self.conn.rollback()
+                raise
+            self._last_flush = time.time()
+
+    def _flush_buffers(self):
+        """
+        依次写入各缓冲区，每个缓冲区提交成功后才清空(调用方持有锁)。
+        """
+        if self._buffer:
+            # 同一时间戳写入多次时(重试的tick或重放的批次)只保留最后一次，与INSERT OR REPLACE一致
+            samples = list({int(timestamp): (timestamp, values) for timestamp, values in self._buffer}.values())
+            # 本批样本中出现的新字段先加列，只写入本批实际包含的列
+            names = dict.fromkeys(name for _, values in samples for name in values)
+            self._add_columns({name: 'REAL' if any(isinstance(values.get(name), float) for _, values in samples)
+                               else 'INTEGER' for name in names if name not in self._columns})
+            columns = [name for name in names if name in self._columns]
+            placeholders = ', '.join('?' for _ in range(len(columns) + 1))
+            replaced = self._existing_timestamps([timestamp for timestamp, _ in samples])
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table_name} (Timestamp, {', '.join(columns)}) VALUES ({placeholders})",
+                [(timestamp, *(values.get(name) for name in columns)) for timestamp, values in samples])
+            # 汇总表与原始样本在同一事务中提交：新样本增量合并，被替换的样本所在的桶从原始样本重建
+            self._update_rollups([sample for sample in samples if int(sample[0]) not in replaced])
+            if replaced:
+                self._rebuild_rollup_buckets(replaced)
+            self.conn.commit()
+            Utils.logger.debug(f"Flushed {len(self._buffer)} samples to SQLite table '{self.table_name}'.")
+            self._buffer = []
+        if self._queue_buffer:
+            columns = list(QUEUE_COLUMNS)
+            placeholders = ', '.join('?' for _ in range(len(columns) + 2))
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.get_queue_table_name()} (Timestamp, QueueName, {', '.join(columns)}) "
+                f"VALUES ({placeholders})",
+                [(timestamp, queue_name, *(values.get(name) for name in columns))
+                 for timestamp, queue_name, values in self._queue_buffer])
+            self.conn.commit()
+            Utils.logger.debug(f"Flushed {len(self._queue_buffer)} queue samples to SQLite table '{self.get_queue_table_name()}'.")
+            self._queue_buffer = []
+        if self._task_node_joins or self._task_node_leaves or self._task_cpu_buffer or self._task_high_water_marks:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.get_task_nodes_table_name()} (InstanceId, JoinTime, LeaveTime, HighWaterMark) "
+                f"VALUES (?, ?, NULL, NULL)", self._task_node_joins)
+            self.conn.executemany(
+                f"UPDATE {self.get_task_nodes_table_name()} SET LeaveTime = ? WHERE InstanceId = ?", self._task_node_leaves)
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO {self.get_task_cpu_table_name()} (Timestamp, InstanceId, CPUUtilization) "
+                f"VALUES (?, ?, ?)", self._task_cpu_buffer)
+            self.conn.executemany(
+                f"UPDATE {self.get_task_nodes_table_name()} SET HighWaterMark = ? WHERE InstanceId = ?",
+                [(timestamp, instance_id) for instance_id, timestamp in self._task_high_water_marks.items()])
+            self.conn.commit()
+            Utils.logger.debug(
+                f"Flushed {len(self._task_cpu_buffer)} task node CPU datapoints to SQLite table '{self.get_task_cpu_table_name()}'.")
+            self._task_node_joins, self._task_node_leaves, self._task_cpu_buffer = [], [], []
+            self._task_high_water_marks = {}
+
+    @Utils.exception_handler
+    def run_maintenance(self):
+        """
+        删除超过保留期的原始样本和汇总数据，并执行增量VACUUM和WAL checkpoint。
+        """
+        now = int(time.time())
+        cutoff = now - self.retention_days * 24 * 60 * 60
+        with self._lock:
+            self.flush()
+            deleted = self.conn.execute(f"DELETE FROM {self.table_name} WHERE Timestamp < ?", (cutoff,)).rowcount
+            self.conn.execute(f"DELETE FROM {self.get_queue_table_name()} WHERE Timestamp < ?", (cutoff,))
+            self.conn.execute(f"DELETE FROM {self.get_task_cpu_table_name()} WHERE Timestamp < ?", (cutoff,))
+            self.conn.execute(f"DELETE FROM {self.get_task_nodes_table_name()} WHERE LeaveTime < ?", (cutoff,))
+            for suffix, retention_days in self.rollup_retention_days.items():
+                self.conn.execute(f"DELETE FROM {self.get_rollup_table_name(suffix)} WHERE Bucket < ?",
+                                  (now - retention_days * 24 * 60 * 60,))
+            self.conn.commit()
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        Utils.logger.info(
+            f"Deleted {deleted} records older than {self.retention_days} days from SQLite table '{self.table_name}'.")
+
+    def select_resolution(self, start_time, end_time=None, min_buckets=60):
+        """
+        选择能覆盖请求窗口的最粗粒度。
+
+        粒度需满足: 窗口内至少有min_buckets个桶，且窗口起点仍在该粒度的保留期内；
+        没有满足条件的汇总表时返回None，表示读取原始样本。
+
+        :param start_time: 窗口开始时间(Unix时间戳)
+        :param end_time: 窗口结束时间，默认为当前时间
+        :param min_buckets: 窗口内最少的桶数
+        :return: 汇总表后缀或None
+        """
+        now = int(time.time())
+        end_time = now if end_time is None else end_time
+        selected = None
+        for suffix, resolution in ROLLUP_RESOLUTIONS.items():
+            retention_start = now - self.rollup_retention_days[suffix] * 24 * 60 * 60
+            if end_time - start_time >= resolution * min_buckets and start_time >= retention_start:
+                selected = suffix
+        if selected is None and start_time < now - self.retention_days * 24 * 60 * 60:
+            # 原始样本已被清理，退回到仍保留该时间段的最细汇总表
+            selected = next((suffix for suffix in ROLLUP_RESOLUTIONS
+                             if start_time >= now - self.rollup_retention_days[suffix] * 24 * 60 * 60),
+                            list(ROLLUP_RESOLUTIONS)[-1])
+        return selected
+
+    def _get_reader(self):
+        if self._reader is None:
+            self._reader = connect(self.db_path, readonly=True)
+        return self._reader
+
+    @Utils.exception_handler
+    def query_series(self, metric_name, start_time, end_time=None, resolution=None, min_buckets=60):
+        """
+        查询指定指标在时间范围内的序列，自动路由到能覆盖窗口的最粗粒度。
+
+        原始样本以 (时间戳, 值, 值, 值, 1, 值) 的形式返回，与汇总桶的格式一致。
+        汇总表按桶起点筛选，窗口起点所在的桶会被完整包含。
+
+        :param metric_name: 指标名称
+        :param start_time: 开始时间(Unix时间戳)
+        :param end_time: 结束时间，默认为当前时间
+        :param resolution: 指定汇总表后缀('1m'/'5m'/'1h')，'raw'表示原始样本，默认自动选择
+        :param min_buckets: 自动选择时窗口内最少的桶数
+        :return: (粒度, [(桶起点, min, max, sum, count, last), ...])
+        """
+        end_time = int(time.time()) if end_time is None else end_time
+        if resolution is None:
+            resolution = self.select_resolution(start_time, end_time, min_buckets) or 'raw'
+
+        with self._reader_lock:
+            return resolution, read_series(self._get_reader(), self.table_name, metric_name, start_time, end_time, resolution)
+
+    def query_aggregate(self, metric_name, start_time, end_time=None, resolution=None, min_buckets=60):
+        """
+        查询指定指标在时间范围内的整体统计值。
+
+        :param metric_name: 指标名称
+        :param start_time: 开始时间(Unix时间戳)
+        :param end_time: 结束时间，默认为当前时间
+        :param resolution: 同 query_series
+        :param min_buckets: 同 query_series
+        :return: {'resolution', 'min', 'max', 'sum', 'count', 'avg', 'last'}，没有数据时统计值为None
+        """
+        resolution, rows = self.query_series(metric_name, start_time, end_time, resolution, min_buckets)
+        count = sum(row[4] for row in rows)
+        total = sum(row[3] for row in rows)
+        return {
+            'resolution': resolution,
+            'min': min((row[1] for row in rows), default=None),
+            'max': max((row[2] for row in rows), default=None),
+            'sum': total,
+            'count': count,
+            'avg': total / count if count else None,
+            'last': rows[-1][5] if rows else None,
+        }
+
+    def start_maintenance(self):
+        """
+        把本存储注册到进程级共享的维护线程，所有存储共用一个线程按各自的间隔执行维护。
+        """
+        _maintenance_worker.register(self)
+
+    def close(self):
+        """
+        停止后台维护，提交缓冲区并关闭连接。
+        """
+        _maintenance_worker.unregister(self)
+        with self._lock:
+            self.flush()
+            self.conn.close()
+        with self._reader_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+
+class MetricWindows:
+    """
+    一次读取得到的多指标时间序列，回答所有(指标, 时间窗口)的查询和数据完整性检查。
+
+    扩缩容判断使用的各个时间窗口都以同一时刻为终点，较小的窗口是最大窗口的后缀，
+    因此只需对最大窗口做一次扫描，其余窗口通过二分查找切片得到。
+    """
+
+    # 窗口内实际数据点少于期望值的该比例时视为数据不足
+    completeness_ratio = 0.7
+
+    def __init__(self, timestamps, columns, end_time, monitor_interval_seconds):
+        """
+        :param timestamps: 按升序排列的时间戳列表
+        :param columns: {指标名: 与timestamps对齐的值列表}，缺失的值为None
+        :param end_time: 所有窗口的结束时间(Unix时间戳)
+        :param monitor_interval_seconds: 采样间隔(秒)，用于计算期望的数据点数
+        """
+        self.timestamps = timestamps
+        self.columns = columns
+        self.end_time = end_time
+        self.monitor_interval_seconds = monitor_interval_seconds
+
+    def get(self, metric_name, window_minutes):
+        """
+        获取指定指标在最近window_minutes分钟内的数据，数据不足时返回空列表。
+        缺失的值(None)不计入数据点数，也不包含在返回的数据中。
+
+        :param metric_name: 指标名称
+        :param window_minutes: 时间窗口(分钟)
+        :return: 指标数据列表
+        """
+        start_time = self.end_time - int(window_minutes * 60)
+        start_index = bisect.bisect_left(self.timestamps, start_time)
+        records = [value for value in self.columns[metric_name][start_index:] if value is not None]
+
+        # 计算在时间范围内应该有多少个数据点
+        expected_data_points = int(window_minutes * 60) // self.monitor_interval_seconds
+
+        # 检查数据是否足够
+        if len(records) < expected_data_points * self.completeness_ratio:
+            Utils.logger.warning(
+                f"Not enough data in the specified time range ({window_minutes} minutes) for metric '{metric_name}'. Expected {expected_data_points} data points, but only got {len(records)}.")
+            return []
+        return records
+
+    def get_window(self, metric_name, scale_status, config):
+        """
+        按配置中的时间窗口获取指定指标在扩容或缩容判断中使用的数据。
+
+        :param metric_name: 指标名称
+        :param scale_status: 'scaleOut' 或 'scaleIn'
+        :param config: ScalingConfig 实例
+        :return: 指标数据列表
+        """
+        return self.get(metric_name, config.get_metric_window_minutes(metric_name, scale_status))
+
+
+class _MaintenanceWorker:
+    """
+    所有 MetricsStore 共用的后台维护线程。
+
+    多集群运行时每个集群一个存储，共用一个线程避免线程数随集群数线性增长；
+    各存储的维护时间按注册顺序错开，不会同时执行VACUUM。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_run = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def register(self, store):
+        with self._lock:
+            if store in self._next_run:
+                return
+            # 第一次维护立即执行，之后按注册顺序错开
+            self._next_run[store] = time.time() + len(self._next_run) * 60
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics-store-maintenance", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def unregister(self, store):
+        with self._lock:
+            self._next_run.pop(store, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                stores = list(self._next_run)
+                due = [store for store, next_run in self._next_run.items() if next_run <= now]
+            for store in stores:
+                try:
+                    # 采样停止或间隔较长时，缓冲区中的样本也不会超过刷新间隔太久未提交
+                    store.flush_if_due()
+                except Exception:
+                    # 失败时缓冲区保留，下一个周期重试
+                    Utils.logger.exception(f"Flushing buffered samples of '{store.table_name}' failed, will retry.")
+            for store in due:
+                try:
+                    store.run_maintenance()
+                except Exception:
+                    # 错误已由exception_handler记录，下一个周期重试
+                    pass
+                with self._lock:
+                    if store in self._next_run:
+                        self._next_run[store] = time.time() + store.maintenance_interval_seconds
+            with self._lock:
+                timeout = min(self._next_run.values(), default=time.time() + 60) - time.time()
+            self._wakeup.wait(max(1, min(timeout, 60)))
+            self._wakeup.clear()
+
+
+_maintenance_worker = _MaintenanceWorker()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_metrics_store(table_name, **kwargs):
+    """
+    获取指定表的进程级共享 MetricsStore，首次调用时按kwargs创建并启动后台维护。
+
+    :param table_name: 指标表名(已经过sanitize处理)
+    :return: MetricsStore 实例
+    """
+    with _stores_lock:
+        store = _stores.get(table_name)
+        if store is None:
+            store = MetricsStore(table_name, **kwargs)
+            store.start_maintenance()
+            _stores[table_name] = store
+        return store
@@ -0,0 +1,144 @@
+import bisect
+import math
+import queue
+import threading
+import time
+from array import array
+from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+from .metrics_store import METRIC_COLUMNS, MetricWindows
+
+
+class RingBufferMetrics:
+    """
+    基于定长数组的多指标环形缓冲区。
+
+    采集器把每个样本写入缓冲区，决策引擎直接从内存中读取时间窗口，
+    不再经过SQLite。时间戳和每个指标各占一个array，共享同一个写入位置。
+    样本中缺失的指标保存为NaN，读取时还原为None，与SQLite中的NULL一致，不会被当作0计入窗口。
+    """
+
+    def __init__(self, capacity, columns=None):
+        """
+        :param capacity: 最多保留的样本数
+        :param columns: 指标名称列表，默认为采集器写入的全部指标
+        """
+        self.capacity = capacity
+        self.columns = list(columns or METRIC_COLUMNS)
+        self._timestamps = array('q', [0] * capacity)
+        self._values = {name: array('d', [0.0] * capacity) for name in self.columns}
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, values):
+        """
+        写入一个样本，缓冲区满时覆盖最旧的样本。
+
+        :param timestamp: 样本的Unix时间戳
+        :param values: {指标名: 值}，缺失或为None的指标记为NaN
+        """
+        with self._lock:
+            index = self._next
+            self._timestamps[index] = int(timestamp)
+            for name in self.columns:
+                value = values.get(name)
+                self._values[name][index] = math.nan if value is None else float(value)
+            self._next = (index + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def _ordered_indexes(self):
+        start = (self._next - self._size) % self.capacity
+        return [(start + i) % self.capacity for i in range(self._size)]
+
+    def get_metric_windows(self, emr_cluster_id, config, max_window_minutes=None, end_time=None):
+        """
+        以与 EMRMetricManager.get_metric_windows 相同的接口，从内存中返回 MetricWindows。
+
+        :param emr_cluster_id: EMR集群ID(仅为保持接口一致)
+        :param config: ScalingConfig 实例
+        :param max_window_minutes: 需要读取的最大窗口(分钟)，默认取配置中所有指标窗口的最大值
+        :param end_time: 窗口结束时间，默认为当前时间
+        :return: MetricWindows 实例
+        """
+        if max_window_minutes is None:
+            max_window_minutes = max(
+                config.get_metric_window_minutes(metric_name, scale_status)
+                for metric_name in self.columns for scale_status in ('scaleOut', 'scaleIn'))
+
+        with self._lock:
+            indexes = self._ordered_indexes()
+            timestamps = [self._timestamps[i] for i in indexes]
+            if end_time is None:
+                end_time = int(time.time())
+            start_index = bisect.bisect_left(timestamps, end_time - int(max_window_minutes * 60))
+            end_index = bisect.bisect_right(timestamps, end_time)
+            indexes = indexes[start_index:end_index]
+            columns = {name: [None if math.isnan(self._values[name][i]) else self._values[name][i] for i in indexes]
+                       for name in self.columns}
+            timestamps = timestamps[start_index:end_index]
+
+        return MetricWindows(timestamps, columns, end_time, config.monitorIntervalSeconds)
+
+    def load(self, metric_windows):
+        """
+        用已有的历史数据(例如启动时从SQLite读取的MetricWindows)预热缓冲区。
+
+        :param metric_windows: MetricWindows 实例
+        """
+        for i, timestamp in enumerate(metric_windows.timestamps):
+            self.append(timestamp, {name: metric_windows.columns[name][i] for name in self.columns})
+        Utils.logger.info(f"Ring buffer warmed up with {len(metric_windows.timestamps)} samples.")
+
+
+class AsyncPersistenceSink:
+    """
+    异步持久化：样本进入队列后由后台线程写入 MetricsStore，采集和决策路径不再等待磁盘IO。
+    多集群运行时所有集群共用一个队列和一个写入线程，每个样本携带自己的目标存储。
+    """
+
+    def __init__(self, store=None, max_queue_size=10000):
+        """
+        :param store: 默认的 MetricsStore 实例，put时未指定存储则写入该存储
+        :param max_queue_size: 队列最大长度，队列满时丢弃新样本
+        """
+        self.store = store
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        name = f"persistence-{store.table_name}" if store is not None else "persistence"
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, timestamp, values, store=None):
+        """
+        提交一个样本，不阻塞调用方。
+
+        :param timestamp: 样本的Unix时间戳
+        :param values: {指标名: 值}
+        :param store: 目标 MetricsStore，默认为构造时传入的存储
+        """
+        store = store or self.store
+        try:
+            self._queue.put_nowait((store, timestamp, values))
+        except queue.Full:
+            Utils.logger.warning(f"Persistence queue for '{store.table_name}' is full, dropping sample at {timestamp}.")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            store, timestamp, values = item
+            try:
+                store.append(timestamp, values)
+            except Exception:
+                # 错误已由exception_handler记录，内存中的数据不受影响
+                pass
+
+    def close(self):
+        """
+        写完队列中剩余的样本后停止后台线程。
+        """
+        self._queue.put(None)
+        self._thread.join()
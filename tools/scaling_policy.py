@@ -0,0 +1,275 @@
+import math
+
+# 扩缩容判断和新容量计算的纯函数，不做任何IO。
+# 控制器(同步和异步)与回放模拟器共用这些函数，保证线上和回放的逻辑一致。
+
+# 按需求计算扩容目标时使用的clusterMetrics字段
+DEMAND_SIZING_FIELDS = ('allocatedVirtualCores', 'pendingVirtualCores', 'reservedVirtualCores',
+                        'allocatedMB', 'pendingMB', 'reservedMB', 'totalVirtualCores', 'totalMB')
+
+# 可选参数的默认值(Parameter Store中没有这些参数时使用)
+DEFAULT_SCALE_OUT_SIZING_MODE = 'factor'
+DEFAULT_DEMAND_HEADROOM = 0.2
+DEFAULT_UNIT_VIRTUAL_CORES = 1
+
+
+# 判断使用的指标，每个指标在扩容和缩容窗口内各有一个平均值
+DECISION_METRICS = ('YARNMemoryAvailablePercentage', 'CapacityRemainingGB', 'PendingAppNum', 'TaskNodeCPULoad')
+
+# 每个指标在扩容、缩容窗口内的平均值，任一数据不足时不执行扩缩容
+DECISION_METRIC_INPUTS = tuple(
+    f"{scale_status}.{metric_name}" for scale_status in ('scaleOut', 'scaleIn') for metric_name in DECISION_METRICS)
+
+# 判断树的全部输入: 需求预测和队列阈值两个标志，以及全部指标平均值
+DECISION_INPUTS = ('forecastBreach', 'queueBreach') + DECISION_METRIC_INPUTS
+
+
+class LazyInputs:
+    """
+    判断树的输入，每个输入只在第一次被用到时才获取，并在本次判断内缓存。
+    """
+
+    def __init__(self, loaders):
+        """
+        :param loaders: {输入名: 无参数的获取函数}，输入名见 DECISION_INPUTS；
+                        平均值的获取函数在数据不足时返回None
+        """
+        self._loaders = loaders
+        self.values = {}
+
+    def __call__(self, name):
+        if name not in self.values:
+            self.values[name] = self._loaders[name]()
+        return self.values[name]
+
+
+class _InsufficientData(Exception):
+    pass
+
+
+def decide_scale_status(config, current_max_unit_num, get_input):
+    """
+    以短路求值的判断树决定是否扩缩容：只有在结果仍可能改变时才获取下一个输入。
+
+    扩容条件为 (((内存 或 等待应用) 且 CPU) 或 预测越界 或 队列越界) 且 当前Unit < maximumUnits，
+    缩容条件为 (内存 或 等待应用 或 CPU) 且 当前Unit > minimumUnits 且 没有预测越界和队列越界，
+    与逐项计算全部条件的结果相同。每一步都先检查不需要IO的条件和SQLite中的指标，
+    Task Node CPU(可能回退到CloudWatch)放在最后，例如当前Unit已达到maximumUnits时不会获取任何扩容指标，
+    内存和等待应用都不满足扩容条件时不会获取扩容窗口的CPU。
+
+    与逐项计算相同，8个指标平均值中任一数据不足时都不扩缩容：结果为无操作时缺少的输入不会改变结果，
+    因此只获取判断需要的输入；结果为扩容或缩容时，执行前会补齐其余的指标平均值，任一数据不足则返回0。
+    只有需要扩缩容的tick才获取全部指标。
+
+    :param config: ScalingConfig 实例(或具有相同属性的对象)
+    :param current_max_unit_num: 当前Managed Scaling策略的MaximumCapacityUnits
+    :param get_input: 按输入名(见 DECISION_INPUTS)返回输入值的函数，例如 LazyInputs；
+                      平均值中YARNMemoryAvailablePercentage为0~1的比例，数据不足时为None
+    :return: (scaleStatus, 按求值顺序排列的 {条件名: 结果}, 未获取的输入名列表)，
+             scaleStatus 1: scaleOut, -1: scaleIn, 0: 无操作；
+             需要的输入数据不足时scaleStatus为0，条件中的 insufficientData 为该输入名
+    """
+    conditions = {}
+    requested = set()
+
+    def value(name):
+        requested.add(name)
+        result = get_input(name)
+        if result is None:
+            raise _InsufficientData(name)
+        return result
+
+    try:
+        scale_out = _evaluate_scale_out(config, current_max_unit_num, value, conditions)
+        scale_in = _evaluate_scale_in(config, current_max_unit_num, value, conditions)
+        if scale_out != scale_in:
+            # 执行扩缩容前确认所有指标都有足够的数据
+            for name in DECISION_METRIC_INPUTS:
+                if name not in requested:
+                    value(name)
+    except _InsufficientData as e:
+        conditions['insufficientData'] = e.args[0]
+        return 0, conditions, [name for name in DECISION_INPUTS if name not in requested]
+
+    skipped = [name for name in DECISION_INPUTS if name not in requested]
+    if scale_out and not scale_in:
+        return 1, conditions, skipped  # 执行scaleOut
+    elif not scale_out and scale_in:
+        return -1, conditions, skipped  # 执行scaleIn
+    return 0, conditions, skipped  # 无操作
+
+
+def _evaluate_scale_out(config, current_max_unit_num, value, conditions):
+    """
+    短路求值扩容条件，把求过值的条件写入conditions。
+    """
+    # 已达到maximumUnits时其他输入都不会改变结果 🐒
+    conditions['scaleOutcurrentMaxUnitNumStatus'] = current_max_unit_num < config.maximumUnits
+    if not conditions['scaleOutcurrentMaxUnitNumStatus']:
+        conditions['scaleOutCondition'] = False
+        return False
+
+    conditions['scaleOutForecastCondition'] = bool(value('forecastBreach'))
+    conditions['scaleOutQueueCondition'] = not conditions['scaleOutForecastCondition'] and bool(value('queueBreach'))
+    if conditions['scaleOutForecastCondition'] or conditions['scaleOutQueueCondition']:
+        conditions['scaleOutCondition'] = True
+        return True
+
+    # 内存或等待应用至少满足一项时才需要CPU
+    conditions['scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus'] = \
+        value('scaleOut.YARNMemoryAvailablePercentage') * 100 <= config.scaleOutAvgYARNMemoryAvailablePercentageValue
+    conditions['scaleOutMemoryCondition'] = conditions['scaleOutMemoryConditionYARNMemoryAvailablePercentageStatus']
+    if not conditions['scaleOutMemoryCondition']:
+        conditions['scaleOutMemoryConditionCapacityRemainingGBStatus'] = \
+            value('scaleOut.CapacityRemainingGB') <= config.scaleOutAvgCapacityRemainingGBValue
+        conditions['scaleOutMemoryCondition'] = conditions['scaleOutMemoryConditionCapacityRemainingGBStatus']
+    if not conditions['scaleOutMemoryCondition']:
+        conditions['scaleOutAppConditionPendingAppNumStatus'] = \
+            value('scaleOut.PendingAppNum') >= config.scaleOutAvgPendingAppNumValue
+        if not conditions['scaleOutAppConditionPendingAppNumStatus']:
+            conditions['scaleOutCondition'] = False
+            return False
+
+    conditions['scaleOutCPULoadStatus'] = value('scaleOut.TaskNodeCPULoad') >= config.scaleOutAvgTaskNodeCPULoadValue
+    conditions['scaleOutCondition'] = conditions['scaleOutCPULoadStatus']
+    return conditions['scaleOutCondition']
+
+
+def _evaluate_scale_in(config, current_max_unit_num, value, conditions):
+    """
+    短路求值缩容条件，把求过值的条件写入conditions。
+    """
+    # 已达到minimumUnits时其他输入都不会改变结果 🐒
+    conditions['scaleIncurrentMaxUnitNumStatus'] = current_max_unit_num > config.minimumUnits
+    if not conditions['scaleIncurrentMaxUnitNumStatus']:
+        conditions['scaleInCondition'] = False
+        return False
+
+    # 扩容判断已经看到预测或队列越界时不再获取缩容指标
+    if conditions.get('scaleOutForecastCondition') or conditions.get('scaleOutQueueCondition'):
+        conditions['scaleInBlockedByBreach'] = True
+        conditions['scaleInCondition'] = False
+        return False
+
+    # 先看SQLite中的指标，都不满足时再决定是否需要CPU
+    conditions['scaleInMemoryConditionYARNMemoryAvailablePercentageStatus'] = \
+        value('scaleIn.YARNMemoryAvailablePercentage') * 100 > config.scaleInAvgYARNMemoryAvailablePercentageValue
+    demand_low = conditions['scaleInMemoryCondition'] = \
+        conditions['scaleInMemoryConditionYARNMemoryAvailablePercentageStatus']
+    if not demand_low:
+        conditions['scaleInMemoryConditionCapacityRemainingGBStatus'] = \
+            value('scaleIn.CapacityRemainingGB') > config.scaleInAvgCapacityRemainingGBValue
+        demand_low = conditions['scaleInMemoryCondition'] = conditions['scaleInMemoryConditionCapacityRemainingGBStatus']
+    if not demand_low:
+        conditions['scaleInAppConditionPendingAppNumStatus'] = \
+            value('scaleIn.PendingAppNum') < config.scaleInAvgPendingAppNumValue
+        demand_low = conditions['scaleInAppConditionPendingAppNumStatus']
+
+    # 预测即将越过扩容阈值或有队列达到扩容阈值时不缩容
+    if bool(value('forecastBreach')) or bool(value('queueBreach')):
+        conditions['scaleInBlockedByBreach'] = True
+        conditions['scaleInCondition'] = False
+        return False
+
+    if not demand_low:
+        conditions['scaleInCPULoadStatus'] = value('scaleIn.TaskNodeCPULoad') < config.scaleInAvgTaskNodeCPULoadValue
+        demand_low = conditions['scaleInCPULoadStatus']
+    conditions['scaleInCondition'] = demand_low
+    return demand_low
+
+
+def compute_scale_out_units(config, current_max_capacity_units, current_min_capacity_units,
+                            apps_pending, reserved_virtual_cores, total_virtual_cores, apps_running):
+    """
+    计算扩容后的MaximumCapacityUnits。
+
+    :param config: ScalingConfig 实例
+    :param current_max_capacity_units: 当前策略的MaximumCapacityUnits
+    :param current_min_capacity_units: 当前策略的MinimumCapacityUnits
+    :param apps_pending: 等待中的应用数
+    :param reserved_virtual_cores: 预留的vCore数
+    :param total_virtual_cores: 集群总vCore数
+    :param apps_running: 运行中的应用数
+    :return: 新的MaximumCapacityUnits；没有等待的应用且集群资源利用率较低时返回None，表示跳过扩容
+    """
+    if apps_pending == 0:
+        # 没有等待分配资源的应用程序且集群资源利用率较低时不扩容
+        if reserved_virtual_cores <= 2:
+            return None
+        new_max_capacity_units = current_max_capacity_units + int(reserved_virtual_cores * config.scaleOutFactor)
+    else:
+        new_max_capacity_units = current_max_capacity_units + int(
+            (total_virtual_cores / apps_running) * config.scaleOutFactor)
+
+    # 确保新的 MaximumCapacityUnits 大于 MinimumCapacityUnits
+    new_max_capacity_units = max(new_max_capacity_units, current_min_capacity_units + 1)
+
+    # 确保新的 MaximumCapacityUnits 不超过最大限制
+    return min(new_max_capacity_units, config.maximumUnits)
+
+
+def compute_scale_in_units(config, current_max_capacity_units, apps_pending, total_virtual_cores, apps_running):
+    """
+    计算缩容后的MaximumCapacityUnits。
+
+    :param config: ScalingConfig 实例
+    :param current_max_capacity_units: 当前策略的MaximumCapacityUnits
+    :param apps_pending: 等待中的应用数
+    :param total_virtual_cores: 集群总vCore数
+    :param apps_running: 运行中的应用数
+    :return: 新的MaximumCapacityUnits
+    """
+    # 没有等待的应用时直接缩到最小值
+    if apps_pending == 0:
+        return config.minimumUnits
+    return max(config.minimumUnits, current_max_capacity_units - int((total_virtual_cores / apps_running) * config.scaleInFactor))
+
+
+def get_sizing_settings(config):
+    """
+    从可选参数中读取扩容的容量计算方式。
+
+    :param config: ScalingConfig 实例
+    :return: (scaleOutSizingMode: 'factor' 或 'demand', demandHeadroom, unitVirtualCores, unitMemoryMB)
+    """
+    return (str(config.get('scaleOutSizingMode', DEFAULT_SCALE_OUT_SIZING_MODE)).strip().lower(),
+            float(config.get('demandHeadroom', DEFAULT_DEMAND_HEADROOM)),
+            float(config.get('unitVirtualCores', DEFAULT_UNIT_VIRTUAL_CORES)),
+            float(config.get('unitMemoryMB', 0)))
+
+
+def compute_demand_scale_out_units(config, current_max_capacity_units, current_min_capacity_units, metrics,
+                                   headroom=DEFAULT_DEMAND_HEADROOM, unit_virtual_cores=DEFAULT_UNIT_VIRTUAL_CORES,
+                                   unit_memory_mb=0):
+    """
+    按实际需求一次性计算扩容目标：已分配 + 等待分配 + 预留的vCore和内存，加上余量后换算成Unit，
+    取vCore和内存中需要更多Unit的一方。
+
+    :param config: ScalingConfig 实例
+    :param current_max_capacity_units: 当前策略的MaximumCapacityUnits
+    :param current_min_capacity_units: 当前策略的MinimumCapacityUnits
+    :param metrics: 提供 get(name, default) 的clusterMetrics(字典或YarnClusterSnapshot)
+    :param headroom: 在需求之上保留的余量比例
+    :param unit_virtual_cores: 每个容量Unit的vCore数(UnitType为VCPU时为1)
+    :param unit_memory_mb: 每个容量Unit的内存(MB)，为0时按集群的totalMB/totalVirtualCores估算
+    :return: 新的MaximumCapacityUnits；当前值已经满足需求时返回None，表示跳过扩容
+    """
+    def value(name):
+        return metrics.get(name, 0) or 0
+
+    demand_virtual_cores = value('allocatedVirtualCores') + value('pendingVirtualCores') + value('reservedVirtualCores')
+    demand_mb = value('allocatedMB') + value('pendingMB') + value('reservedMB')
+
+    if unit_memory_mb <= 0 and value('totalVirtualCores'):
+        unit_memory_mb = value('totalMB') / value('totalVirtualCores') * unit_virtual_cores
+
+    demand_units = demand_virtual_cores / unit_virtual_cores
+    if unit_memory_mb > 0:
+        demand_units = max(demand_units, demand_mb / unit_memory_mb)
+    target_units = math.ceil(demand_units * (1 + headroom))
+
+    if target_units <= current_max_capacity_units:
+        return None
+
+    # 与按系数扩容相同：大于MinimumCapacityUnits，不超过maximumUnits
+    return min(max(target_units, current_min_capacity_units + 1), config.maximumUnits)
@@ -0,0 +1,606 @@
+import bisect
+import heapq
+import json
+import sqlite3
+import time
+from dataclasses import fields, replace
+from types import MappingProxyType
+from .utils import Utils
+from .ssm import ScalingConfig, get_config_cache
+from .metrics_store import METRIC_COLUMNS, MetricWindows, ROLLUP_RESOLUTIONS, connect, read_series
+from .scaling_policy import (DEMAND_SIZING_FIELDS, decide_scale_status, compute_scale_out_units, compute_scale_in_units,
+                             compute_demand_scale_out_units, get_sizing_settings)
+from .forecast import DemandForecaster, get_forecast_settings
+from .yarn_queues import QUEUE_THRESHOLD_METRICS, check_queue_thresholds, get_queue_thresholds, match_queue_name
+
+# Task Node CPU序列在回放中的名称，与配置中的 scale*AvgTaskNodeCPULoad* 参数对应
+CPU_SERIES = 'TaskNodeCPULoad'
+
+# 决策使用的所有指标，与 tools.scaling_policy.DECISION_METRICS 一致
+DECISION_SERIES = tuple(METRIC_COLUMNS) + (CPU_SERIES,)
+
+# scale_out/scale_in 从ResourceManager快照中读取的字段，采集器记录了这些列时直接使用
+SNAPSHOT_COLUMNS = ('appsRunning', 'totalVirtualCores', 'reservedVirtualCores')
+
+# 估算实际需求(已分配 + 等待分配的vCore)的字段，采集器记录了这些列时用于评分
+DEMAND_COLUMNS = ('allocatedVirtualCores', 'pendingVirtualCores')
+
+# 不属于ScalingConfig字段、通过 config.get 读取的可选参数，可以在回放中覆盖
+OPTIONAL_PARAMETERS = ('inventoryRefreshSeconds', 'forecastEnabled', 'forecastLeadSeconds', 'forecastAlpha', 'forecastBeta',
+                       'scaleOutSizingMode', 'demandHeadroom', 'unitVirtualCores', 'unitMemoryMB', 'queueScaleOutThresholds')
+
+
+class MetricHistory:
+    """
+    一个集群的历史指标，用于回放。
+
+    每个序列在加载时只扫描一次并计算前缀和与有效数据点数的前缀和，任意时刻任意窗口的平均值都可以通过
+    两次二分查找和两次前缀和相减得到；同一组tick和窗口的结果会被缓存，
+    因此回放(以及参数扫描中的多次回放)的聚合成本与窗口长度无关。
+    与控制器的 MetricWindows 相同，缺失的样本(None)既不计入平均值也不计入数据点数。
+    从汇总表读取的桶按其包含的原始样本数加权，完整性检查仍按原始样本计算。
+    """
+
+    def __init__(self, timestamps, columns, sample_interval_seconds, cpu_timestamps=None, cpu_values=None,
+                 snapshot_columns=None, queue_series=None, counts=None):
+        """
+        :param timestamps: 按升序排列的样本时间戳
+        :param columns: {指标名: 与timestamps对齐的值列表}
+        :param sample_interval_seconds: 样本间隔(秒)，用于与控制器相同的数据完整性检查
+        :param cpu_timestamps: Task Node每分钟平均CPU的时间戳(升序)
+        :param cpu_values: 与cpu_timestamps对齐的CPU值
+        :param snapshot_columns: {快照字段名: 与timestamps对齐的值列表}，只包含采集器记录过的字段
+        :param queue_series: {队列名: (升序的时间戳列表, {指标名: 值列表})}，采集器记录的队列指标
+        :param counts: {指标名: 与timestamps对齐的原始样本数列表}，汇总桶的平均值按样本数加权，默认每个样本计1
+        """
+        self.timestamps = timestamps
+        self.columns = columns
+        self.sample_interval_seconds = sample_interval_seconds
+        self.cpu_timestamps = cpu_timestamps or []
+        self.cpu_values = cpu_values or []
+        self.snapshot_columns = snapshot_columns or {}
+        self.queue_series = queue_series or {}
+        counts = counts or {}
+        self._prefix_sums = {name: self._prefix_sum(values, counts.get(name)) for name, values in columns.items()}
+        self._prefix_sums[CPU_SERIES] = self._prefix_sum(self.cpu_values)
+        self._window_cache = {}
+
+    @staticmethod
+    def _prefix_sum(values, weights=None):
+        """
+        计算值和有效数据点数的前缀和。
+
+        :param values: 值列表，缺失的值为None
+        :param weights: 与values对齐的原始样本数列表，默认每个值计1
+        :return: (值的加权前缀和, 有效数据点数的前缀和)
+        """
+        prefix = [0.0] * (len(values) + 1)
+        counts = [0] * (len(values) + 1)
+        total, count = 0.0, 0
+        for i, value in enumerate(values):
+            if value is not None:
+                weight = 1 if weights is None else weights[i]
+                total += value * weight
+                count += weight
+            prefix[i + 1] = total
+            counts[i + 1] = count
+        return prefix, counts
+
+    @classmethod
+    def load(cls, table_name, db_path=None, start_time=None, end_time=None, monitor_interval_seconds=30):
+        """
+        从采集器写入的SQLite文件中加载历史数据。
+
+        原始样本覆盖不到的时间段依次从1分钟、5分钟、1小时汇总表补齐，每个汇总桶作为一个样本，
+        时间戳为桶的结束时间，只在桶完整结束后才进入窗口。
+
+        :param table_name: 指标表名(已经过sanitize处理)
+        :param db_path: SQLite文件路径，默认为 {table_name}.db
+        :param start_time: 回放起点(Unix时间戳)，默认为最早的样本
+        :param end_time: 回放终点(Unix时间戳)，默认为最新的样本
+        :param monitor_interval_seconds: 采集器的采样间隔(秒)
+        :return: MetricHistory 实例
+        """
+        conn = connect(db_path or f"{table_name}.db", readonly=True)
+        try:
+            end_time = end_time or int(time.time())
+            raw_start = conn.execute(f"SELECT MIN(Timestamp) FROM {table_name}").fetchone()[0]
+            available_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+            snapshot_names = [name for name in dict.fromkeys(SNAPSHOT_COLUMNS + DEMAND_COLUMNS + DEMAND_SIZING_FIELDS)
+                              if name in available_columns]
+
+            rows = []
+            if raw_start is not None:
+                rows = conn.execute(
+                    f"SELECT Timestamp, {', '.join(tuple(METRIC_COLUMNS) + tuple(snapshot_names))} FROM {table_name} "
+                    f"WHERE Timestamp BETWEEN ? AND ? ORDER BY Timestamp",
+                    (max(start_time or raw_start, raw_start), end_time)).fetchall()
+            timestamps = [row[0] for row in rows]
+            columns = {metric: [row[i + 1] for row in rows] for i, metric in enumerate(METRIC_COLUMNS)}
+            counts = {metric: [0 if value is None else 1 for value in values] for metric, values in columns.items()}
+            snapshot_columns = {name: [row[len(METRIC_COLUMNS) + 1 + i] for row in rows]
+                                for i, name in enumerate(snapshot_names)}
+
+            rollup_segments = cls._load_rollups(conn, table_name, start_time, end_time if raw_start is None else raw_start)
+            if rollup_segments:
+                # 汇总桶没有快照字段；PendingAppNum在快照中使用桶内最后一个值
+                snapshot_columns['PendingAppNum'] = list(columns['PendingAppNum'])
+                for resolution, buckets in rollup_segments:
+                    bucket_ends = [bucket + ROLLUP_RESOLUTIONS[resolution] for bucket in buckets]
+                    timestamps[:0] = bucket_ends
+                    for metric in METRIC_COLUMNS:
+                        rollups = [buckets[bucket].get(metric) for bucket in buckets]
+                        columns[metric][:0] = [None if row is None else row[3] / row[4] for row in rollups]
+                        counts[metric][:0] = [0 if row is None else row[4] for row in rollups]
+                    for name in snapshot_names:
+                        snapshot_columns[name][:0] = [None] * len(buckets)
+                    snapshot_columns['PendingAppNum'][:0] = [
+                        None if 'PendingAppNum' not in metrics else metrics['PendingAppNum'][5]
+                        for metrics in buckets.values()]
+                Utils.logger.info(
+                    f"Raw samples of '{table_name}' start at {raw_start}, replaying earlier periods from the "
+                    f"{', '.join(resolution for resolution, _ in reversed(rollup_segments))} rollup tables.")
+            sample_interval_seconds = monitor_interval_seconds
+
+            try:
+                cpu_rows = conn.execute(
+                    f"SELECT Timestamp, AVG(CPUUtilization) FROM {table_name}_task_cpu "
+                    f"WHERE Timestamp BETWEEN ? AND ? GROUP BY Timestamp ORDER BY Timestamp",
+                    (start_time or 0, end_time)).fetchall()
+            except sqlite3.OperationalError as e:
+                # 采集器没有记录Task Node CPU，回放中CPU条件始终没有数据
+                Utils.logger.warning(f"Task node CPU history not available for '{table_name}': {e}")
+                cpu_rows = []
+
+            queue_series = {}
+            try:
+                queue_rows = conn.execute(
+                    f"SELECT QueueName, Timestamp, {', '.join(QUEUE_THRESHOLD_METRICS)} FROM {table_name}_queues "
+                    f"WHERE Timestamp BETWEEN ? AND ? ORDER BY QueueName, Timestamp",
+                    (start_time or 0, end_time)).fetchall()
+            except sqlite3.OperationalError:
+                # 旧版本采集器没有记录队列指标
+                queue_rows = []
+            for row in queue_rows:
+                queue_timestamps, queue_columns = queue_series.setdefault(
+                    row[0], ([], {name: [] for name in QUEUE_THRESHOLD_METRICS}))
+                queue_timestamps.append(row[1])
+                for name, value in zip(QUEUE_THRESHOLD_METRICS, row[2:]):
+                    queue_columns[name].append(value)
+        finally:
+            conn.close()
+
+        Utils.logger.info(f"Loaded {len(timestamps)} samples and {len(cpu_rows)} task node CPU points for '{table_name}'.")
+        return cls(timestamps, columns, sample_interval_seconds,
+                   [row[0] for row in cpu_rows], [row[1] for row in cpu_rows], snapshot_columns, queue_series, counts)
+
+    @staticmethod
+    def _load_rollups(conn, table_name, start_time, boundary):
+        """
+        从细到粗读取原始样本之前的汇总桶，每一级只读取在更细一级数据开始之前已经结束的完整桶。
+
+        :param conn: SQLite只读连接
+        :param table_name: 指标表名
+        :param start_time: 回放起点，None表示从最早的汇总桶开始
+        :param boundary: 更细一级数据的起点(Unix时间戳)
+        :return: [(汇总表后缀, {桶起点: {指标名: (桶起点, min, max, sum, count, last)}}), ...]，
+                 按从新到旧排列，每个字典按桶起点升序
+        """
+        segments = []
+        for resolution, resolution_seconds in ROLLUP_RESOLUTIONS.items():
+            if start_time is not None and start_time >= boundary:
+                break
+            buckets = {}
+            try:
+                for metric in METRIC_COLUMNS:
+                    for row in read_series(conn, table_name, metric, start_time or 0, boundary - resolution_seconds, resolution):
+                        buckets.setdefault(row[0], {})[metric] = row
+            except sqlite3.OperationalError as e:
+                # 旧版本采集器没有创建该汇总表
+                Utils.logger.warning(f"Rollup table '{table_name}_{resolution}' not available: {e}")
+                continue
+            if buckets:
+                buckets = dict(sorted(buckets.items()))
+                segments.append((resolution, buckets))
+                boundary = next(iter(buckets))
+        return segments
+
+    def ticks(self, interval_seconds, start_time=None, end_time=None):
+        """
+        生成回放的tick时间点。
+
+        :param interval_seconds: tick间隔(秒)，即actionIntervalSeconds
+        :param start_time: 起点，默认为第一个样本
+        :param end_time: 终点，默认为最后一个样本
+        :return: 升序的时间戳列表
+        """
+        if not self.timestamps:
+            return []
+        start_time = self.timestamps[0] if start_time is None else start_time
+        end_time = self.timestamps[-1] if end_time is None else end_time
+        return list(range(int(start_time), int(end_time) + 1, int(interval_seconds)))
+
+    def window_means(self, ticks, name, window_minutes):
+        """
+        计算每个tick时刻指定序列在最近window_minutes分钟内的平均值。
+
+        与控制器相同：YARN指标的数据点少于期望值的 MetricWindows.completeness_ratio 时视为数据不足，
+        Task Node CPU没有数据时视为数据不足，数据不足的tick返回None。
+
+        :param ticks: 升序的tick时间戳列表
+        :param name: 指标名称或 CPU_SERIES
+        :param window_minutes: 时间窗口(分钟)
+        :return: 与ticks对齐的平均值列表
+        """
+        key = (ticks[0] if ticks else None, ticks[-1] if ticks else None, len(ticks), name, window_minutes)
+        cached = self._window_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if name == CPU_SERIES:
+            timestamps, min_points = self.cpu_timestamps, 1
+        else:
+            timestamps = self.timestamps
+            expected_data_points = int(window_minutes * 60) // self.sample_interval_seconds
+            min_points = max(1, expected_data_points * MetricWindows.completeness_ratio)
+        prefix, counts = self._prefix_sums[name]
+        window_seconds = int(window_minutes * 60)
+
+        means = []
+        for tick in ticks:
+            start = bisect.bisect_left(timestamps, tick - window_seconds)
+            end = bisect.bisect_right(timestamps, tick)
+            count = counts[end] - counts[start]
+            means.append((prefix[end] - prefix[start]) / count if count >= min_points else None)
+        self._window_cache[key] = means
+        return means
+
+    def queue_window_means(self, ticks, queue_name, name, window_minutes):
+        """
+        计算每个tick时刻指定队列的指标在最近window_minutes分钟内的平均值，完整性检查与 window_means 相同。
+
+        :param ticks: 升序的tick时间戳列表
+        :param queue_name: queue_series中的队列名
+        :param name: 队列指标名称
+        :param window_minutes: 时间窗口(分钟)
+        :return: 与ticks对齐的平均值列表，数据不足的位置为None
+        """
+        key = (ticks[0] if ticks else None, ticks[-1] if ticks else None, len(ticks), (queue_name, name), window_minutes)
+        cached = self._window_cache.get(key)
+        if cached is not None:
+            return cached
+
+        timestamps, columns = self.queue_series[queue_name]
+        prefix_key = (queue_name, name)
+        prefix_sum = self._prefix_sums.get(prefix_key)
+        if prefix_sum is None:
+            prefix_sum = self._prefix_sums[prefix_key] = self._prefix_sum(columns[name])
+        prefix, counts = prefix_sum
+        window_seconds = int(window_minutes * 60)
+        min_points = max(1, window_seconds // self.sample_interval_seconds * MetricWindows.completeness_ratio)
+
+        means = []
+        for tick in ticks:
+            start = bisect.bisect_left(timestamps, tick - window_seconds)
+            end = bisect.bisect_right(timestamps, tick)
+            count = counts[end] - counts[start]
+            means.append((prefix[end] - prefix[start]) / count if count >= min_points else None)
+        self._window_cache[key] = means
+        return means
+
+    def latest(self, ticks, name):
+        """
+        获取每个tick时刻指定列的最新值(该时刻之前最后一个样本)。
+
+        :param ticks: 升序的tick时间戳列表
+        :param name: 指标名称或快照字段名
+        :return: 与ticks对齐的值列表，没有数据的位置为None
+        """
+        key = (ticks[0] if ticks else None, ticks[-1] if ticks else None, len(ticks), name, None)
+        cached = self._window_cache.get(key)
+        if cached is not None:
+            return cached
+
+        values = self.snapshot_columns.get(name, self.columns.get(name))
+        if values is None:
+            latest = [None] * len(ticks)
+        else:
+            indexes = [bisect.bisect_right(self.timestamps, tick) - 1 for tick in ticks]
+            latest = [values[i] if i >= 0 else None for i in indexes]
+        self._window_cache[key] = latest
+        return latest
+
+    def demand_units(self, ticks, vcores_per_unit=1):
+        """
+        估算每个tick时刻的实际需求容量：(allocatedVirtualCores + pendingVirtualCores) / vcores_per_unit。
+
+        :param ticks: 升序的tick时间戳列表
+        :param vcores_per_unit: 每个容量Unit的vCore数
+        :return: 与ticks对齐的需求Unit列表；采集器没有记录这两列时返回None
+        """
+        if not all(name in self.snapshot_columns for name in DEMAND_COLUMNS):
+            return None
+        allocated, pending = (self.latest(ticks, name) for name in DEMAND_COLUMNS)
+        return [None if a is None else (a + (p or 0)) / vcores_per_unit for a, p in zip(allocated, pending)]
+
+
+class ScalingSimulator:
+    """
+    扩缩容决策的回放模拟器。
+
+    按actionIntervalSeconds在历史数据上逐个tick执行与控制器相同的判断(decide_scale_status)、
+    冷却检查和新容量计算(compute_scale_out_units / compute_scale_in_units)。
+    MaximumCapacityUnits的修改立即生效，实际容量在扩容时经过provision_delay_seconds、
+    缩容时经过release_delay_seconds后才跟上，以此模拟实例的启动和回收。
+    历史中没有记录的ResourceManager字段使用模拟值：totalVirtualCores按当前模拟容量估算，
+    appsRunning和reservedVirtualCores使用给定的默认值。
+
+    回放同时给出评分：容量不足的时间、多余容量的Unit小时数和策略写入次数。
+    历史中记录了allocatedVirtualCores和pendingVirtualCores时以二者之和作为需求；
+    否则以压力信号近似：有等待的应用且可用内存低于pressure_memory_percentage、
+    而模拟容量尚未达到maximumUnits时计为容量不足，没有等待的应用时超出headroom的空闲内存比例计为多余容量。
+    """
+
+    def __init__(self, config, history, provision_delay_seconds=300, release_delay_seconds=60,
+                 initial_max_units=None, policy_min_units=0, vcores_per_unit=1, apps_running=10,
+                 headroom=0.2, pressure_memory_percentage=10):
+        """
+        :param config: ScalingConfig 实例
+        :param history: MetricHistory 实例
+        :param provision_delay_seconds: 调高MaximumCapacityUnits后容量到位的延迟(秒)
+        :param release_delay_seconds: 调低MaximumCapacityUnits后容量回收的延迟(秒)
+        :param initial_max_units: 回放开始时的MaximumCapacityUnits，默认为minimumUnits
+        :param policy_min_units: Managed Scaling策略的MinimumCapacityUnits
+        :param vcores_per_unit: 每个容量Unit的vCore数，用于估算totalVirtualCores
+        :param apps_running: 历史中没有appsRunning时使用的运行中应用数
+        :param headroom: 评分时允许的容量余量比例，超出部分计为多余容量
+        :param pressure_memory_percentage: 没有记录需求时，判断容量不足的可用内存百分比
+        """
+        self.config = config
+        self.history = history
+        self.provision_delay_seconds = provision_delay_seconds
+        self.release_delay_seconds = release_delay_seconds
+        self.initial_max_units = config.minimumUnits if initial_max_units is None else initial_max_units
+        self.policy_min_units = policy_min_units
+        self.vcores_per_unit = vcores_per_unit
+        self.apps_running = apps_running
+        self.headroom = headroom
+        self.pressure_memory_percentage = pressure_memory_percentage
+
+    def run(self, start_time=None, end_time=None, record_timeline=True):
+        """
+        执行回放。
+
+        :param start_time: 回放起点(Unix时间戳)，默认为第一个样本之后最大窗口的位置
+        :param end_time: 回放终点(Unix时间戳)，默认为最后一个样本
+        :param record_timeline: 是否记录每个tick的时间线，参数扫描只需要汇总时关闭
+        :return: {'timeline': [每个tick的记录], 'summary': 汇总}
+        """
+        config = self.config
+        history = self.history
+        if start_time is None and history.timestamps:
+            max_window_minutes = max(config.get_metric_window_minutes(name, scale_status)
+                                     for name in DECISION_SERIES for scale_status in ('scaleOut', 'scaleIn'))
+            start_time = history.timestamps[0] + int(max_window_minutes * 60)
+        ticks = history.ticks(config.actionIntervalSeconds, start_time, end_time)
+
+        started = time.perf_counter()
+        scale_out_series = [history.window_means(ticks, name, config.get_metric_window_minutes(name, 'scaleOut'))
+                            for name in DECISION_SERIES]
+        scale_in_series = [history.window_means(ticks, name, config.get_metric_window_minutes(name, 'scaleIn'))
+                           for name in DECISION_SERIES]
+        # 判断树的输入名(见 DECISION_INPUTS)到与ticks对齐的平均值序列
+        input_series = {f"scaleOut.{name}": series for name, series in zip(DECISION_SERIES, scale_out_series)}
+        input_series.update({f"scaleIn.{name}": series for name, series in zip(DECISION_SERIES, scale_in_series)})
+        apps_pending_series = history.latest(ticks, 'PendingAppNum')
+        snapshot_series = {name: history.latest(ticks, name) for name in SNAPSHOT_COLUMNS}
+        demand_series = history.demand_units(ticks, self.vcores_per_unit)
+        sizing_mode, demand_headroom, unit_virtual_cores, unit_memory_mb = get_sizing_settings(config)
+        if sizing_mode == 'demand':
+            sizing_series = {name: history.latest(ticks, name) for name in DEMAND_SIZING_FIELDS}
+            if not any(name in history.snapshot_columns for name in DEMAND_SIZING_FIELDS):
+                Utils.logger.warning("Demand sizing needs pending/reserved vCores and MB in the history, scale out will be skipped.")
+        memory_series = history.latest(ticks, 'YARNMemoryAvailablePercentage')
+
+        # 队列阈值: {阈值中的队列名: {指标名: 与ticks对齐的平均值}}
+        queue_thresholds = get_queue_thresholds(config)
+        queue_window_series = {}
+        for threshold_queue_name, thresholds in queue_thresholds.items():
+            queue_name = match_queue_name(threshold_queue_name, list(history.queue_series))
+            if queue_name is None:
+                Utils.logger.warning(f"Queue '{threshold_queue_name}' was not recorded in the history, its threshold is ignored.")
+                continue
+            queue_window_series[threshold_queue_name] = {
+                name: history.queue_window_means(ticks, queue_name, name, thresholds['Minutes'])
+                for name in thresholds if name != 'Minutes'}
+
+        max_units = capacity_units = self.initial_max_units
+        last_scale_out_time = last_scale_in_time = 0
+        # 尚未生效的容量变化: (生效时间, 序号, 目标容量)，序号保证较晚的修改覆盖较早的修改
+        pending_capacity = []
+        applied_sequence = -1
+        sequence = 0
+
+        # 需求预测按样本逐个增量更新，与控制器每个tick送入新样本的方式相同
+        forecast_enabled, forecast_lead_seconds, forecast_alpha, forecast_beta = get_forecast_settings(config)
+        forecaster = DemandForecaster(forecast_alpha, forecast_beta) if forecast_enabled else None
+        sample_index = bisect.bisect_left(history.timestamps, ticks[0] - max(
+            config.get_metric_window_minutes(name, scale_status) for name in METRIC_COLUMNS
+            for scale_status in ('scaleOut', 'scaleIn')) * 60) if ticks else 0
+
+        timeline = []
+        counts = {'scaleOut': 0, 'scaleIn': 0, 'cooldown': 0, 'skipped': 0, 'error': 0, 'insufficientData': 0,
+                  'forecastBreaches': 0, 'queueBreaches': 0}
+        previous_tick = ticks[0] if ticks else 0
+        unit_seconds = under_provisioned_seconds = over_provisioned_unit_seconds = 0.0
+
+        for i, tick in enumerate(ticks):
+            # 上一个tick到本tick之间按上一个tick的容量和需求计分
+            elapsed_seconds = tick - previous_tick
+            previous_tick = tick
+            if elapsed_seconds:
+                unit_seconds += capacity_units * elapsed_seconds
+                if demand_series is not None and demand_series[i - 1] is not None:
+                    demand = demand_series[i - 1]
+                    if capacity_units < demand:
+                        under_provisioned_seconds += elapsed_seconds
+                    over_provisioned_unit_seconds += max(0.0, capacity_units - demand * (1 + self.headroom)) * elapsed_seconds
+                elif memory_series[i - 1] is not None:
+                    available = memory_series[i - 1]
+                    if apps_pending_series[i - 1]:
+                        if available * 100 <= self.pressure_memory_percentage and capacity_units < config.maximumUnits:
+                            under_provisioned_seconds += elapsed_seconds
+                    else:
+                        over_provisioned_unit_seconds += capacity_units * max(0.0, available - self.headroom) * elapsed_seconds
+
+            while pending_capacity and pending_capacity[0][0] <= tick:
+                _, change_sequence, units = heapq.heappop(pending_capacity)
+                if change_sequence > applied_sequence:
+                    capacity_units, applied_sequence = units, change_sequence
+
+            forecast_breach = False
+            if forecaster is not None:
+                while sample_index < len(history.timestamps) and history.timestamps[sample_index] <= tick:
+                    forecaster.update(history.timestamps[sample_index],
+                                      {name: values[sample_index] for name, values in history.columns.items()})
+                    sample_index += 1
+                forecast_breach, _ = forecaster.check(config, forecast_lead_seconds)
+                counts['forecastBreaches'] += forecast_breach
+
+            queue_breach = False
+            if queue_window_series:
+                queue_means = {queue_name: {name: series[i] for name, series in metrics.items()}
+                               for queue_name, metrics in queue_window_series.items()}
+                queue_breach = bool(check_queue_thresholds(queue_thresholds, {
+                    queue_name: means for queue_name, means in queue_means.items() if None not in means.values()}))
+                counts['queueBreaches'] += queue_breach
+
+            flags = {'forecastBreach': forecast_breach, 'queueBreach': queue_breach}
+            scale_status, conditions, _ = decide_scale_status(
+                config, max_units, lambda name: flags[name] if name in flags else input_series[name][i])
+            action = ''
+            if 'insufficientData' in conditions:
+                action = 'insufficient_data'
+                counts['insufficientData'] += 1
+
+            new_max_units = None
+            if scale_status != 0:
+                direction = 'scale_out' if scale_status == 1 else 'scale_in'
+                apps_pending = apps_pending_series[i] or 0
+                total_virtual_cores = snapshot_series['totalVirtualCores'][i]
+                if total_virtual_cores is None:
+                    total_virtual_cores = capacity_units * self.vcores_per_unit
+                apps_running = snapshot_series['appsRunning'][i]
+                if apps_running is None:
+                    apps_running = self.apps_running
+                reserved_virtual_cores = snapshot_series['reservedVirtualCores'][i] or 0
+
+                if scale_status == 1 and tick - last_scale_out_time < config.scaleOutCooldownSeconds:
+                    action = 'scale_out_cooldown'
+                    counts['cooldown'] += 1
+                elif scale_status == -1 and tick - last_scale_in_time < config.scaleInCooldownSeconds:
+                    action = 'scale_in_cooldown'
+                    counts['cooldown'] += 1
+                else:
+                    try:
+                        if scale_status == 1 and sizing_mode == 'demand':
+                            metrics = {name: series[i] for name, series in sizing_series.items()}
+                            if metrics['totalVirtualCores'] is None:
+                                metrics['totalVirtualCores'] = total_virtual_cores
+                            new_max_units = compute_demand_scale_out_units(
+                                config, max_units, self.policy_min_units, metrics,
+                                demand_headroom, unit_virtual_cores, unit_memory_mb)
+                        elif scale_status == 1:
+                            new_max_units = compute_scale_out_units(
+                                config, max_units, self.policy_min_units,
+                                apps_pending, reserved_virtual_cores, total_virtual_cores, apps_running)
+                        else:
+                            new_max_units = compute_scale_in_units(
+                                config, max_units, apps_pending, total_virtual_cores, apps_running)
+                    except ZeroDivisionError:
+                        # 控制器在同样的输入下会抛出异常并跳过本次操作
+                        action = f'{direction}_error'
+                        counts['error'] += 1
+                    else:
+                        if new_max_units is None:
+                            action = 'scale_out_skipped'
+                            counts['skipped'] += 1
+                        else:
+                            action = direction
+                            counts['scaleOut' if scale_status == 1 else 'scaleIn'] += 1
+                            delay = self.provision_delay_seconds if new_max_units > capacity_units else self.release_delay_seconds
+                            heapq.heappush(pending_capacity, (tick + delay, sequence, new_max_units))
+                            sequence += 1
+                            max_units = new_max_units
+                            # 与控制器相同：缩容同时刷新扩容冷却时间
+                            last_scale_out_time = tick
+                            if scale_status == -1:
+                                last_scale_in_time = tick
+
+            if not record_timeline:
+                continue
+            timeline.append({
+                'timestamp': tick,
+                'scaleStatus': scale_status,
+                'action': action,
+                'maximumCapacityUnits': max_units,
+                'capacityUnits': capacity_units,
+                'pendingAppNum': apps_pending_series[i],
+                'scaleOutMeans': {name: series[i] for name, series in zip(DECISION_SERIES, scale_out_series)},
+                'scaleInMeans': {name: series[i] for name, series in zip(DECISION_SERIES, scale_in_series)},
+            })
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            'ticks': len(ticks),
+            'startTime': ticks[0] if ticks else None,
+            'endTime': ticks[-1] if ticks else None,
+            'policyWrites': counts['scaleOut'] + counts['scaleIn'],
+            **counts,
+            'capacityUnitHours': unit_seconds / 3600,
+            'underProvisionedSeconds': under_provisioned_seconds,
+            'overProvisionedUnitHours': over_provisioned_unit_seconds / 3600,
+            'demandSource': 'recorded' if demand_series is not None else 'pressure',
+            'finalMaximumCapacityUnits': max_units,
+            'finalCapacityUnits': capacity_units,
+            'elapsedSeconds': elapsed,
+        }
+        Utils.logger.info(f"Replayed {len(ticks)} ticks in {elapsed:.3f} seconds: {summary}")
+        return {'timeline': timeline, 'summary': summary}
+
+
+def load_config(prefix, parameters_file=None, overrides=None):
+    """
+    加载回放使用的配置：从JSON参数文件(离线)或Parameter Store读取，再应用覆盖值。
+
+    :param prefix: 参数前缀
+    :param parameters_file: JSON文件路径，内容为 {参数名: 值}，为None时读取Parameter Store
+    :param overrides: {参数名: 值}，用于尝试新的阈值
+    :return: ScalingConfig 实例
+    """
+    if parameters_file:
+        with open(parameters_file) as f:
+            config = ScalingConfig.from_parameters(prefix, json.load(f))
+    else:
+        config = get_config_cache(prefix).get_config()
+    return override_config(config, overrides) if overrides else config
+
+
+def override_config(config, overrides):
+    """
+    返回应用了覆盖值的新配置，值按字段类型转换。
+
+    :param config: ScalingConfig 实例
+    :param overrides: {参数名: 值}
+    :return: 新的 ScalingConfig 实例
+    """
+    field_types = {f.name: f.type for f in fields(config) if f.name not in ('prefix', 'raw')}
+    unknown = [name for name in overrides if name not in field_types and name not in OPTIONAL_PARAMETERS]
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(unknown)}")
+    # 可选参数与Parameter Store中一样以字符串保存在raw中
+    raw = dict(config.raw)
+    raw.update({name: str(value) for name, value in overrides.items() if name not in field_types})
+    return replace(config, raw=MappingProxyType(raw), **{
+        name: int(float(value)) if field_types[name] is int else field_types[name](value)
+        for name, value in overrides.items() if name in field_types})
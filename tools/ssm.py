@@ -1,7 +1,10 @@
-import boto3
-import aioboto3
 import asyncio
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
 from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+from .aws_clients import get_client, get_aio_client
 
 
 class AWSSSMClient:
@@ -10,7 +13,7 @@ class AWSSSMClient:
     """
 
     def __init__(self):
-        self.client = boto3.client('ssm')
+        self.client = get_client('ssm')
 
     @Utils.exception_handler
     def get_parameters_from_parameter_store(self, name):
@@ -34,10 +37,9 @@ class AWSSSMClient:
         """
         Utils.logger.info(
             f"Getting parameter '{name}' from Parameter Store asynchronously...")
-        session = aioboto3.Session()
-        async with session.client('ssm') as client:
-            parameter = await client.get_parameter(Name=name, WithDecryption=True)
-            return parameter['Parameter']['Value']
+        client = await get_aio_client('ssm')
+        parameter = await client.get_parameter(Name=name, WithDecryption=True)
+        return parameter['Parameter']['Value']
 
     @Utils.exception_handler
     async def aioget_parameters_from_parameter_store(self, names):
@@ -70,3 +72,160 @@ class AWSSSMClient:
             )
             Utils.logger.info(
                 f"Parameter '{full_parameter_name}' written: {response}")
+
+
+@dataclass(frozen=True)
+class ScalingConfig:
+    """
+    一个前缀下所有Managed Scaling Enhanced参数的不可变、带类型的视图。
+    字段名与Parameter Store中的参数名一致。
+    """
+    prefix: str
+    minimumUnits: int
+    maximumUnits: int
+    spotInstancesTimeout: int
+    monitorIntervalSeconds: int
+    actionIntervalSeconds: int
+    scaleOutAvgYARNMemoryAvailablePercentageValue: float
+    scaleOutAvgYARNMemoryAvailablePercentageMinutes: int
+    scaleOutAvgCapacityRemainingGBValue: float
+    scaleOutAvgCapacityRemainingGBMinutes: int
+    scaleOutAvgPendingAppNumValue: float
+    scaleOutAvgPendingAppNumMinutes: int
+    scaleOutAvgTaskNodeCPULoadValue: float
+    scaleOutAvgTaskNodeCPULoadMinutes: float
+    scaleInAvgYARNMemoryAvailablePercentageValue: float
+    scaleInAvgYARNMemoryAvailablePercentageMinutes: int
+    scaleInAvgCapacityRemainingGBValue: float
+    scaleInAvgCapacityRemainingGBMinutes: int
+    scaleInAvgPendingAppNumValue: float
+    scaleInAvgPendingAppNumMinutes: int
+    scaleInAvgTaskNodeCPULoadValue: float
+    scaleInAvgTaskNodeCPULoadMinutes: float
+    scaleOutFactor: float
+    scaleInFactor: float
+    maximumOnDemandInstancesNumValue: int
+    scaleOutCooldownSeconds: int
+    scaleInCooldownSeconds: int
+    # 前缀下的全部原始参数(去掉前缀后的相对名称 -> 字符串值)，供可选参数使用
+    raw: MappingProxyType = field(default_factory=lambda: MappingProxyType({}), repr=False, compare=False)
+
+    @classmethod
+    def from_parameters(cls, prefix, values):
+        """
+        根据参数字典构造配置对象。
+
+        :param prefix: 参数前缀
+        :param values: 去掉前缀后的参数名 -> 字符串值
+        :return: ScalingConfig 实例
+        """
+        kwargs = {}
+        missing = []
+        for f in fields(cls):
+            if f.name in ('prefix', 'raw'):
+                continue
+            if f.name not in values:
+                missing.append(f"/{prefix}/{f.name}")
+                continue
+            kwargs[f.name] = f.type(values[f.name])
+        if missing:
+            raise ValueError(f"Missing parameters in Parameter Store: {', '.join(missing)}")
+        return cls(prefix=prefix, raw=MappingProxyType(dict(values)), **kwargs)
+
+    def get_metric_window_minutes(self, metric_name, scale_status):
+        """
+        获取指定指标在扩容或缩容判断时使用的时间窗口(分钟)。
+
+        :param metric_name: 指标名称，例如 PendingAppNum
+        :param scale_status: 'scaleOut' 或 'scaleIn'
+        :return: 时间窗口(分钟)
+        """
+        return getattr(self, f"{scale_status}Avg{metric_name}Minutes")
+
+    def get(self, name, default=None):
+        """
+        读取可选参数的原始字符串值。
+
+        :param name: 去掉前缀后的参数名
+        :param default: 参数不存在时的默认值
+        """
+        return self.raw.get(name, default)
+
+
+class SSMConfigCache:
+    """
+    Parameter Store 配置缓存。
+
+    使用 get_parameters_by_path 一次性批量加载 /{prefix} 下的所有参数，在TTL内直接返回缓存；
+    TTL过期后重新拉取，只有参数版本发生变化时才重新解析生成新的 ScalingConfig。
+    """
+
+    def __init__(self, prefix, ttl_seconds=60, client=None):
+        """
+        :param prefix: 参数前缀
+        :param ttl_seconds: 缓存有效期(秒)
+        :param client: boto3 SSM客户端，默认使用共享客户端
+        """
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.client = client or get_client('ssm')
+        self._lock = threading.Lock()
+        self._config = None
+        self._versions = None
+        self._expire_at = 0
+
+    @Utils.exception_handler
+    def get_config(self, force_refresh=False):
+        """
+        获取当前配置。
+
+        :param force_refresh: 是否忽略TTL立即重新拉取
+        :return: ScalingConfig 实例
+        """
+        with self._lock:
+            if not force_refresh and self._config is not None and time.time() < self._expire_at:
+                return self._config
+
+            values, versions = self._load_parameters()
+            if versions != self._versions:
+                self._config = ScalingConfig.from_parameters(self.prefix, values)
+                self._versions = versions
+                Utils.logger.info(f"Loaded {len(values)} parameters for prefix '/{self.prefix}' from Parameter Store.")
+            self._expire_at = time.time() + self.ttl_seconds
+            return self._config
+
+    def _load_parameters(self):
+        """
+        分页拉取前缀下的所有参数。
+
+        :return: (参数名 -> 值, 参数名 -> 版本)
+        """
+        values = {}
+        versions = {}
+        path = f"/{self.prefix}"
+        paginator = self.client.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=path, Recursive=True, WithDecryption=True):
+            for parameter in page.get('Parameters', []):
+                name = parameter['Name'][len(path) + 1:]
+                values[name] = parameter['Value']
+                versions[name] = parameter.get('Version')
+        return values, versions
+
+
+_config_caches = {}
+_config_caches_lock = threading.Lock()
+
+
+def get_config_cache(prefix, **kwargs):
+    """
+    获取指定前缀的进程级共享 SSMConfigCache，首次调用时按kwargs创建。
+
+    :param prefix: 参数前缀
+    :return: SSMConfigCache 实例
+    """
+    with _config_caches_lock:
+        cache = _config_caches.get(prefix)
+        if cache is None:
+            cache = SSMConfigCache(prefix, **kwargs)
+            _config_caches[prefix] = cache
+        return cache
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+
+# 直方图的桶上限(秒)，覆盖从本地SQLite读取到慢速AWS调用的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class Histogram:
+    """
+    固定桶的累积直方图，记录观测值的分布、总和与次数。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class TickMetrics:
+    """
+    控制器tick的耗时统计。
+
+    按(集群, 阶段)记录耗时直方图，按集群记录tick总耗时超过执行间隔的次数，
+    并以OpenMetrics文本格式导出，可以通过本地HTTP端点抓取或写入textfile collector文件。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._overruns = {}
+
+    def observe(self, cluster_id, phase, seconds):
+        """
+        记录一次阶段耗时。
+
+        :param cluster_id: EMR集群ID
+        :param phase: 阶段名称，例如 'config'、'metric_read'、'policy_write'
+        :param seconds: 耗时(秒)
+        """
+        with self._lock:
+            histogram = self._histograms.get((cluster_id, phase))
+            if histogram is None:
+                histogram = self._histograms[(cluster_id, phase)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, cluster_id, phase):
+        """
+        计时上下文管理器，代码块结束(包括抛出异常)时记录耗时。
+
+        :param cluster_id: EMR集群ID
+        :param phase: 阶段名称
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(cluster_id, phase, time.monotonic() - started)
+
+    def record_tick(self, cluster_id, seconds, interval_seconds):
+        """
+        记录一次完整tick的耗时，超过执行间隔时计入overrun。
+
+        :param cluster_id: EMR集群ID
+        :param seconds: tick总耗时(秒)
+        :param interval_seconds: tick的执行间隔(秒)
+        """
+        self.observe(cluster_id, 'total', seconds)
+        with self._lock:
+            self._overruns.setdefault(cluster_id, 0)
+            if seconds > interval_seconds:
+                self._overruns[cluster_id] += 1
+        if seconds > interval_seconds:
+            Utils.logger.warning(
+                f"Tick for cluster '{cluster_id}' took {seconds:.3f} seconds, longer than the {interval_seconds} second interval.")
+
+    def render(self):
+        """
+        以OpenMetrics文本格式导出所有指标。
+
+        :return: OpenMetrics文本
+        """
+        lines = [
+            '# TYPE managed_scaling_tick_phase_seconds histogram',
+            '# HELP managed_scaling_tick_phase_seconds Time spent in each phase of a controller tick.',
+            '# UNIT managed_scaling_tick_phase_seconds seconds',
+        ]
+        with self._lock:
+            for (cluster_id, phase), histogram in sorted(self._histograms.items()):
+                labels = f'cluster="{_escape_label_value(cluster_id)}",phase="{_escape_label_value(phase)}"'
+                for upper_bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'managed_scaling_tick_phase_seconds_bucket{{{labels},le="{float(upper_bound)}"}} {count}')
+                lines.append(f'managed_scaling_tick_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'managed_scaling_tick_phase_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'managed_scaling_tick_phase_seconds_count{{{labels}}} {histogram.count}')
+
+            lines += [
+                '# TYPE managed_scaling_tick_overruns counter',
+                '# HELP managed_scaling_tick_overruns Ticks that took longer than the action interval.',
+            ]
+            for cluster_id, count in sorted(self._overruns.items()):
+                lines.append(f'managed_scaling_tick_overruns_total{{cluster="{_escape_label_value(cluster_id)}"}} {count}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """
+        把指标原子地写入文件，供node_exporter的textfile collector读取。
+
+        :param path: 目标文件路径，例如 /var/lib/node_exporter/textfile/managed_scaling.prom
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_textfile_writer(self, path, interval_seconds=15):
+        """
+        启动后台线程，按间隔把指标写入textfile。
+
+        :param path: 目标文件路径
+        :param interval_seconds: 写入间隔(秒)
+        :return: 后台线程
+        """
+        def run():
+            while True:
+                try:
+                    self.write_textfile(path)
+                except Exception as e:
+                    Utils.logger.warning(f"Failed to write tick metrics to '{path}': {e}")
+                time.sleep(interval_seconds)
+
+        thread = threading.Thread(target=run, name="tick-metrics-textfile", daemon=True)
+        thread.start()
+        Utils.logger.info(f"Writing tick metrics to '{path}' every {interval_seconds} seconds.")
+        return thread
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """
+        在后台线程中启动HTTP端点，GET /metrics 返回OpenMetrics文本。
+
+        :param port: 监听端口
+        :param host: 监听地址，默认只监听本机
+        :return: ThreadingHTTPServer 实例
+        """
+        tick_metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = tick_metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 抓取请求不写入日志
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="tick-metrics-http", daemon=True).start()
+        Utils.logger.info(f"Serving tick metrics on http://{host}:{port}/metrics")
+        return server
+
+
+# 进程级共享的tick耗时统计
+tick_metrics = TickMetrics()
@@ -1,6 +1,39 @@
+import asyncio
 from functools import wraps
 from loguru import logger
 
+# 文件日志的默认设置：单个文件超过大小或打开超过时长即轮转，轮转后的文件保留一段时间
+LOG_FORMAT = "{time} {level} {name}:{function}:{line} {message} | {extra}"
+LOG_ROTATION_BYTES = 50 * 1024 * 1024
+LOG_ROTATION_SECONDS = 24 * 3600
+LOG_RETENTION = "7 days"
+
+# 大对象(API响应、指标序列)写入日志时保留的最大字符数
+LOG_PAYLOAD_LIMIT = 1000
+
+
+class SizeAndTimeRotation:
+    """
+    loguru的轮转条件：文件大小超过size_bytes或距上次轮转超过interval_seconds时轮转。
+    loguru 0.7.2 的rotation参数只接受单个条件，因此用可调用对象组合两者。
+    """
+
+    def __init__(self, size_bytes=LOG_ROTATION_BYTES, interval_seconds=LOG_ROTATION_SECONDS):
+        self.size_bytes = size_bytes
+        self.interval_seconds = interval_seconds
+        self._next_rotation = None
+
+    def __call__(self, message, file):
+        timestamp = message.record['time'].timestamp()
+        if self._next_rotation is None:
+            self._next_rotation = timestamp + self.interval_seconds
+        file.seek(0, 2)
+        if file.tell() + len(message) > self.size_bytes or timestamp >= self._next_rotation:
+            self._next_rotation = timestamp + self.interval_seconds
+            return True
+        return False
+
+
 class Utils:
     """
     一个工具类，提供日志记录和异常处理装饰器功能。
@@ -8,6 +41,33 @@ class Utils:
     # 将logger定义为Utils类的一个静态属性，以便于在类的静态方法中使用
     logger = logger
 
+    @staticmethod
+    def add_file_sink(path, level="DEBUG", serialize=False):
+        """
+        添加按大小和时间轮转的文件日志。日志记录经队列由后台线程写入，调用方不会因磁盘IO阻塞。
+
+        :param path: 日志文件路径
+        :param level: 最低日志级别
+        :param serialize: 为True时每条记录写为一行JSON(包含bind的结构化字段)
+        :return: loguru的sink ID
+        """
+        return logger.add(path, format=LOG_FORMAT, level=level, enqueue=True, serialize=serialize,
+                          rotation=SizeAndTimeRotation(), retention=LOG_RETENTION)
+
+    @staticmethod
+    def truncate(payload, limit=LOG_PAYLOAD_LIMIT):
+        """
+        把大对象转换为不超过limit个字符的字符串，用于日志。
+
+        :param payload: 任意对象
+        :param limit: 保留的最大字符数
+        :return: 截断后的字符串
+        """
+        text = str(payload)
+        if len(text) <= limit:
+            return text
+        return f"{text[:limit]}... ({len(text) - limit} more chars)"
+
     @staticmethod
     def exception_handler(func):
         """
@@ -15,6 +75,17 @@ class Utils:
         :param func: 被装饰的函数
         :return: 装饰器包装后的函数
         """
+        if asyncio.iscoroutinefunction(func):
+            # 协程函数的异常在await时才抛出，需要在异步包装器中捕获
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    Utils.logger.error(f"An error occurred in {func.__name__}: {e}")
+                    raise e
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             try:
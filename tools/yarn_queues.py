@@ -0,0 +1,178 @@
+import json
+from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+
+# 采集器为每个叶子队列保存的指标列
+QUEUE_COLUMNS = {
+    'PendingApps': 'INTEGER',
+    'ActiveApps': 'INTEGER',
+    'PendingContainers': 'INTEGER',
+    'PendingMB': 'INTEGER',
+    'PendingVirtualCores': 'INTEGER',
+    'UsedMB': 'INTEGER',
+    'UsedVirtualCores': 'INTEGER',
+    'MaxMB': 'INTEGER',
+    'MaxVirtualCores': 'INTEGER',
+    'AbsoluteUsedCapacity': 'REAL',
+    'AbsoluteMaxCapacity': 'REAL',
+}
+
+# 队列阈值中可以使用的指标，窗口平均值大于等于阈值时触发扩容
+QUEUE_THRESHOLD_METRICS = ('PendingApps', 'PendingContainers', 'PendingMB', 'PendingVirtualCores', 'AbsoluteUsedCapacity')
+
+# 队列阈值未指定Minutes时使用的时间窗口(分钟)
+DEFAULT_QUEUE_WINDOW_MINUTES = 5
+
+
+def _resource(resource, name):
+    return (resource or {}).get(name) or 0
+
+
+def _capacity_scheduler_queue(queue):
+    """
+    把CapacityScheduler叶子队列的JSON转换为一行队列指标。
+    """
+    pending = {}
+    # Hadoop 2.8+ 按分区给出pending资源，默认分区的名称为空字符串
+    for partition in (queue.get('resources') or {}).get('resourceUsagesByPartition') or []:
+        if not partition.get('partitionName'):
+            pending = partition.get('pending') or {}
+            break
+    max_capacity = queue.get('maxEffectiveCapacity') or {}
+    return {
+        'PendingApps': queue.get('numPendingApplications', 0),
+        'ActiveApps': queue.get('numActiveApplications', 0),
+        'PendingContainers': queue.get('pendingContainers', 0),
+        'PendingMB': _resource(pending, 'memory'),
+        'PendingVirtualCores': _resource(pending, 'vCores'),
+        'UsedMB': _resource(queue.get('resourcesUsed'), 'memory'),
+        'UsedVirtualCores': _resource(queue.get('resourcesUsed'), 'vCores'),
+        'MaxMB': max_capacity.get('memory'),
+        'MaxVirtualCores': max_capacity.get('vCores'),
+        'AbsoluteUsedCapacity': queue.get('absoluteUsedCapacity'),
+        'AbsoluteMaxCapacity': queue.get('absoluteMaxCapacity'),
+    }
+
+
+def _fair_scheduler_queue(queue, cluster_resources):
+    """
+    把FairScheduler叶子队列的JSON转换为一行队列指标，pending资源取demand与used之差。
+    """
+    used, demand, max_resources = queue.get('usedResources'), queue.get('demandResources'), queue.get('maxResources')
+    total_mb = _resource(cluster_resources, 'memory')
+    return {
+        'PendingApps': queue.get('numPendingApps', 0),
+        'ActiveApps': queue.get('numActiveApps', 0),
+        'PendingContainers': queue.get('pendingContainers', 0),
+        'PendingMB': max(0, _resource(demand, 'memory') - _resource(used, 'memory')),
+        'PendingVirtualCores': max(0, _resource(demand, 'vCores') - _resource(used, 'vCores')),
+        'UsedMB': _resource(used, 'memory'),
+        'UsedVirtualCores': _resource(used, 'vCores'),
+        'MaxMB': _resource(max_resources, 'memory') or None,
+        'MaxVirtualCores': _resource(max_resources, 'vCores') or None,
+        'AbsoluteUsedCapacity': _resource(used, 'memory') * 100 / total_mb if total_mb else None,
+        'AbsoluteMaxCapacity': min(100.0, _resource(max_resources, 'memory') * 100 / total_mb) if total_mb else None,
+    }
+
+
+def parse_scheduler_queues(scheduler):
+    """
+    从 /ws/v1/cluster/scheduler 的响应中提取所有叶子队列的指标，支持CapacityScheduler和FairScheduler。
+
+    :param scheduler: ResourceManager返回的JSON(包含或不包含最外层的'scheduler')
+    :return: {队列名: {列名: 值}}，队列名优先使用完整路径(如 root.etl)
+    """
+    scheduler_info = scheduler.get('scheduler', scheduler).get('schedulerInfo') or {}
+    queues = {}
+
+    if 'rootQueue' in scheduler_info:
+        # FairScheduler: 子队列在childQueues中
+        root = scheduler_info['rootQueue']
+        cluster_resources = root.get('clusterResources') or root.get('maxResources')
+        stack = [root]
+        while stack:
+            queue = stack.pop()
+            children = (queue.get('childQueues') or {}).get('queue') or []
+            if isinstance(children, dict):
+                children = [children]
+            if children:
+                stack.extend(children)
+            elif queue is not root:
+                queues[queue.get('queueName')] = _fair_scheduler_queue(queue, cluster_resources)
+        return queues
+
+    # CapacityScheduler: 子队列在queues中，没有子队列的是叶子队列
+    stack = list((scheduler_info.get('queues') or {}).get('queue') or [])
+    while stack:
+        queue = stack.pop()
+        children = (queue.get('queues') or {}).get('queue') or []
+        if children:
+            stack.extend(children)
+        else:
+            queues[queue.get('queuePath') or queue.get('queueName')] = _capacity_scheduler_queue(queue)
+    return queues
+
+
+def get_queue_thresholds(config):
+    """
+    从可选参数 queueScaleOutThresholds 中读取每个队列的扩容阈值。
+
+    参数值为JSON，例如 {"root.etl": {"PendingApps": 1, "Minutes": 5}, "adhoc": {"PendingVirtualCores": 64}}，
+    队列名可以是完整路径，也可以是叶子队列名。
+
+    :param config: ScalingConfig 实例
+    :return: {队列名: {指标名: 阈值, 'Minutes': 窗口}}，未配置或格式错误时为空字典
+    """
+    value = config.get('queueScaleOutThresholds', '')
+    if not value or not str(value).strip():
+        return {}
+    try:
+        thresholds = json.loads(value) if isinstance(value, str) else value
+    except ValueError as e:
+        Utils.logger.error(f"Invalid queueScaleOutThresholds, queue triggers are disabled: {e}")
+        return {}
+
+    result = {}
+    for queue_name, queue_thresholds in thresholds.items():
+        unknown = [name for name in queue_thresholds if name not in QUEUE_THRESHOLD_METRICS and name != 'Minutes']
+        if unknown:
+            Utils.logger.warning(f"Ignoring unknown queue threshold metrics {unknown} for queue '{queue_name}'.")
+        result[queue_name] = {name: float(value) for name, value in queue_thresholds.items()
+                              if name in QUEUE_THRESHOLD_METRICS or name == 'Minutes'}
+        result[queue_name].setdefault('Minutes', DEFAULT_QUEUE_WINDOW_MINUTES)
+    return result
+
+
+def match_queue_name(threshold_queue_name, queue_names):
+    """
+    把阈值中的队列名匹配到采集到的队列：先按完整名称匹配，再按叶子队列名匹配。
+
+    :param threshold_queue_name: 阈值中的队列名
+    :param queue_names: 采集到的队列名
+    :return: 匹配的队列名，没有匹配时返回None
+    """
+    if threshold_queue_name in queue_names:
+        return threshold_queue_name
+    for queue_name in queue_names:
+        if queue_name.rsplit('.', 1)[-1] == threshold_queue_name:
+            return queue_name
+    return None
+
+
+def check_queue_thresholds(thresholds, queue_means):
+    """
+    判断各队列的窗口平均值是否达到扩容阈值，不做任何IO。
+
+    :param thresholds: get_queue_thresholds 的返回值
+    :param queue_means: {阈值中的队列名: {指标名: 窗口平均值}}，数据不足的队列不包含在内
+    :return: 达到阈值的 [(队列名, 指标名, 平均值, 阈值), ...]
+    """
+    breaches = []
+    for queue_name, queue_thresholds in thresholds.items():
+        means = queue_means.get(queue_name)
+        if not means:
+            continue
+        for metric_name, threshold in queue_thresholds.items():
+            mean = means.get(metric_name)
+            if metric_name != 'Minutes' and mean is not None and mean >= threshold:
+                breaches.append((queue_name, metric_name, mean, threshold))
+    return breaches
@@ -0,0 +1,389 @@
+import inspect
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from .utils import Utils  # 使用相对导入从同一包内导入Utils类
+from .emr import AWSEMRClient
+
+
+def _bounded_timeout(timeout, remaining_seconds):
+    """
+    把requests的超时限制在剩余时间内。
+
+    :param timeout: 超时(秒)，可以是(连接超时, 读取超时)
+    :param remaining_seconds: 剩余时间(秒)，为None时不限制
+    :return: 限制后的超时
+    """
+    if remaining_seconds is None:
+        return timeout
+    if isinstance(timeout, tuple):
+        return tuple(min(t, remaining_seconds) for t in timeout)
+    return min(timeout, remaining_seconds)
+
+
+class YarnRMEndpointResolver:
+    """
+    YARN ResourceManager 地址解析器。
+
+    缓存集群主节点列表(带TTL)，通过 /ws/v1/cluster/info 探测并记住当前 ACTIVE 的 RM，
+    只有请求失败时才重新探测；可选地在首个RM超过延迟预算未响应时向另一个主节点发送对冲请求。
+    """
+
+    def __init__(self, cluster_id, emr_client=None, session=None, ttl_seconds=300, probe_timeout_seconds=3,
+                 request_timeout_seconds=(3, 10), hedge_after_seconds=None, port=8088):
+        """
+        :param cluster_id: EMR集群ID
+        :param emr_client: AWSEMRClient实例，默认新建
+        :param session: 发送请求使用的requests.Session，默认使用requests模块
+        :param ttl_seconds: 主节点列表缓存的有效期(秒)
+        :param probe_timeout_seconds: 探测 /ws/v1/cluster/info 的超时时间(秒)
+        :param request_timeout_seconds: 普通请求的超时时间(秒)，可以是(连接超时, 读取超时)
+        :param hedge_after_seconds: 对冲请求的延迟预算(秒)，为None时不发送对冲请求
+        :param port: ResourceManager Web端口
+        """
+        self.cluster_id = cluster_id
+        self.emr_client = emr_client or AWSEMRClient()
+        self.session = session or requests
+        self.ttl_seconds = ttl_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self.request_timeout_seconds = request_timeout_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self.port = port
+        self._lock = threading.Lock()
+        self._master_urls = []
+        self._master_urls_expire_at = 0
+        self._active_url = None
+        self._executor = None
+
+    @Utils.exception_handler
+    def get_master_urls(self, force_refresh=False):
+        """
+        获取所有主节点的 ResourceManager URL，在TTL内直接返回缓存。
+
+        :param force_refresh: 是否忽略缓存重新调用 describe_cluster
+        :return: ResourceManager URL 列表
+        """
+        with self._lock:
+            if force_refresh or not self._master_urls or time.time() >= self._master_urls_expire_at:
+                master_public_dns_list = self.emr_client.get_master_public_dns_list(self.cluster_id)
+                self._master_urls = [f'http://{master_public_dns}:{self.port}' for master_public_dns in master_public_dns_list]
+                self._master_urls_expire_at = time.time() + self.ttl_seconds
+                Utils.logger.info(f"Refreshed ResourceManager URLs for cluster '{self.cluster_id}': {self._master_urls}")
+            return list(self._master_urls)
+
+    def probe(self, yarn_rm_url, deadline=None):
+        """
+        探测指定 ResourceManager 是否为 ACTIVE 状态。
+
+        :param yarn_rm_url: ResourceManager URL
+        :param deadline: 截止时间(time.time())，探测超时不超过剩余时间
+        :return: ACTIVE(或未开启HA)时返回True，否则返回False
+        """
+        try:
+            response = self.session.get(f"{yarn_rm_url}/ws/v1/cluster/info",
+                                        timeout=self._timeout(self.probe_timeout_seconds, deadline))
+            response.raise_for_status()
+            ha_state = response.json().get('clusterInfo', {}).get('haState', 'ACTIVE')
+        except Exception as e:
+            Utils.logger.warning(f"Probe of ResourceManager '{yarn_rm_url}' failed: {e}")
+            return False
+        Utils.logger.info(f"ResourceManager '{yarn_rm_url}' haState: {ha_state}")
+        return ha_state == 'ACTIVE'
+
+    @staticmethod
+    def _timeout(timeout, deadline):
+        """
+        计算不超过截止时间的请求超时，截止时间已过时抛出 requests.Timeout。
+        """
+        if deadline is None:
+            return timeout
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise requests.Timeout("ResourceManager call deadline exceeded")
+        return _bounded_timeout(timeout, remaining)
+
+    @Utils.exception_handler
+    def get_active_url(self, deadline=None):
+        """
+        获取当前 ACTIVE 的 ResourceManager URL。已记住的地址直接返回，否则依次探测所有主节点。
+
+        :param deadline: 截止时间(time.time())，所有探测都不超过剩余时间
+        :return: ACTIVE ResourceManager URL
+        """
+        active_url = self._active_url
+        if active_url:
+            return active_url
+
+        master_urls = self.get_master_urls()
+        for yarn_rm_url in master_urls:
+            if self.probe(yarn_rm_url, deadline):
+                self._active_url = yarn_rm_url
+                return yarn_rm_url
+
+        # 主节点列表可能已过时，强制刷新后再探测一次
+        for yarn_rm_url in self.get_master_urls(force_refresh=True):
+            if yarn_rm_url not in master_urls and self.probe(yarn_rm_url, deadline):
+                self._active_url = yarn_rm_url
+                return yarn_rm_url
+
+        raise RuntimeError(f"No active ResourceManager found for cluster '{self.cluster_id}'")
+
+    def invalidate(self):
+        """
+        请求失败后清除已记住的 ACTIVE 地址，下一次请求时重新探测。
+        """
+        Utils.logger.warning(f"Invalidating active ResourceManager '{self._active_url}' for cluster '{self.cluster_id}'")
+        self._active_url = None
+
+    @Utils.exception_handler
+    def get(self, path, deadline=None):
+        """
+        向 ACTIVE ResourceManager 发送一次GET请求，不做重试。
+        请求失败时清除已记住的 ACTIVE 地址，由调用方(YarnRMClient)决定是否在截止时间内重试。
+
+        :param path: REST路径，例如 /ws/v1/cluster/metrics
+        :param deadline: 截止时间(time.time())，探测和请求的超时都不超过剩余时间
+        :return: requests.Response
+        """
+        try:
+            return self._get_once(path, deadline)
+        except requests.RequestException:
+            self.invalidate()
+            raise
+
+    def _get_once(self, path, deadline):
+        active_url = self.get_active_url(deadline)
+        if self.hedge_after_seconds is None:
+            return self._fetch(active_url, path, deadline)
+
+        standby_urls = [yarn_rm_url for yarn_rm_url in self.get_master_urls() if yarn_rm_url != active_url]
+        if not standby_urls:
+            return self._fetch(active_url, path, deadline)
+        return self._hedged_fetch(active_url, standby_urls[0], path, deadline)
+
+    def _fetch(self, yarn_rm_url, path, deadline=None):
+        response = self.session.get(f"{yarn_rm_url}{path}", timeout=self._timeout(self.request_timeout_seconds, deadline))
+        response.raise_for_status()
+        return response
+
+    def _hedged_fetch(self, primary_url, secondary_url, path, deadline=None):
+        """
+        先请求主地址，超过延迟预算仍未返回时向第二个主节点发送对冲请求，取先成功的结果。
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='yarn-rm-hedge')
+
+        primary = self._executor.submit(self._fetch, primary_url, path, deadline)
+        done, _ = wait([primary], timeout=self.hedge_after_seconds)
+        if done and primary.exception() is None:
+            return primary.result()
+
+        Utils.logger.info(f"ResourceManager '{primary_url}' exceeded {self.hedge_after_seconds}s budget, hedging to '{secondary_url}'")
+        secondary = self._executor.submit(self._fetch, secondary_url, path, deadline)
+        pending = {primary, secondary}
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    熔断器处于打开状态时抛出，表示ResourceManager暂时不可用，请求被快速失败。
+    """
+
+
+class CircuitBreaker:
+    """
+    简单的熔断器：连续失败达到阈值后打开，在冷却时间内直接拒绝请求；
+    冷却结束后放行一个试探请求(半开)，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout_seconds=30):
+        """
+        :param failure_threshold: 打开熔断器所需的连续失败次数
+        :param reset_timeout_seconds: 熔断器打开后的冷却时间(秒)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._half_open_in_flight = False
+
+    @property
+    def state(self):
+        """
+        熔断器状态：closed、open 或 half_open。
+        """
+        if self._opened_at is None:
+            return 'closed'
+        if time.time() - self._opened_at >= self.reset_timeout_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow_request(self):
+        """
+        判断当前是否允许发送请求。
+
+        :return: 允许时返回True
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._half_open_in_flight:
+                self._half_open_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._half_open_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._half_open_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.time()
+
+
+class YarnRMClient:
+    """
+    长连接的 YARN ResourceManager REST 客户端。
+
+    使用带连接池的 requests.Session 复用TCP连接，每次请求都设置连接/读取超时，
+    失败时按带抖动的指数退避有限次重试，并通过熔断器在RM异常期间快速失败。
+    整个调用受 deadline_seconds 约束，保证定时任务不会超过其执行间隔而堆积。
+    """
+
+    def __init__(self, cluster_id, connect_timeout_seconds=3, read_timeout_seconds=10, max_retries=2,
+                 backoff_base_seconds=0.5, deadline_seconds=20, pool_maxsize=10,
+                 failure_threshold=5, reset_timeout_seconds=30, hedge_after_seconds=None, emr_client=None, port=8088):
+        """
+        :param cluster_id: EMR集群ID
+        :param connect_timeout_seconds: 连接超时(秒)
+        :param read_timeout_seconds: 读取超时(秒)
+        :param max_retries: 首次请求失败后的最大重试次数
+        :param backoff_base_seconds: 指数退避的基础时间(秒)
+        :param deadline_seconds: 单次调用(含重试)的总时间上限(秒)
+        :param pool_maxsize: 每个主机的连接池大小
+        :param failure_threshold: 熔断器打开所需的连续失败次数
+        :param reset_timeout_seconds: 熔断器冷却时间(秒)
+        :param hedge_after_seconds: 对冲请求的延迟预算(秒)，为None时不对冲
+        :param emr_client: AWSEMRClient实例，默认新建
+        :param port: ResourceManager Web端口
+        """
+        self.cluster_id = cluster_id
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.deadline_seconds = deadline_seconds
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout_seconds)
+        self.resolver = YarnRMEndpointResolver(
+            cluster_id,
+            emr_client=emr_client,
+            session=self.session,
+            probe_timeout_seconds=(connect_timeout_seconds, read_timeout_seconds),
+            request_timeout_seconds=(connect_timeout_seconds, read_timeout_seconds),
+            hedge_after_seconds=hedge_after_seconds,
+            port=port,
+        )
+
+    @Utils.exception_handler
+    def get(self, path):
+        """
+        向 ACTIVE ResourceManager 发送GET请求。
+
+        :param path: REST路径，例如 /ws/v1/cluster/metrics
+        :return: requests.Response
+        """
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(f"ResourceManager circuit is open for cluster '{self.cluster_id}', failing fast")
+
+        deadline = time.time() + self.deadline_seconds
+        attempt = 0
+        while True:
+            try:
+                # 每次尝试(包括重新探测ACTIVE RM)的超时都不超过剩余时间，失败后的重新解析计入max_retries
+                response = self.resolver.get(path, deadline)
+                self.circuit_breaker.record_success()
+                return response
+            except (requests.RequestException, RuntimeError) as e:
+                attempt += 1
+                # 带全抖动的指数退避
+                backoff = random.uniform(0, self.backoff_base_seconds * (2 ** (attempt - 1)))
+                if attempt > self.max_retries or time.time() + backoff >= deadline:
+                    self.circuit_breaker.record_failure()
+                    raise
+                Utils.logger.warning(f"Request '{path}' to ResourceManager failed (attempt {attempt}), retrying in {backoff:.2f}s: {e}")
+                time.sleep(backoff)
+
+    def get_json(self, path):
+        """
+        发送GET请求并解析JSON响应。
+
+        :param path: REST路径
+        :return: 解析后的JSON字典
+        """
+        return self.get(path).json()
+
+
+_clients = {}
+_client_settings = {}
+_clients_lock = threading.Lock()
+
+
+def get_yarn_rm_client(cluster_id, **kwargs):
+    """
+    获取指定集群的进程级共享 YarnRMClient，采集器和控制器共用同一个连接池和熔断器。
+    首次调用时按kwargs创建；之后传入的设置与已创建客户端不同时不会生效，只记录警告。
+
+    :param cluster_id: EMR集群ID
+    :return: YarnRMClient 实例
+    """
+    with _clients_lock:
+        client = _clients.get(cluster_id)
+        if client is None:
+            client = YarnRMClient(cluster_id, **kwargs)
+            _clients[cluster_id] = client
+            # 记录生效的设置(默认值加上传入值)，emr_client只用于创建，不参与比较
+            defaults = {name: parameter.default for name, parameter in
+                        inspect.signature(YarnRMClient.__init__).parameters.items()
+                        if parameter.default is not inspect.Parameter.empty}
+            _client_settings[cluster_id] = dict(defaults, **kwargs)
+            return client
+
+        settings = _client_settings[cluster_id]
+        ignored = {name: value for name, value in kwargs.items()
+                   if name != 'emr_client' and settings.get(name) != value}
+        if ignored:
+            Utils.logger.warning(
+                f"YarnRMClient for cluster '{cluster_id}' already exists, ignoring different settings {ignored} "
+                f"(in use: { {name: settings.get(name) for name in ignored} }).")
+        return client
+
+
+def get_endpoint_resolver(cluster_id, **kwargs):
+    """
+    获取指定集群共享的 YarnRMEndpointResolver(即共享 YarnRMClient 使用的解析器)。
+
+    :param cluster_id: EMR集群ID
+    :return: YarnRMEndpointResolver 实例
+    """
+    return get_yarn_rm_client(cluster_id, **kwargs).resolver
@@ -1,20 +1,22 @@
 from apscheduler.schedulers.background import BackgroundScheduler
-import requests
-import sqlite3
 import time
 from functools import wraps
 from loguru import logger
-import json
-import boto3
 import argparse
-from datetime import datetime, timedelta
-import random
+from tools.ssm import get_config_cache
+from tools.yarn_rm import get_yarn_rm_client
+from tools.emr_ec2_metrics import NodeMetricsRetriever
+from tools.inventory import get_inventory
+from tools.metrics_store import get_metrics_store
+from tools.yarn_queues import parse_scheduler_queues
+from tools.utils import Utils
 
 # 配置loguru日志
-logger.add("debug.log", format="{time} {level} {message}", level="DEBUG")
+Utils.add_file_sink("debug.log")
 
-# AWS EMR 配置
-emr_client = boto3.client('emr')
+# Task Node CPU 采集
+node_metrics_retriever = NodeMetricsRetriever()
+TASK_NODE_CPU_INTERVAL_SECONDS = 60
 
 
 def exception_handler(func):
@@ -35,156 +37,105 @@ def exception_handler(func):
 
 
 @exception_handler
-def get_yarn_rm_url(emr_cluster_id):
+def sanitize_table_name(table_name):
     """
-    从指定的EMR集群获取YARN ResourceManager URL。
+    替换表名中的非法字符。
 
-    :param emr_cluster_id: EMR集群ID
-    :return: YARN ResourceManager URL
+    :param table_name: 原始表名
+    :return: 经过处理的表名
     """
-    cluster_details = emr_client.describe_cluster(ClusterId=emr_cluster_id)
-    cluster_details = cluster_details['Cluster']
-
-    # 获取主节点的公共DNS
-    master_public_dns = cluster_details['MasterPublicDnsName']
-
-    # 构造YARN ResourceManager URL
-    yarn_rm_url = f'http://{master_public_dns}:8088'
-    return yarn_rm_url
+    return ''.join(c if c.isalnum() or c == '_' else '_' for c in table_name)
 
 
 @exception_handler
-def get_random_yarn_rm_url(emr_cluster_id):
+def get_cluster_metrics(emr_cluster_id):
     """
-    从指定的EMR集群获取一个随机的YARN ResourceManager URL。
+    从当前 ACTIVE 的 YARN ResourceManager 获取集群指标。
 
     :param emr_cluster_id: EMR集群ID
-    :return: 一个随机的YARN ResourceManager URL
+    :return: YARN集群指标的字典
     """
-    cluster_details = emr_client.describe_cluster(ClusterId=emr_cluster_id)
-    cluster_details = cluster_details['Cluster']
-
-    # 获取所有主节点的公共DNS
-    if 'MasterPublicDnsNameList' in cluster_details:
-        # 多主节点架构
-        master_public_dns_list = [instance['PublicDnsName'] for instance in cluster_details['MasterPublicDnsNameList']]
-    else:
-        # 单主节点架构
-        master_public_dns_list = [cluster_details['MasterPublicDnsName']]
-
-    # 构造所有YARN ResourceManager URLs
-    yarn_rm_urls = [f'http://{master_public_dns}:8088' for master_public_dns in master_public_dns_list]
+    # 使用共享的长连接客户端，ACTIVE RM 由解析器缓存，失败时才重新探测
+    metrics_data = get_yarn_rm_client(emr_cluster_id).get_json('/ws/v1/cluster/metrics')
+    return metrics_data.get('clusterMetrics', {})
 
-    # 随机选择一个URL
-    random_yarn_rm_url = random.choice(yarn_rm_urls)
-    return random_yarn_rm_url
 
 @exception_handler
-def get_yarn_rm_urls(emr_cluster_id):
+def derive_sample(metrics):
     """
-    从指定的EMR集群获取所有YARN ResourceManager URLs。
+    从clusterMetrics计算需要保存的样本：三个派生指标，加上clusterMetrics中的全部数值字段(列名与字段名相同)。
 
-    :param emr_cluster_id: EMR集群ID
-    :return: 所有YARN ResourceManager URLs的列表
+    :param metrics: YARN集群指标的字典
+    :return: (Unix时间戳, {列名: 值})
     """
-    cluster_details = emr_client.describe_cluster(ClusterId=emr_cluster_id)
-    cluster_details = cluster_details['Cluster']
-
-    # 获取所有主节点的公共DNS
-    master_public_dns_list = [instance['PublicDnsName'] for instance in cluster_details['MasterPublicDnsNameList']]
+    timestamp = int(time.time())
+    pending_app_num = metrics.get('appsPending', 0)
+    available_mb = metrics.get('availableMB', 0)
+    reserved_mb = metrics.get('reservedMB', 0)
+    allocated_mb = metrics.get('allocatedMB', 0)
+    capacity_remaining_gb = available_mb / 1024
+    yarn_memory_available_percentage = available_mb / \
+        (available_mb + reserved_mb + allocated_mb) if (available_mb +
+                                                        reserved_mb + allocated_mb) != 0 else 0
 
-    # 构造所有YARN ResourceManager URLs
-    yarn_rm_urls = [f'http://{master_public_dns}:8088' for master_public_dns in master_public_dns_list]
-    return yarn_rm_urls
+    # 保留原始的vCore、内存、容器、节点和应用计数，决策时不再需要实时请求ResourceManager
+    values = {name: value for name, value in metrics.items()
+              if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    values.update({
+        'PendingAppNum': pending_app_num,
+        'CapacityRemainingGB': capacity_remaining_gb,
+        'YARNMemoryAvailablePercentage': yarn_memory_available_percentage,
+    })
+    return timestamp, values
 
 
 @exception_handler
-def sanitize_table_name(table_name):
+def write_metrics_to_sqlite(store, metrics):
     """
-    替换表名中的非法字符。
+    将指标数据写入共享的MetricsStore，由其批量提交。
 
-    :param table_name: 原始表名
-    :return: 经过处理的表名
+    :param store: MetricsStore 实例
+    :param metrics: 需要写入的指标数据
     """
-    return ''.join(c if c.isalnum() or c == '_' else '_' for c in table_name)
+    timestamp, values = derive_sample(metrics)
+    store.append(timestamp, values)
+    logger.info(f"Sample written: PendingAppNum={values['PendingAppNum']}, CapacityRemainingGB={values['CapacityRemainingGB']}, "
+                f"YARNMemoryAvailablePercentage={values['YARNMemoryAvailablePercentage']} ({len(values)} columns)")
 
 
 @exception_handler
-def create_table(conn, table_name):
+def get_scheduler_queues(emr_cluster_id):
     """
-    创建SQLite表，如果表不存在。
+    从当前 ACTIVE 的 YARN ResourceManager 获取所有叶子队列的指标。
 
-    :param conn: SQLite数据库连接
-    :param table_name: SQLite表名
+    :param emr_cluster_id: EMR集群ID
+    :return: {队列名: {列名: 值}}
     """
-    sanitized_table_name = sanitize_table_name(table_name)
-
-    cursor = conn.cursor()
-    cursor.execute(f'''CREATE TABLE IF NOT EXISTS {sanitized_table_name}
-                      (Timestamp INTEGER PRIMARY KEY, PendingAppNum INTEGER, CapacityRemainingGB REAL, YARNMemoryAvailablePercentage REAL)''')
-    conn.commit()
-    logger.info(f"Table '{sanitized_table_name}' created successfully.")
+    return parse_scheduler_queues(get_yarn_rm_client(emr_cluster_id).get_json('/ws/v1/cluster/scheduler'))
 
 
 @exception_handler
-def get_cluster_metrics(yarn_rm_url):
+def write_queue_metrics_to_sqlite(store, queues):
     """
-    从YARN ResourceManager获取集群指标。
+    将一次队列采样写入共享的MetricsStore，由其批量提交。
 
-    :param yarn_rm_url: YARN ResourceManager的URL
-    :return: YARN集群指标的字典
+    :param store: MetricsStore 实例
+    :param queues: {队列名: {列名: 值}}
     """
-    response = requests.get(f'{yarn_rm_url}/ws/v1/cluster/metrics')
-    response.raise_for_status()  # 如果响应状态码不是200，将抛出HTTPError异常
-    metrics_data = response.json()
-    return metrics_data.get('clusterMetrics', {})
+    store.append_queues(int(time.time()), queues)
+    pending = ', '.join(f"{name}={values['PendingApps']}" for name, values in queues.items())
+    logger.info(f"Queue sample written for {len(queues)} queues, pending apps: {pending}")
 
 
-@exception_handler
-def write_metrics_to_sqlite(conn, table_name, metrics):
+def queue_table_main(emr_cluster_id, table_name):
     """
-    将指标数据写入SQLite表。
+    采集并保存每个队列的pending、used和max资源。
 
-    :param conn: SQLite数据库连接
+    :param emr_cluster_id: EMR集群ID
     :param table_name: SQLite表名
-    :param metrics: 需要写入的指标数据
     """
-    sanitized_table_name = sanitize_table_name(table_name)
-
-    cursor = conn.cursor()
-    timestamp = int(time.time())
-    pending_app_num = metrics.get('appsPending', 0)
-    available_mb = metrics.get('availableMB', 0)
-    reserved_mb = metrics.get('reservedMB', 0)
-    allocated_mb = metrics.get('allocatedMB', 0)
-    capacity_remaining_gb = available_mb / 1024
-    yarn_memory_available_percentage = available_mb / \
-        (available_mb + reserved_mb + allocated_mb) if (available_mb +
-                                                        reserved_mb + allocated_mb) != 0 else 0
-
-    cursor.execute(f"INSERT INTO {sanitized_table_name} (Timestamp, PendingAppNum, CapacityRemainingGB, YARNMemoryAvailablePercentage) VALUES (?, ?, ?, ?)",
-                   (timestamp, pending_app_num, capacity_remaining_gb, yarn_memory_available_percentage))
-    conn.commit()
-    logger.info("Data written to SQLite successfully.")
-
-    # 打印最新记录
-    cursor.execute(
-        f"SELECT * FROM {sanitized_table_name} ORDER BY Timestamp DESC LIMIT 1")
-    latest_record = cursor.fetchone()
-    if latest_record:
-        logger.info(
-            f"Latest record in SQLite table '{sanitized_table_name}': {latest_record}")
-    else:
-        logger.info(
-            f"No records found in SQLite table '{sanitized_table_name}'.")
-
-    # 删除早于当前时间30天的记录
-    thirty_days_ago = int(time.time()) - 30 * 24 * 60 * 60
-    cursor.execute(
-        f"DELETE FROM {sanitized_table_name} WHERE Timestamp < {thirty_days_ago}")
-    conn.commit()
-    logger.info(
-        f"Records older than 30 days have been deleted from SQLite table '{sanitized_table_name}'.")
+    store = get_metrics_store(table_name)
+    write_queue_metrics_to_sqlite(store, get_scheduler_queues(emr_cluster_id))
 
 
 def metric_table_main(emr_cluster_id, table_name):
@@ -194,47 +145,98 @@ def metric_table_main(emr_cluster_id, table_name):
     :param emr_cluster_id: EMR集群ID
     :param table_name: SQLite表名
     """
-
-    # 连接到SQLite数据库
-    conn = sqlite3.connect(f"{table_name}.db")
-
-    # 创建表（如果不存在）
-    create_table(conn, table_name)
-
-    # 获取YARN ResourceManager URL
-    yarn_rm_url = get_random_yarn_rm_url(emr_cluster_id)
+    # 获取共享的指标存储(常驻连接，过期清理在后台执行)
+    store = get_metrics_store(table_name)
 
     # 获取集群指标
-    metrics = get_cluster_metrics(yarn_rm_url)
+    metrics = get_cluster_metrics(emr_cluster_id)
 
     # 写入指标到SQLite
-    write_metrics_to_sqlite(conn, table_name, metrics)
+    write_metrics_to_sqlite(store, metrics)
 
-    # 关闭数据库连接
-    conn.close()
 
+@exception_handler
+def ingest_task_node_cpu(emr_cluster_id, table_name, lookback_minutes):
+    """
+    增量采集Task Node的CPU指标：每个实例只拉取其HighWaterMark之后的数据点，
+    新加入的实例回溯lookback_minutes分钟。数据点和实例成员通过共享的MetricsStore批量提交，
+    过期数据由MetricsStore的后台维护删除。
 
-def schedule_main(emr_cluster_id, prefix):
+    :param emr_cluster_id: EMR集群ID
+    :param table_name: SQLite表名
+    :param lookback_minutes: 新实例的回溯时间(分钟)
+    """
+    store = get_metrics_store(table_name)
+
+    now = int(time.time())
+    running_ids = get_inventory(emr_cluster_id).get_instance_ids(['TASK'], ['RUNNING'])
+    high_water_marks, joined, left = store.update_task_node_membership(running_ids, now)
+    if joined or left:
+        logger.info(f"Task nodes joined: {len(joined)}, left: {len(left)}")
+
+    if running_ids:
+        # 只拉取最早的HighWaterMark之后的数据
+        start = min(hwm if hwm is not None else now - lookback_minutes * 60 for hwm in high_water_marks.values())
+        window_minutes = max(1, (now - start + 59) // 60)
+        series = node_metrics_retriever.get_node_metric_series(running_ids, window_minutes)
+
+        rows = []
+        new_high_water_marks = {}
+        for instance_id, points in series.items():
+            hwm = high_water_marks.get(instance_id)
+            points = [(timestamp, value) for timestamp, value in points if hwm is None or timestamp > hwm]
+            if points:
+                rows.extend((timestamp, instance_id, value) for timestamp, value in points)
+                new_high_water_marks[instance_id] = points[-1][0]
+
+        store.append_task_cpu(rows, new_high_water_marks)
+        logger.info(f"Ingested {len(rows)} task node CPU datapoints for {len(running_ids)} instances ({window_minutes} minutes).")
+
+
+def schedule_main(emr_cluster_id, prefix, hedge_after_seconds=None, flush_interval_seconds=None, raw_retention_days=30):
     """
     初始化调度器并添加main函数作为定时任务。
 
     :param emr_cluster_id: EMR集群ID
     :param prefix: 参数前缀
+    :param hedge_after_seconds: ResourceManager对冲请求的延迟预算(秒)，为None时不对冲
+    :param flush_interval_seconds: 指标批量提交的间隔(秒)，为None时使用监控间隔，为0时每个样本立即提交
+    :param raw_retention_days: 原始样本的保留天数，更早的数据只保留在1m/5m/1h汇总表中
     """
     scheduler = BackgroundScheduler()
 
+    # 初始化共享的ResourceManager客户端(连接池、超时、重试和熔断)
+    get_yarn_rm_client(emr_cluster_id, hedge_after_seconds=hedge_after_seconds)
+
     # 从AWS参数存储中获取监控间隔时间
-    ssm_client = boto3.client('ssm')
-    monitor_interval_seconds = int(ssm_client.get_parameter(
-        Name=f"/{prefix}/monitorIntervalSeconds", WithDecryption=True)["Parameter"]["Value"])
+    monitor_interval_seconds = get_config_cache(prefix).get_config().monitorIntervalSeconds
+
+    # 默认每个监控间隔提交一次，集群、队列和Task Node CPU样本合并在同一次提交中
+    if flush_interval_seconds is None:
+        flush_interval_seconds = monitor_interval_seconds
 
     # 构造SQLite表名
     table_name = sanitize_table_name(emr_cluster_id.replace('-', '_'))
 
+    # 初始化共享的指标存储(同时维护1m/5m/1h汇总表)
+    store = get_metrics_store(table_name, flush_interval_seconds=flush_interval_seconds,
+                              retention_days=raw_retention_days)
+
     # 添加定时任务，每隔monitor_interval_seconds秒执行一次main函数
     scheduler.add_job(metric_table_main, 'interval', args=[
                       emr_cluster_id, table_name], seconds=monitor_interval_seconds)
 
+    # 添加队列指标采集任务，与集群指标使用相同的间隔
+    scheduler.add_job(queue_table_main, 'interval', args=[
+                      emr_cluster_id, table_name], seconds=monitor_interval_seconds)
+
+    # 添加Task Node CPU增量采集任务，CloudWatch数据粒度为1分钟
+    config = get_config_cache(prefix).get_config()
+    get_inventory(emr_cluster_id, refresh_interval_seconds=int(config.get('inventoryRefreshSeconds', 60)))
+    lookback_minutes = int(max(config.scaleOutAvgTaskNodeCPULoadMinutes, config.scaleInAvgTaskNodeCPULoadMinutes))
+    scheduler.add_job(ingest_task_node_cpu, 'interval', args=[
+                      emr_cluster_id, table_name, lookback_minutes], seconds=TASK_NODE_CPU_INTERVAL_SECONDS)
+
     # 启动调度器
     scheduler.start()
 
@@ -245,6 +247,7 @@ def schedule_main(emr_cluster_id, prefix):
     except (KeyboardInterrupt, SystemExit):
         # 关闭调度器
         scheduler.shutdown()
+        store.close()
         logger.info("Scheduler shutdown successfully.")
 
 
@@ -255,6 +258,13 @@ if __name__ == '__main__':
                         help='EMR cluster ID')
     parser.add_argument('--prefix', required=True,
                         help='Parameter store prefix')
+    parser.add_argument('--hedge-after-seconds', type=float, default=None,
+                        help='Send a hedged request to another master when the ResourceManager has not answered within this many seconds (default: disabled)')
+    parser.add_argument('--flush-interval-seconds', type=float, default=None,
+                        help='Batch samples in memory and commit them at most every this many seconds; 0 commits every sample (default: the monitor interval)')
+    parser.add_argument('--raw-retention-days', type=int, default=30,
+                        help='Days to keep raw samples; older history is kept in the 1m/5m/1h rollup tables (default: 30)')
     args = parser.parse_args()
 
-    schedule_main(args.emr_cluster_id, args.prefix)
+    schedule_main(args.emr_cluster_id, args.prefix, args.hedge_after_seconds, args.flush_interval_seconds,
+                  args.raw_retention_days)